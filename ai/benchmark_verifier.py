@@ -0,0 +1,191 @@
+"""
+Trash Detector Throughput Benchmark
+-----------------------------------
+Runs the verifier's inference backends over a local image corpus at several
+batch sizes and thread counts, reporting images/s, p50/p99 batch latency,
+the RSS the loaded model adds and peak RSS (less the benchmark's own
+image corpus). Every backend/thread combination runs in its own process so
+the RSS figures and TensorFlow thread settings don't leak between runs.
+
+Usage:
+    python -m ai.benchmark_verifier --images datasets/trashnet_binary/trash
+    python -m ai.benchmark_verifier --images photos/ --backends tflite,int8 \
+        --batch-sizes 1,8,32 --threads 1,4 --output benchmark.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from queue import Empty
+
+import numpy as np
+
+# Backend name -> (load_backend name, TFLite variant)
+BACKENDS = {
+    'keras': ('keras', 'float32'),
+    'tflite': ('tflite', 'float32'),
+    'dynamic': ('tflite', 'dynamic'),
+    'int8': ('tflite', 'int8')
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_corpus(images_dir, max_images):
+    """Preprocess up to `max_images` images into one (N, 224, 224, 3) array"""
+    from ai.quest_verifier import preprocess_image
+
+    paths = []
+    for root, _, files in os.walk(images_dir):
+        paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        raise SystemExit(f"No images found in {images_dir}")
+    paths = paths[:max_images]
+    # Filled in place: concatenating a list of arrays would briefly hold the corpus twice
+    corpus = np.empty((len(paths), 224, 224, 3), dtype=np.float32)
+    for i, path in enumerate(paths):
+        corpus[i] = preprocess_image(path)[0]
+    return corpus
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def current_rss_mb():
+    """Current resident set size of this process; falls back to the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return peak_rss_mb()
+    return round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+
+def run_combination(backend_key, threads, args, results):
+    """Child process: load one backend with `threads` threads and time every batch size"""
+    if backend_key == 'keras':
+        # Must be set before TensorFlow initializes its thread pools
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from ai.inference_backends import load_backend
+
+    name, variant = BACKENDS[backend_key]
+    corpus = load_corpus(args.images, args.max_images)
+
+    rss_before_load = current_rss_mb()
+    started = time.perf_counter()
+    backend = load_backend(name, num_threads=threads, variant=variant)
+    load_seconds = time.perf_counter() - started
+    rss_after_load = current_rss_mb()
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        # Only one batch is alive at a time, so the batch copies don't inflate RSS
+        def make_batch(i):
+            return np.take(corpus, range(i * batch_size, (i + 1) * batch_size), axis=0, mode='wrap')
+
+        backend.predict(make_batch(0))  # warm-up (graph tracing / tensor allocation)
+
+        timings = []
+        for i in range(args.iterations):
+            batch = make_batch(i)
+            t0 = time.perf_counter()
+            backend.predict(batch)
+            timings.append((time.perf_counter() - t0) * 1000)
+
+        total_seconds = sum(timings) / 1000
+        rows.append({
+            'backend': backend_key,
+            'threads': threads,
+            'batch_size': batch_size,
+            'images_per_second': round(batch_size * len(timings) / total_seconds, 1),
+            'latency_ms_p50': round(float(np.percentile(timings, 50)), 2),
+            'latency_ms_p99': round(float(np.percentile(timings, 99)), 2)
+        })
+
+    peak = peak_rss_mb()
+    corpus_mb = round(corpus.nbytes / (1024 * 1024), 1)
+    for row in rows:
+        row['load_seconds'] = round(load_seconds, 2)
+        row['rss_after_load_mb'] = rss_after_load
+        row['load_rss_delta_mb'] = round(rss_after_load - rss_before_load, 1)
+        row['peak_rss_mb'] = peak
+        # The benchmark's own image corpus is not part of the verifier's footprint
+        row['corpus_mb'] = corpus_mb
+        row['verifier_peak_rss_mb'] = round(peak - corpus_mb, 1)
+    results.put(rows)
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark trash detector backends')
+    parser.add_argument('--images', required=True, help='Directory of JPEG/PNG images (searched recursively)')
+    parser.add_argument('--backends', default='keras,tflite,dynamic,int8',
+                        help=f"Comma-separated subset of {','.join(BACKENDS)}")
+    parser.add_argument('--batch-sizes', type=parse_int_list, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--threads', type=parse_int_list, default=[1, 2, 4])
+    parser.add_argument('--iterations', type=int, default=50, help='Timed batches per batch size')
+    parser.add_argument('--max-images', type=int, default=256, help='Images loaded from the corpus')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    backend_keys = [b for b in args.backends.split(',') if b]
+    unknown = [b for b in backend_keys if b not in BACKENDS]
+    if unknown:
+        parser.error(f"Unknown backend(s): {', '.join(unknown)}")
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for backend_key in backend_keys:
+        for threads in args.threads:
+            queue = context.Queue()
+            process = context.Process(target=run_combination, args=(backend_key, threads, args, queue))
+            process.start()
+            # Read before joining: a child blocked on a full pipe never exits
+            rows = None
+            while rows is None:
+                try:
+                    rows = queue.get(timeout=1)
+                except Empty:
+                    if not process.is_alive():
+                        break
+            if rows is None:
+                try:
+                    rows = queue.get(timeout=1)  # Put just before the child exited
+                except Empty:
+                    pass
+            process.join()
+            if rows is None:
+                print(f"[WARN] {backend_key} with {threads} thread(s) failed (exit code {process.exitcode})")
+            else:
+                results.extend(rows)
+
+    header = f"{'backend':<9}{'threads':>8}{'batch':>7}{'img/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'load MB':>9}{'peak MB':>9}"
+    print('\n' + header)
+    print('-' * len(header))
+    for row in results:
+        print(f"{row['backend']:<9}{row['threads']:>8}{row['batch_size']:>7}{row['images_per_second']:>10}"
+              f"{row['latency_ms_p50']:>10}{row['latency_ms_p99']:>10}{row['load_rss_delta_mb']:>9}"
+              f"{row['verifier_peak_rss_mb']:>9}")
+    print("(peak MB excludes the benchmark's image corpus; see corpus_mb in --output)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Inference backends for the trash detector
+--------------------------------------------
+Keras (full TensorFlow) and TFLite-interpreter implementations behind one
+interface: predict(batch) takes a float32 (N, 224, 224, 3) array in [0, 1]
+and returns N trashiness scores.
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+KERAS_MODEL_PATH = os.path.join(MODEL_DIR, 'trash_detector.h5')
+TFLITE_MODEL_PATH = os.path.join(MODEL_DIR, 'trash_detector.tflite')
+
+# TFLite exports written by train_trash_detector.py
+TFLITE_MODEL_VARIANTS = {
+    'float32': TFLITE_MODEL_PATH,
+    'dynamic': os.path.join(MODEL_DIR, 'trash_detector_dynamic.tflite'),  # int8 weights, float activations
+    'int8': os.path.join(MODEL_DIR, 'trash_detector_int8.tflite')  # full integer (int8 input/output)
+}
+
+
+class InferenceBackend(ABC):
+    """Common interface for trash detector backends"""
+
+    name = 'base'
+
+    @abstractmethod
+    def predict(self, batch):
+        """Score a (N, 224, 224, 3) float32 batch -> np.ndarray of N floats"""
+
+
+class KerasBackend(InferenceBackend):
+    """
+    Full TensorFlow/Keras model. Loads the trained trash_detector.h5 when it
+    exists, otherwise MobileNetV2 with an untrained head (feature extractor).
+    """
+
+    name = 'keras'
+
+    def __init__(self, model_path=KERAS_MODEL_PATH):
+        import tensorflow as tf
+
+        if os.path.exists(model_path):
+            print(f"[AI] Loading Keras model from {model_path}...")
+            self.model = tf.keras.models.load_model(model_path, compile=False)
+            return
+
+        print("[AI] Loading MobileNetV2 model...")
+        # Load MobileNetV2 pretrained on ImageNet (good for texture detection)
+        base_model = tf.keras.applications.MobileNetV2(
+            input_shape=(224, 224, 3),
+            include_top=False,
+            weights='imagenet'
+        )
+
+        # Add lightweight classification head
+        self.model = tf.keras.Sequential([
+            base_model,
+            tf.keras.layers.GlobalAveragePooling2D(),
+            tf.keras.layers.Dense(64, activation='relu'),
+            tf.keras.layers.Dense(1, activation='sigmoid')
+        ])
+
+        # Freeze base layers to use as fixed feature extractor
+        base_model.trainable = False
+
+    def predict(self, batch):
+        # predict_on_batch skips the per-call dataset/callback setup of predict()
+        preds = np.asarray(self.model.predict_on_batch(batch))
+        return preds.reshape(len(batch), -1)[:, 0]
+
+
+def _interpreter_class():
+    """Prefer the standalone tflite-runtime; fall back to TensorFlow's interpreter"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+
+
+def _quantize(batch, details):
+    """Convert a float batch to the input tensor's dtype"""
+    dtype = details['dtype']
+    if dtype not in (np.int8, np.uint8):
+        return batch.astype(dtype)
+    scale, zero_point = details['quantization']
+    info = np.iinfo(dtype)
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def _dequantize(values, details):
+    """Float scores from the output tensor"""
+    if details['dtype'] not in (np.int8, np.uint8):
+        return values.astype(np.float32)
+    scale, zero_point = details['quantization']
+    return (values.astype(np.float32) - zero_point) * scale
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    TFLite interpreter running the exported trash_detector.tflite
+
+    Interpreters are not thread-safe, so each thread gets its own (sharing
+    the model bytes). The input tensor is resized when the batch size changes.
+    Fully quantized models get their input quantized and output dequantized
+    with the tensors' scale and zero point.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path=TFLITE_MODEL_PATH, num_threads=None, variant='float32'):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"TFLite model not found: {model_path}")
+
+        with open(model_path, 'rb') as f:
+            self._model_content = f.read()
+        self.model_path = model_path
+        self.variant = variant
+        self.num_threads = num_threads
+        self._interpreter_cls = _interpreter_class()
+        self._local = threading.local()
+
+        # Fail at load time rather than on the first request
+        self._get_interpreter()
+        print(f"[AI] Loaded TFLite model from {model_path}")
+
+    def _get_interpreter(self):
+        interpreter = getattr(self._local, 'interpreter', None)
+        if interpreter is None:
+            interpreter = self._interpreter_cls(
+                model_content=self._model_content,
+                num_threads=self.num_threads
+            )
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+            self._local.batch_size = int(interpreter.get_input_details()[0]['shape'][0])
+        return interpreter
+
+    def predict(self, batch):
+        interpreter = self._get_interpreter()
+        input_details = interpreter.get_input_details()[0]
+
+        if self._local.batch_size != len(batch):
+            interpreter.resize_tensor_input(input_details['index'], [len(batch), *batch.shape[1:]])
+            interpreter.allocate_tensors()
+            self._local.batch_size = len(batch)
+            input_details = interpreter.get_input_details()[0]
+
+        output_details = interpreter.get_output_details()[0]
+        interpreter.set_tensor(input_details['index'], _quantize(batch, input_details))
+        interpreter.invoke()
+        preds = _dequantize(interpreter.get_tensor(output_details['index']), output_details)
+        return preds.reshape(len(batch), -1)[:, 0]
+
+
+def load_backend(name='auto', num_threads=None, variant='float32'):
+    """
+    Create a trash detector backend
+
+    Args:
+        name: 'tflite', 'keras' or 'auto' (TFLite if the exported model
+              loads, otherwise Keras)
+        num_threads: Interpreter threads for the TFLite backend (None = default)
+        variant: TFLite export to load: 'float32', 'dynamic' or 'int8'
+    """
+    if variant not in TFLITE_MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant: {variant}")
+
+    def tflite():
+        return TFLiteBackend(TFLITE_MODEL_VARIANTS[variant], num_threads=num_threads, variant=variant)
+
+    if name == 'keras':
+        return KerasBackend()
+    if name == 'tflite':
+        return tflite()
+
+    try:
+        return tflite()
+    except Exception as e:
+        print(f"[WARN] TFLite backend unavailable ({e}), falling back to Keras")
+        return KerasBackend()
@@ -5,128 +5,459 @@ REAL VERSION - Temporally restored by cherry-pick.
 Note: Requires 'tensorflow', 'numpy', 'pillow' to be installed.
 """
 
-import math
+import io
+import queue
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
 from PIL import Image
+from config import Config
+from ai.inference_backends import load_backend
+from utils.image_hash import dhash, hamming_distance
+from utils.geo_utils import haversine
 
-# Lazy-load TensorFlow to avoid startup delays
-model = None
+# Lazy-load the inference backend to avoid startup delays
+backend = None
+_model_lock = threading.Lock()
+
+# Warm-up / readiness state (see warm_up and wait_until_ready)
+_ready = threading.Event()
+_status = {'state': 'cold', 'backend': None, 'load_seconds': None, 'error': None}
+_status_lock = threading.Lock()
 
 def _load_model():
-    """Lazy-load the TensorFlow model on first use"""
-    global model
-    if model is not None:
-        return model
-    
-    print("[AI] Loading MobileNetV2 model...")
-    import tensorflow as tf
+    """
+    Load the trash detector backend (TFLite or Keras) once per process
     
-    # Load MobileNetV2 pretrained on ImageNet (good for texture detection)
-    base_model = tf.keras.applications.MobileNetV2(
-        input_shape=(224, 224, 3),
-        include_top=False,
-        weights='imagenet'
-    )
+    Concurrent callers wait on the same load instead of each starting one.
+    """
+    global backend
+    if backend is not None:
+        return backend
     
-    # Add lightweight classification head
-    model = tf.keras.Sequential([
-        base_model,
-        tf.keras.layers.GlobalAveragePooling2D(),
-        tf.keras.layers.Dense(64, activation='relu'),
-        tf.keras.layers.Dense(1, activation='sigmoid')
-    ])
+    with _model_lock:
+        if backend is None:
+            backend = load_backend(
+                Config.QUEST_VERIFIER_BACKEND,
+                num_threads=Config.QUEST_VERIFIER_THREADS,
+                variant=Config.QUEST_VERIFIER_MODEL_VARIANT
+            )
+            print(f"[OK] Trash detector ready ({backend.name} backend)")
+    return backend
+
+def warm_up():
+    """
+    Load the model and run dummy inferences so the first real request
+    doesn't pay for the import, weight load and graph tracing
+    """
+    with _status_lock:
+        _status.update(state='loading', error=None)
+    started = time.monotonic()
+    try:
+        m = _load_model()
+        # Trace the shapes used by single-image and before/after scoring
+        for batch_size in (1, 2):
+            m.predict(np.zeros((batch_size, 224, 224, 3), dtype=np.float32))
+    except Exception as e:
+        print(f"[WARN] Trash detector warm-up failed: {e}")
+        with _status_lock:
+            _status.update(state='failed', error=str(e))
+        return False
     
-    # Freeze base layers to use as fixed feature extractor
-    base_model.trainable = False
+    with _status_lock:
+        _status.update(
+            state='ready',
+            backend=backend.name,
+            load_seconds=round(time.monotonic() - started, 2)
+        )
+    _ready.set()
+    print(f"[OK] Trash detector warmed up in {_status['load_seconds']}s")
+    return True
+
+def start_background_warmup():
+    """Start warm-up on a daemon thread unless it is running or done"""
+    with _status_lock:
+        if _status['state'] in ('loading', 'ready'):
+            return
+        _status['state'] = 'loading'
+    threading.Thread(target=warm_up, name='trash-detector-warmup', daemon=True).start()
+
+def wait_until_ready(timeout):
+    """
+    Block until the model is warm, for at most `timeout` seconds
     
-    # Compile for safety (won't train, just predict)
-    model.compile(optimizer='adam', loss='binary_crossentropy')
+    Starts warm-up if nothing has (or the last attempt failed).
     
-    print("[OK] Loaded MobileNetV2 as Trash Detector Feature Extractor")
-    return model
+    Returns:
+        bool: True if verification can run now
+    """
+    if _ready.is_set():
+        return True
+    start_background_warmup()
+    return _ready.wait(timeout)
+
+def get_verifier_status():
+    """Readiness snapshot for health endpoints"""
+    with _status_lock:
+        return dict(_status, ready=_ready.is_set())
 
 # =====================================================
 # 🧩 Image Preprocessing
 # =====================================================
 
-def preprocess_image(image_path):
-    """Load and resize an image into model input format"""
-    img = Image.open(image_path).convert("RGB").resize((224, 224))
+MODEL_INPUT_SIZE = (224, 224)
+
+def _open_image(image):
+    """PIL image from a path, raw bytes or a file-like object"""
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = io.BytesIO(image)
+    img = Image.open(image)
+    # JPEG only: let the decoder downscale by 1/2, 1/4 or 1/8 while staying
+    # at or above the model input size, instead of decoding full resolution
+    img.draft('RGB', MODEL_INPUT_SIZE)
+    return img
+
+def load_image(image):
+    """
+    Model input array plus the original (width, height) of the image
+    
+    Accepts the same inputs as preprocess_image. The original size is read
+    from the header before the draft-mode decode shrinks the image; it is
+    None for arrays, which were already checked when they were decoded.
+    """
+    if isinstance(image, np.ndarray):
+        arr = image.astype(np.float32)
+        if image.dtype == np.uint8:
+            arr /= 255.0
+        arr = arr if arr.ndim == 4 else np.expand_dims(arr, axis=0)
+        return arr, None
+
+    if isinstance(image, Image.Image):
+        img = image
+        original_size = img.size
+    else:
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = io.BytesIO(image)
+        img = Image.open(image)
+        original_size = img.size
+        img.draft('RGB', MODEL_INPUT_SIZE)
+
+    img = img.convert("RGB").resize(MODEL_INPUT_SIZE)
     arr = np.expand_dims(np.array(img, dtype=np.float32) / 255.0, axis=0)
-    return arr
+    return arr, original_size
 
-def detect_trash(image_path):
+def preprocess_image(image):
     """
-    Predicts a 'trashiness' score (0–1).
+    Load and resize an image into model input format
+    
+    Args:
+        image: File path, raw bytes, file-like object, PIL image, or a
+               NumPy array already shaped (224, 224, 3) or (1, 224, 224, 3)
+               (uint8 0–255 or float 0–1)
+    
+    Returns:
+        np.ndarray: float32 array of shape (1, 224, 224, 3) in [0, 1]
+    """
+    return load_image(image)[0]
+
+# =====================================================
+# 🔎 Image Quality Gate
+# =====================================================
+
+LUMINANCE_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+def image_quality_issue(arr, original_size):
+    """
+    Why an image is unusable for trash scoring, or None if it's fine
+    
+    Works on the 224x224 model input, so it costs well under a millisecond:
+    minimum resolution, exposure from the luminance distribution, and
+    blur from the variance of the Laplacian.
+    """
+    if original_size and min(original_size) < Config.QUEST_IMAGE_MIN_SIDE:
+        return f"Image is too small ({original_size[0]}x{original_size[1]}px)"
+
+    gray = arr[0] @ LUMINANCE_WEIGHTS
+    brightness = float(gray.mean())
+    if brightness < Config.QUEST_IMAGE_MIN_BRIGHTNESS or float((gray < 0.05).mean()) > Config.QUEST_IMAGE_MAX_CLIPPED:
+        return "Image is too dark"
+    if brightness > Config.QUEST_IMAGE_MAX_BRIGHTNESS or float((gray > 0.95).mean()) > Config.QUEST_IMAGE_MAX_CLIPPED:
+        return "Image is overexposed"
+
+    # 4-neighbour Laplacian on the 0–255 scale
+    g = gray * 255.0
+    laplacian = g[:-2, 1:-1] + g[2:, 1:-1] + g[1:-1, :-2] + g[1:-1, 2:] - 4.0 * g[1:-1, 1:-1]
+    if float(laplacian.var()) < Config.QUEST_IMAGE_MIN_SHARPNESS:
+        return "Image is too blurry"
+
+    return None
+
+def assess_image(image):
+    """
+    Decode an image once for both the quality gate and the model
+    
+    Returns:
+        tuple: (model input array, quality issue or None)
+    """
+    arr, original_size = load_image(image)
+    return arr, image_quality_issue(arr, original_size)
+
+def _describe(image):
+    """Short label for log lines (paths are printed, in-memory images aren't)"""
+    return image if isinstance(image, str) else f"<{type(image).__name__}>"
+
+def image_hash(image):
+    """
+    Perceptual hash (dHash) of any image preprocess_image accepts
+    
+    Needs only a reduced JPEG decode, so it's cheap enough to run on
+    every upload before deciding whether the model has to run at all.
+    """
+    if isinstance(image, np.ndarray):
+        arr = image[0] if image.ndim == 4 else image
+        if arr.dtype != np.uint8:
+            arr = (np.clip(arr, 0, 1) * 255).astype(np.uint8)
+        return dhash(Image.fromarray(arr))
+    
+    if hasattr(image, 'seek'):
+        position = image.tell()
+        result = dhash(_open_image(image))
+        image.seek(position)  # preprocess_image reads the stream again
+        return result
+    return dhash(_open_image(image))
+
+def _predict_batch(batch):
+    """One forward pass over a (N, 224, 224, 3) array -> N scores"""
+    m = _load_model()  # Lazy-load model
+    return [float(p) for p in m.predict(batch)]
+
+def _score_batch(image_paths):
+    """Preprocess and score images in one forward pass (raises on failure)"""
+    batch = np.concatenate([preprocess_image(path) for path in image_paths], axis=0)
+    scores = _predict_batch(batch)
+    for path, score in zip(image_paths, scores):
+        print(f"[AI] {_describe(path)}: trashiness={score:.2f}")
+    return scores
+
+def detect_trash_batch(image_paths):
+    """
+    Predicts 'trashiness' scores (0–1) for several images in one forward pass.
     Higher means more cluttered / messy / trash presence.
     """
     try:
-        m = _load_model()  # Lazy-load model
-        img = preprocess_image(image_path)
-        preds = m.predict(img, verbose=0)
-        score = float(preds[0][0])
-        print(f"[AI] {image_path}: trashiness={score:.2f}")
-        return score
+        return _score_batch(image_paths)
     except Exception as e:
-        print(f"[WARN] detect_trash() failed: {e}")
-        return 0.0
+        print(f"[WARN] detect_trash_batch() failed: {e}")
+        return [0.0] * len(image_paths)
+
+def detect_trash(image_path):
+    """
+    Predicts a 'trashiness' score (0–1).
+    Higher means more cluttered / messy / trash presence.
+    """
+    return score_images([image_path])[0]
 
 # =====================================================
-# 📍 Geolocation Helper (Haversine)
+# ⏱️ Micro-batching
 # =====================================================
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate GPS distance in meters between two coordinates"""
-    R = 6371000  # Earth radius in meters
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
+class MicroBatcher:
+    """
+    Collects images from concurrent requests for up to `max_wait_ms` and
+    scores them together in one forward pass (at most `max_batch` images)
+    """
+
+    def __init__(self, max_batch=16, max_wait_ms=5):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='trash-microbatch', daemon=True)
+        self._thread.start()
+
+    def submit(self, image_array):
+        """Queue one preprocessed (1, 224, 224, 3) image; returns a Future score"""
+        future = Future()
+        self._queue.put((image_array, future))
+        return future
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                batch = np.concatenate([array for array, _ in items], axis=0)
+                scores = _predict_batch(batch)
+                for (_, future), score in zip(items, scores):
+                    future.set_result(score)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
 
-    a = math.sin(delta_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(delta_lambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def _get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(
+                max_batch=Config.QUEST_VERIFIER_MICROBATCH_SIZE,
+                max_wait_ms=Config.QUEST_VERIFIER_MICROBATCH_WAIT_MS
+            )
+        return _batcher
+
+def score_images(image_paths, strict=False):
+    """
+    Trashiness scores for a list of images
+    
+    With QUEST_VERIFIER_MICROBATCH enabled the images join the shared
+    micro-batch queue (batched with other requests); otherwise they are
+    scored together in a single forward pass.
+    
+    Args:
+        image_paths: Images to score
+        strict: Raise on failure instead of returning 0.0 scores
+    """
+    try:
+        if not Config.QUEST_VERIFIER_MICROBATCH:
+            return _score_batch(image_paths)
+
+        batcher = _get_batcher()
+        futures = [batcher.submit(preprocess_image(path)) for path in image_paths]
+        scores = [future.result() for future in futures]
+        for path, score in zip(image_paths, scores):
+            print(f"[AI] {_describe(path)}: trashiness={score:.2f}")
+        return scores
+    except Exception as e:
+        if strict:
+            raise
+        print(f"[WARN] score_images() failed: {e}")
+        return [0.0] * len(image_paths)
 
 # =====================================================
 # 🧠 AI Verification Logic
 # =====================================================
 
-def verify_cleanliness(before_image, after_image, user_gps, quest_gps, radius_m=100):
+def check_proximity(user_gps, quest_gps, radius_m=100):
+    """Failure result if the user is outside the quest radius, else None"""
+    distance = haversine(user_gps[0], user_gps[1], quest_gps[0], quest_gps[1])
+    if distance > radius_m:
+        return {
+            "verified": False,
+            "reason": f"Out of location range ({round(distance,1)}m > {radius_m}m)",
+            "confidence": 0.0
+        }
+    return None
+
+def check_same_image(before_hash, after_hash):
+    """Fraud result if the before and after photos are (nearly) the same image, else None"""
+    distance = hamming_distance(before_hash, after_hash)
+    if distance <= Config.QUEST_IMAGE_DUPLICATE_DISTANCE:
+        return {
+            "verified": False,
+            "reason": "Before and after photos are the same image",
+            "confidence": 0.0,
+            "fraud_flag": "same_image",
+            "hash_distance": distance
+        }
+    return None
+
+def duplicate_photo_result(match):
+    """Fraud result for a photo already used in another quest submission"""
+    return {
+        "verified": False,
+        "reason": "Photo was already used in another quest submission",
+        "confidence": 0.0,
+        "fraud_flag": "duplicate_photo",
+        "duplicate_of": str(match['submission_id']),
+        "hash_distance": match['distance']
+    }
+
+def cleanliness_verdict(before_score, after_score):
+    """Confidence-based decision from the before/after trashiness scores"""
+    improvement = before_score - after_score
+    print(f"[SCORE] Improvement Score: {improvement:.2f}")
+
+    scores = {"before_score": before_score, "after_score": after_score}
+    if improvement >= 0.2:
+        return {"verified": True, "confidence": improvement, **scores}
+    elif 0.1 <= improvement < 0.2:
+        return {
+            "verified": False,
+            "reason": "Needs manual review (low confidence)",
+            "confidence": improvement,
+            **scores
+        }
+    else:
+        return {
+            "verified": False,
+            "reason": "No visible improvement",
+            "confidence": improvement,
+            **scores
+        }
+
+def verify_cleanliness(before_image, after_image, user_gps, quest_gps, radius_m=100,
+                       before_score=None, after_score=None, before_hash=None, after_hash=None):
     """
     Verifies cleanliness using Computer Vision (Trash Detection).
+    
+    Pass `before_score` when the before image was already scored (at quest
+    start) so only the after image goes through the model, and `after_score`
+    when a duplicate of the after image was scored before. Precomputed
+    perceptual hashes skip re-decoding the images for the same-photo check.
     """
     try:
         # Step 1 — Check proximity
-        distance = calculate_distance(user_gps[0], user_gps[1], quest_gps[0], quest_gps[1])
-        if distance > radius_m:
-            return {
-                "verified": False,
-                "reason": f"Out of location range ({round(distance,1)}m > {radius_m}m)",
-                "confidence": 0.0
-            }
-
-        # Step 2 — Trash Detection
-        before_score = detect_trash(before_image)
-        after_score = detect_trash(after_image)
-
-        # Step 3 — Calculate improvement
-        improvement = before_score - after_score
-        print(f"[SCORE] Improvement Score: {improvement:.2f}")
-
-        # Step 4 — Confidence-based decision
-        if improvement >= 0.2:
-            return {"verified": True, "confidence": improvement}
-        elif 0.1 <= improvement < 0.2:
-            return {
-                "verified": False,
-                "reason": "Needs manual review (low confidence)",
-                "confidence": improvement
-            }
-        else:
-            return {
-                "verified": False,
-                "reason": "No visible improvement",
-                "confidence": improvement
-            }
+        out_of_range = check_proximity(user_gps, quest_gps, radius_m)
+        if out_of_range:
+            return out_of_range
+
+        # Step 2 — Same photo submitted as before and after
+        duplicate = check_same_image(
+            before_hash or image_hash(before_image), after_hash or image_hash(after_image)
+        )
+        if duplicate:
+            return duplicate
+
+        # Step 3 — Quality gate, then Trash Detection in one batch for the
+        # images without a known score. Errors must not read as a clean
+        # after image.
+        pending = []
+        if before_score is None:
+            pending.append(('before', before_image))
+        if after_score is None:
+            pending.append(('after', after_image))
+
+        arrays = []
+        for role, image in pending:
+            arr, issue = assess_image(image)
+            if issue:
+                return {
+                    "verified": False,
+                    "reason": f"{role.capitalize()} photo rejected: {issue}",
+                    "confidence": 0.0,
+                    "quality_issue": issue
+                }
+            arrays.append(arr)
+
+        scores = dict(zip([role for role, _ in pending], score_images(arrays, strict=True) if arrays else []))
+        before_score = scores.get('before', before_score)
+        after_score = scores.get('after', after_score)
+
+        # Step 4 — Improvement and confidence-based decision
+        return cleanliness_verdict(before_score, after_score)
 
     except Exception as e:
         print(f"[WARN] verify_cleanliness() failed: {e}")
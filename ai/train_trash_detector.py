@@ -1,48 +1,93 @@
 """
 Train a simple CNN for Trash vs Clean environment classification.
 Dataset: any TrashNet-like dataset or your custom images.
-Outputs: ai/models/trash_detector.tflite
+Outputs: ai/models/trash_detector.tflite (float32),
+         ai/models/trash_detector_dynamic.tflite (dynamic-range quantized),
+         ai/models/trash_detector_int8.tflite (full integer quantized),
+         ai/models/quantization_report.json (accuracy / size / latency per variant)
 """
 
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import json
 import os
+import random
+import sys
+import time
+import numpy as np
+
+# Repo root on the path for the verifier's inference backends
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai.inference_backends import TFLiteBackend, TFLITE_MODEL_VARIANTS
 
 # Paths
 DATA_DIR = "datasets/trashnet_binary"  # structure: trash/, clean/
 MODEL_DIR = "ai/models"
+CHECKPOINT_DIR = os.path.join(MODEL_DIR, "checkpoints")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# Decoded images are cached in memory by default; set TRASH_DATASET_CACHE to
+# a file path for datasets that don't fit in RAM
+CACHE_FILE = os.getenv("TRASH_DATASET_CACHE", "")
+
 # Image parameters
 IMG_SIZE = (224, 224)
 BATCH_SIZE = 16
+EPOCHS = int(os.getenv("TRASH_TRAIN_EPOCHS", 10))
+VALIDATION_SPLIT = 0.2
+SEED = 42
+AUTOTUNE = tf.data.AUTOTUNE
 
-# Data augmentation
-datagen = ImageDataGenerator(
-    rescale=1./255,
-    validation_split=0.2,
-    rotation_range=10,
-    width_shift_range=0.1,
-    height_shift_range=0.1,
-    zoom_range=0.1,
-    horizontal_flip=True
-)
+# =====================================================
+# tf.data input pipeline
+# =====================================================
 
-train_gen = datagen.flow_from_directory(
-    DATA_DIR,
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='binary',
-    subset='training'
-)
+def list_images(data_dir):
+    """(paths, labels) with labels from alphabetical class folders (clean=0, trash=1)"""
+    class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    samples = []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(data_dir, class_name)
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif')):
+                samples.append((os.path.join(class_dir, filename), float(label)))
+    random.Random(SEED).shuffle(samples)
+    print(f"Found {len(samples)} images in classes {class_names}")
+    return [path for path, _ in samples], [label for _, label in samples]
 
-val_gen = datagen.flow_from_directory(
-    DATA_DIR,
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='binary',
-    subset='validation'
-)
+def decode_image(path, label):
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    image = tf.image.resize(image, IMG_SIZE) / 255.0
+    return image, label
+
+# Same augmentations as the old ImageDataGenerator, run on whole batches
+augment = tf.keras.Sequential([
+    tf.keras.layers.RandomFlip("horizontal"),
+    tf.keras.layers.RandomRotation(10 / 360),
+    tf.keras.layers.RandomTranslation(0.1, 0.1),
+    tf.keras.layers.RandomZoom(0.1)
+])
+
+def build_datasets():
+    paths, labels = list_images(DATA_DIR)
+    split = int(len(paths) * (1 - VALIDATION_SPLIT))
+
+    def decoded(start, end, subset):
+        # Parallel decode, then cache the decoded images so later epochs skip it
+        return (tf.data.Dataset.from_tensor_slices((paths[start:end], labels[start:end]))
+                .map(decode_image, num_parallel_calls=AUTOTUNE)
+                .cache(f"{CACHE_FILE}_{subset}" if CACHE_FILE else ""))
+
+    train_images = decoded(0, split, "train")
+    train = (train_images
+             .shuffle(1000, seed=SEED, reshuffle_each_iteration=True)
+             .batch(BATCH_SIZE)
+             .map(lambda x, y: (augment(x, training=True), y), num_parallel_calls=AUTOTUNE)
+             .prefetch(AUTOTUNE))
+    val = decoded(split, len(paths), "val").batch(BATCH_SIZE).prefetch(AUTOTUNE)
+    return train_images, train, val
+
+# train_images: un-augmented training images (quantization calibration)
+train_images, train_ds, val_ds = build_datasets()
 
 # Model — simple MobileNetV2 transfer learning
 base_model = tf.keras.applications.MobileNetV2(
@@ -62,9 +107,51 @@ model = tf.keras.Sequential([
 
 model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
 
+# Resumable training: BackupAndRestore picks up from the last finished epoch
+# if the run is interrupted; the best epoch's weights are kept separately
+backup_dir = os.path.join(CHECKPOINT_DIR, "backup")
+best_weights_path = os.path.join(CHECKPOINT_DIR, "best.weights.h5")
+best_score_path = os.path.join(CHECKPOINT_DIR, "best.json")
+
+# ModelCheckpoint forgets its best score when a run is resumed, so it is kept
+# next to the weights; a fresh run (no backup left behind) starts over
+best_val_accuracy = None
+if os.path.isdir(backup_dir) and os.path.exists(best_score_path):
+    with open(best_score_path) as f:
+        best_val_accuracy = json.load(f)['val_accuracy']
+    print(f"↩️ Resuming; best val_accuracy so far: {best_val_accuracy:.4f}")
+else:
+    for stale in (best_weights_path, best_score_path):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+def record_best(epoch, logs):
+    """Persist the score ModelCheckpoint just saved weights for"""
+    global best_val_accuracy
+    val_accuracy = (logs or {}).get('val_accuracy')
+    if val_accuracy is not None and (best_val_accuracy is None or val_accuracy > best_val_accuracy):
+        best_val_accuracy = float(val_accuracy)
+        with open(best_score_path, 'w') as f:
+            json.dump({'val_accuracy': best_val_accuracy, 'epoch': epoch + 1}, f)
+
+
+callbacks = [
+    tf.keras.callbacks.BackupAndRestore(backup_dir=backup_dir),
+    tf.keras.callbacks.ModelCheckpoint(
+        best_weights_path, monitor='val_accuracy', save_best_only=True, save_weights_only=True,
+        initial_value_threshold=best_val_accuracy
+    ),
+    tf.keras.callbacks.LambdaCallback(on_epoch_end=record_best)
+]
+
 print("✅ Training started...")
-history = model.fit(train_gen, validation_data=val_gen, epochs=10)
-print("✅ Training completed.")
+history = model.fit(train_ds, validation_data=val_ds, epochs=EPOCHS, callbacks=callbacks)
+if os.path.exists(best_weights_path):
+    model.load_weights(best_weights_path)
+    print("✅ Training completed (best epoch restored).")
+else:
+    print("⚠️ Training completed, but no best checkpoint was saved; keeping the final weights.")
 
 # Save normal model
 model.save(os.path.join(MODEL_DIR, "trash_detector.h5"))
@@ -77,3 +164,85 @@ tflite_path = os.path.join(MODEL_DIR, "trash_detector.tflite")
 with open(tflite_path, "wb") as f:
     f.write(tflite_model)
 print(f"✨ Exported TensorFlow Lite model → {tflite_path}")
+
+# =====================================================
+# Quantized variants
+# =====================================================
+
+REPRESENTATIVE_SAMPLES = 200
+
+def representative_dataset():
+    """Calibration images for full-integer quantization, from the training data"""
+    for image, _ in train_images.take(REPRESENTATIVE_SAMPLES):
+        yield [image[tf.newaxis]]
+
+# Dynamic range: int8 weights, float activations (no calibration needed)
+converter = tf.lite.TFLiteConverter.from_keras_model(model)
+converter.optimizations = [tf.lite.Optimize.DEFAULT]
+with open(TFLITE_MODEL_VARIANTS['dynamic'], "wb") as f:
+    f.write(converter.convert())
+print(f"✨ Exported dynamic-range model → {TFLITE_MODEL_VARIANTS['dynamic']}")
+
+# Full integer: int8 weights and activations, int8 input/output
+converter = tf.lite.TFLiteConverter.from_keras_model(model)
+converter.optimizations = [tf.lite.Optimize.DEFAULT]
+converter.representative_dataset = representative_dataset
+converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+converter.inference_input_type = tf.int8
+converter.inference_output_type = tf.int8
+with open(TFLITE_MODEL_VARIANTS['int8'], "wb") as f:
+    f.write(converter.convert())
+print(f"✨ Exported full-int8 model → {TFLITE_MODEL_VARIANTS['int8']}")
+
+# =====================================================
+# Accuracy / size / latency report
+# =====================================================
+
+LATENCY_RUNS = 50
+
+def validation_accuracy(predict):
+    """Accuracy of predict(batch) -> scores over one pass of the validation set"""
+    correct = 0
+    total = 0
+    for images, labels in val_ds.as_numpy_iterator():
+        scores = np.asarray(predict(images.astype(np.float32))).reshape(-1)
+        correct += int(np.sum((scores > 0.5) == (labels > 0.5)))
+        total += len(labels)
+    return correct / total if total else None
+
+def single_image_latency_ms(predict):
+    """Median and p99 latency of one-image inference on CPU"""
+    image = next(val_ds.as_numpy_iterator())[0][:1].astype(np.float32)
+    predict(image)  # warm-up
+    timings = []
+    for _ in range(LATENCY_RUNS):
+        started = time.perf_counter()
+        predict(image)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(float(np.percentile(timings, 50)), 2), round(float(np.percentile(timings, 99)), 2)
+
+report = {}
+keras_path = os.path.join(MODEL_DIR, "trash_detector.h5")
+variants = [('keras', keras_path, lambda batch: model.predict_on_batch(batch))]
+for variant, path in TFLITE_MODEL_VARIANTS.items():
+    variants.append((variant, path, TFLiteBackend(path, num_threads=1, variant=variant).predict))
+
+for variant, path, predict in variants:
+    p50, p99 = single_image_latency_ms(predict)
+    report[variant] = {
+        'path': path,
+        'size_mb': round(os.path.getsize(path) / (1024 * 1024), 2),
+        'val_accuracy': validation_accuracy(predict),
+        'latency_ms_p50': p50,
+        'latency_ms_p99': p99
+    }
+
+report_path = os.path.join(MODEL_DIR, "quantization_report.json")
+with open(report_path, "w") as f:
+    json.dump(report, f, indent=2)
+
+print(f"\n{'variant':<10}{'size MB':>10}{'val acc':>10}{'p50 ms':>10}{'p99 ms':>10}")
+for variant, row in report.items():
+    accuracy = f"{row['val_accuracy']:.3f}" if row['val_accuracy'] is not None else '-'
+    print(f"{variant:<10}{row['size_mb']:>10}{accuracy:>10}{row['latency_ms_p50']:>10}{row['latency_ms_p99']:>10}")
+print(f"📊 Report → {report_path}")
@@ -0,0 +1,248 @@
+"""
+Quest Verification Worker Pool
+------------------------------
+Consumes verification jobs from the MongoDB queue (models/verification_job.py)
+in separate processes, so TensorFlow never runs inside the Flask workers.
+Each process loads the trash detector once and scores the images of a whole
+batch of claimed jobs in one forward pass.
+
+Run alongside the web app (with QUEST_VERIFIER_ASYNC=True):
+    python -m ai.verification_worker --processes 2
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+
+from config import Config
+from models.verification_job import JOB_BEFORE_SCORE, JOB_QUEST_COMPLETION, JOB_IMAGE_PAIR
+
+
+class SubmissionClosedError(Exception):
+    """The quest submission was already completed elsewhere; retrying can't help"""
+
+
+def _load_images(job):
+    """
+    Preprocessed arrays for the images a job needs scored
+
+    Returns:
+        list: [(role, array)] where role is 'before' or 'after'
+    """
+    from ai.quest_verifier import preprocess_image
+
+    payload = job['payload']
+    if job['kind'] == JOB_BEFORE_SCORE:
+        return [('before', preprocess_image(payload['before_image']))]
+
+    images = []
+    if payload.get('before_score') is None:
+        images.append(('before', preprocess_image(payload['before_image'])))
+    if payload.get('after_score') is None:
+        images.append(('after', preprocess_image(payload['after_image'])))
+    return images
+
+
+def _current_before_score(job):
+    """Before score stored by a before_score job that finished after enqueue"""
+    from models.quest import quest_submissions_collection
+
+    submission = quest_submissions_collection.find_one(
+        {'_id': job['payload']['submission_id']}, {'before_score': 1}
+    )
+    return submission.get('before_score') if submission else None
+
+
+def _finish_job(job, scores):
+    """Turn the scores for one job into its result and apply side effects"""
+    from ai.quest_verifier import cleanliness_verdict
+    from models.quest import store_before_score, record_quest_verification, mark_quest_verified
+
+    payload = job['payload']
+    kind = job['kind']
+
+    if kind == JOB_BEFORE_SCORE:
+        store_before_score(payload['submission_id'], scores['before'])
+        return {'before_score': scores['before']}
+
+    before_score = scores.get('before', payload.get('before_score'))
+    after_score = scores.get('after', payload.get('after_score'))
+    result = cleanliness_verdict(before_score, after_score)
+
+    if kind == JOB_QUEST_COMPLETION:
+        if not record_quest_verification(
+            payload['submission_id'], job['user_id'], payload['points'],
+            payload['after_image'], result, payload.get('after_hash')
+        ):
+            raise SubmissionClosedError('Quest submission already completed')
+    elif kind == JOB_IMAGE_PAIR and payload.get('quest_id') and result.get('verified'):
+        mark_quest_verified(payload['quest_id'], {
+            'verified': True,
+            'confidence': result.get('confidence', 0),
+            'reason': result.get('reason'),
+            'quest_type': payload.get('quest_type'),
+            'elapsed_time': payload.get('elapsed_time'),
+            'comparison_mode': True
+        }, payload.get('elapsed_time'))
+
+    return result
+
+
+def _finish_out_of_range(job, result):
+    """Complete a quest job that failed the proximity check (no inference needed)"""
+    from models.quest import record_quest_verification
+    from models.verification_job import complete_verification_job
+
+    payload = job['payload']
+    if not record_quest_verification(
+        payload['submission_id'], job['user_id'], payload['points'], payload['after_image'],
+        result, payload.get('after_hash')
+    ):
+        raise SubmissionClosedError('Quest submission already completed')
+    complete_verification_job(job['_id'], result)
+
+
+def _release_job(job):
+    """Clean up after a job that failed for good: drop its uploads, reopen its quest"""
+    from models.verification_job import discard_job_images
+
+    discard_job_images(job)
+    _reopen_submission(job)
+
+
+def _reopen_submission(job):
+    """Give a quest back to the user (status in_progress) so they can retry"""
+    from models.quest import quest_submissions_collection
+
+    if job['kind'] == JOB_QUEST_COMPLETION:
+        quest_submissions_collection.update_one(
+            {'_id': job['payload']['submission_id'], 'status': 'verifying'},
+            {'$set': {'status': 'in_progress'}}
+        )
+
+
+def _fail_job(job, error):
+    """Record a failed attempt; give the quest back to the user on final failure"""
+    from models.verification_job import fail_verification_job
+
+    print(f"[WARN] Verification job {job['_id']} failed: {error}")
+    if fail_verification_job(job['_id'], error, permanent=isinstance(error, SubmissionClosedError)):
+        _release_job(job)
+
+
+def reap_stuck_jobs():
+    """Fail jobs abandoned on their last attempt and reopen their submissions"""
+    from models.verification_job import reap_exhausted_jobs
+
+    for job in reap_exhausted_jobs():
+        print(f"[WARN] Verification job {job['_id']} abandoned on its last attempt")
+        _release_job(job)
+
+
+def process_batch(jobs):
+    """Score every image of the claimed jobs in one forward pass"""
+    from ai.quest_verifier import check_proximity, score_images
+    from models.verification_job import complete_verification_job, discard_job_images
+
+    pending = []  # (job, [(role, array)])
+    for job in jobs:
+        payload = job['payload']
+        try:
+            if job['kind'] == JOB_QUEST_COMPLETION:
+                out_of_range = check_proximity(payload['user_gps'], payload['quest_gps'])
+                if out_of_range:
+                    _finish_out_of_range(job, out_of_range)
+                    continue
+                if payload.get('before_score') is None:
+                    payload['before_score'] = _current_before_score(job)
+            pending.append((job, _load_images(job)))
+        except Exception as e:
+            # Unreadable image: fail this job without poisoning the batch
+            _fail_job(job, e)
+
+    if not pending:
+        return
+
+    arrays = [array for _, images in pending for _, array in images]
+    try:
+        flat_scores = score_images(arrays, strict=True)
+    except Exception as e:
+        for job, _ in pending:
+            _fail_job(job, e)
+        return
+
+    offset = 0
+    for job, images in pending:
+        scores = {}
+        for role, _ in images:
+            scores[role] = flat_scores[offset]
+            offset += 1
+        try:
+            complete_verification_job(job['_id'], _finish_job(job, scores))
+        except Exception as e:
+            _fail_job(job, e)
+            continue
+        discard_job_images(job)
+
+
+def run_worker(index):
+    """Worker process loop: load the model once, then claim and score batches"""
+    from ai.quest_verifier import warm_up
+    from models.verification_job import claim_verification_jobs, record_worker_heartbeat
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    if not warm_up():
+        print(f"[ERROR] Worker {worker_id} could not load the trash detector")
+        return
+    print(f"[OK] Verification worker {worker_id} ready")
+
+    next_heartbeat = 0
+    while True:
+        try:
+            # Lets the web app's /ai/verify-quest/ready see this worker
+            if time.monotonic() >= next_heartbeat:
+                record_worker_heartbeat(worker_id)
+                next_heartbeat = time.monotonic() + Config.VERIFICATION_WORKER_HEARTBEAT_SECONDS
+            reap_stuck_jobs()
+            jobs = claim_verification_jobs(worker_id, Config.VERIFICATION_WORKER_BATCH_SIZE)
+        except Exception as e:
+            print(f"[WARN] Worker {worker_id} could not claim jobs: {e}")
+            jobs = []
+
+        if not jobs:
+            time.sleep(Config.VERIFICATION_WORKER_POLL_SECONDS)
+            continue
+
+        started = time.monotonic()
+        process_batch(jobs)
+        print(f"[AI] Worker {worker_id} verified {len(jobs)} job(s) in {time.monotonic() - started:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run quest verification workers')
+    parser.add_argument('--processes', type=int, default=Config.VERIFICATION_WORKER_PROCESSES,
+                        help='Number of worker processes (each loads its own model)')
+    args = parser.parse_args()
+
+    # spawn, not fork: each process needs its own MongoClient and TF runtime
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=run_worker, args=(index,), name=f'verifier-{index}')
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    print(f"[OK] Started {len(processes)} verification worker(s)")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,8 +15,10 @@ app.config.from_object(Config)
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
-# Initialize Socket.IO
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# Initialize Socket.IO (behind several web processes, set SOCKETIO_MESSAGE_QUEUE
+# so events such as 'quest_verification' reach clients of every process)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading',
+                    message_queue=Config.SOCKETIO_MESSAGE_QUEUE)
 
 # Import and register blueprints
 from routes.user_routes import user_bp
@@ -40,6 +42,13 @@ app.register_blueprint(chat_bp, url_prefix='/api/chat')
 app.register_blueprint(local_guide_bp, url_prefix='/api/local-guide')
 app.register_blueprint(posts_bp, url_prefix='/api/posts')
 
+# Load the trash detector in the background so the first quest
+# verification doesn't pay for the model load
+# (not needed when verification runs in ai/verification_worker.py processes)
+if Config.QUEST_VERIFIER_WARMUP and not Config.QUEST_VERIFIER_ASYNC:
+    from ai.quest_verifier import start_background_warmup
+    start_background_warmup()
+
 # ===========================
 # React Frontend Routes
 # ===========================
@@ -96,6 +105,7 @@ def index():
                 "verify_quest": "POST /ai/verify-quest",
                 "chat": "POST /ai/chat",
                 "generate_itinerary": "POST /ai/generate-itinerary",
+                "stream_itinerary": "POST /ai/generate-itinerary/stream",
                 "health": "GET /ai/health"
             },
             "users": {
@@ -216,6 +226,78 @@ def handle_ai_chat(data):
             'timestamp': datetime.now().isoformat()
         })
 
+@socketio.on('watch_verification')
+def handle_watch_verification(data):
+    """Subscribe to the result of an asynchronous quest verification job (owner's token required)"""
+    from models.verification_job import get_verification_job
+    from utils.jwt_utils import decode_token
+    
+    job_id = data.get('job_id')
+    payload = decode_token(data.get('token') or '')
+    if not job_id or not payload:
+        return
+    job = get_verification_job(job_id)
+    if job and str(job.get('user_id')) == str(payload.get('user_id')):
+        join_room(f'verification_{job_id}')
+
+def notify_verification_results():
+    """
+    Emit 'quest_verification' to watchers of each job the verification
+    workers finish (QUEST_VERIFIER_ASYNC)
+    
+    Each result is claimed by exactly one web process. With several
+    processes it only reaches watchers connected elsewhere through
+    SOCKETIO_MESSAGE_QUEUE; without one, clients should poll the job's
+    status_url as well.
+    """
+    from models.verification_job import claim_finished_job_for_notification, serialize_verification_job
+    
+    while True:
+        try:
+            job = claim_finished_job_for_notification()
+        except Exception as e:
+            print(f"[WARN] Verification notifier: {e}")
+            job = None
+        
+        if not job:
+            socketio.sleep(Config.VERIFICATION_WORKER_POLL_SECONDS)
+            continue
+        
+        socketio.emit('quest_verification', serialize_verification_job(job), room=f"verification_{job['_id']}")
+
+if Config.QUEST_VERIFIER_ASYNC:
+    socketio.start_background_task(notify_verification_results)
+
+def maintain_posts():
+    """
+    Periodic post upkeep: keep stored trending scores on the current epoch's
+    scale and expire stories (which also drops them from hashtag rollups).
+    The one-time post data migrations (migrate_posts.py) run first. A run is
+    also scheduled right after each epoch rollover so scores are rescaled
+    as soon as the scale changes.
+    """
+    from models.post import rescore_trending_posts, cleanup_expired_stories, seconds_until_next_epoch
+    from migrate_posts import run_migrations
+    
+    try:
+        run_migrations()
+    except Exception as e:
+        print(f"[WARN] Post migrations: {e}")
+    
+    while True:
+        try:
+            updated = rescore_trending_posts()
+            if updated:
+                print(f"[OK] Rescored {updated} trending post(s)")
+            expired = cleanup_expired_stories()
+            if expired:
+                print(f"[OK] Expired {expired} stor{'y' if expired == 1 else 'ies'}")
+        except Exception as e:
+            print(f"[WARN] Post maintenance: {e}")
+        socketio.sleep(min(Config.POST_MAINTENANCE_INTERVAL_SECONDS, seconds_until_next_epoch() + 1))
+
+socketio.start_background_task(maintain_posts)
+
 @socketio.on('typing')
 def handle_typing(data):
     """Handle typing indicator"""
@@ -53,3 +53,61 @@ class Config:
     # Quest settings
     MIN_QUEST_REWARD = 10
     MAX_QUEST_REWARD = 1000
+    
+    # AI chat context settings
+    AI_CHAT_RECENT_TURNS = int(os.getenv('AI_CHAT_RECENT_TURNS', 4))  # Messages sent verbatim
+    AI_CHAT_SUMMARY_EVERY = int(os.getenv('AI_CHAT_SUMMARY_EVERY', 4))  # Fold older messages every N
+    AI_CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('AI_CHAT_CONTEXT_TOKEN_BUDGET', 1200))
+    
+    # AI conversation log (write-behind buffer)
+    AI_LOG_BATCH_SIZE = int(os.getenv('AI_LOG_BATCH_SIZE', 50))
+    AI_LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv('AI_LOG_FLUSH_INTERVAL_SECONDS', 2))
+    AI_LOG_MAX_PENDING = int(os.getenv('AI_LOG_MAX_PENDING', 5000))
+    
+    # Itinerary generation fan-out (LLM + transport + hotel searches)
+    ITINERARY_FANOUT_TIMEOUT_SECONDS = float(os.getenv('ITINERARY_FANOUT_TIMEOUT_SECONDS', 25))
+    ITINERARY_FANOUT_WORKERS = int(os.getenv('ITINERARY_FANOUT_WORKERS', 16))
+    
+    # LLM calls (telemetry and optional per-provider concurrency limit; 0 = unlimited)
+    LLM_MAX_CONCURRENT_CALLS = int(os.getenv('LLM_MAX_CONCURRENT_CALLS', 0))
+    LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', 5))
+    
+    # Quest verification (trash detector inference)
+    QUEST_VERIFIER_MICROBATCH = os.getenv('QUEST_VERIFIER_MICROBATCH', 'False') == 'True'
+    QUEST_VERIFIER_MICROBATCH_SIZE = int(os.getenv('QUEST_VERIFIER_MICROBATCH_SIZE', 16))
+    QUEST_VERIFIER_MICROBATCH_WAIT_MS = float(os.getenv('QUEST_VERIFIER_MICROBATCH_WAIT_MS', 5))
+    QUEST_VERIFIER_BACKEND = os.getenv('QUEST_VERIFIER_BACKEND', 'auto')  # auto, tflite, keras
+    QUEST_VERIFIER_THREADS = int(os.getenv('QUEST_VERIFIER_THREADS', 0)) or None  # TFLite interpreter threads
+    QUEST_VERIFIER_MODEL_VARIANT = os.getenv('QUEST_VERIFIER_MODEL_VARIANT', 'float32')  # TFLite export: float32, dynamic, int8
+    QUEST_VERIFIER_WARMUP = os.getenv('QUEST_VERIFIER_WARMUP', 'True') == 'True'  # Load model at startup
+    QUEST_VERIFIER_READY_TIMEOUT_SECONDS = float(os.getenv('QUEST_VERIFIER_READY_TIMEOUT_SECONDS', 10))
+    QUEST_IMAGE_DUPLICATE_DISTANCE = int(os.getenv('QUEST_IMAGE_DUPLICATE_DISTANCE', 3))  # Max dHash bits apart for a duplicate (<= 3, see utils/image_hash.py)
+    QUEST_IMAGE_MIN_SIDE = int(os.getenv('QUEST_IMAGE_MIN_SIDE', 224))  # Quality gate: shortest side in px
+    QUEST_IMAGE_MIN_BRIGHTNESS = float(os.getenv('QUEST_IMAGE_MIN_BRIGHTNESS', 0.08))  # Mean luminance 0–1
+    QUEST_IMAGE_MAX_BRIGHTNESS = float(os.getenv('QUEST_IMAGE_MAX_BRIGHTNESS', 0.92))
+    QUEST_IMAGE_MAX_CLIPPED = float(os.getenv('QUEST_IMAGE_MAX_CLIPPED', 0.5))  # Max share of near-black/near-white pixels
+    QUEST_IMAGE_MIN_SHARPNESS = float(os.getenv('QUEST_IMAGE_MIN_SHARPNESS', 30))  # Laplacian variance at 224x224
+    
+    # Out-of-process quest verification (python -m ai.verification_worker)
+    QUEST_VERIFIER_ASYNC = os.getenv('QUEST_VERIFIER_ASYNC', 'False') == 'True'  # Enqueue jobs instead of verifying in-request
+    VERIFICATION_WORKER_PROCESSES = int(os.getenv('VERIFICATION_WORKER_PROCESSES', 2))
+    VERIFICATION_WORKER_BATCH_SIZE = int(os.getenv('VERIFICATION_WORKER_BATCH_SIZE', 16))
+    VERIFICATION_WORKER_POLL_SECONDS = float(os.getenv('VERIFICATION_WORKER_POLL_SECONDS', 0.5))
+    VERIFICATION_WORKER_HEARTBEAT_SECONDS = float(os.getenv('VERIFICATION_WORKER_HEARTBEAT_SECONDS', 10))
+    VERIFICATION_JOB_LEASE_SECONDS = int(os.getenv('VERIFICATION_JOB_LEASE_SECONDS', 120))
+    VERIFICATION_JOB_MAX_ATTEMPTS = int(os.getenv('VERIFICATION_JOB_MAX_ATTEMPTS', 3))
+    VERIFICATION_JOB_RETENTION_HOURS = float(os.getenv('VERIFICATION_JOB_RETENTION_HOURS', 72))  # Finished jobs expire after this
+    # Message queue URL (e.g. redis://localhost:6379/0) shared by all web processes, so a
+    # Socket.IO event emitted by one process reaches clients connected to any of them
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+    
+    # Post feeds: cached author profiles (name, profile image)
+    AUTHOR_CACHE_TTL_SECONDS = float(os.getenv('AUTHOR_CACHE_TTL_SECONDS', 60))
+    AUTHOR_CACHE_MAX_ENTRIES = int(os.getenv('AUTHOR_CACHE_MAX_ENTRIES', 10000))
+
+    # Post feeds: time-decayed trending score (engagement halves every half-life)
+    TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+    TRENDING_EPOCH_DAYS = int(os.getenv('TRENDING_EPOCH_DAYS', 28))  # Score scale resets this often
+
+    # Post feeds: periodic upkeep (trending rescoring, story expiry)
+    POST_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv('POST_MAINTENANCE_INTERVAL_SECONDS', 3600))
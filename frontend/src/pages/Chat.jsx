@@ -238,6 +238,7 @@ export default function Chat() {
     const buildChatContext = () => {
         const lastMessages = messages.slice(-10)
         return lastMessages.map(msg => ({
+            id: msg.id,
             role: msg.isAI ? 'assistant' : 'user',
             content: msg.text
         }))
@@ -262,7 +263,7 @@ export default function Chat() {
 
         try {
             const chatContext = buildChatContext()
-            const response = await aiApi.chat(text, { history: chatContext })
+            const response = await aiApi.chat(text, { history: chatContext, conversation_id: getChatStorageKey() })
             const aiResponseText = response.data.message || response.data.response || "I'm here to help with your travel queries!"
 
             const aiResponse = {
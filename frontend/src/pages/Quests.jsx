@@ -172,6 +172,17 @@ export default function Quests() {
         setVerificationResult(null)
     }
 
+    // Poll a queued verification job (202 from /ai/verify-quest) until it finishes
+    const waitForVerificationJob = async (jobId) => {
+        for (let attempt = 0; attempt < 60; attempt++) {
+            await new Promise((resolve) => setTimeout(resolve, 2000))
+            const { data: job } = await aiApi.verifyQuestJob(jobId)
+            if (job.status === 'done') return job.result
+            if (job.status === 'failed') throw new Error(job.error || 'Verification failed')
+        }
+        throw new Error('Verification is taking longer than expected')
+    }
+
     const submitVerification = async () => {
         setVerifying(true)
         try {
@@ -185,6 +196,10 @@ export default function Quests() {
                 location: selectedQuest?.location
             })
 
+            if (response.status === 202 && response.data.job_id) {
+                response.data.verification = await waitForVerificationJob(response.data.job_id)
+            }
+
             if (response.data.verification?.verified) {
                 setVerificationResult({
                     success: true,
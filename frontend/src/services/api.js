@@ -94,6 +94,7 @@ export const tripsApi = {
 export const aiApi = {
     generateHeatmap: (data) => api.post('/ai/heatmap', data),
     verifyQuest: (data) => api.post('/ai/verify-quest', data),
+    verifyQuestJob: (jobId) => api.get(`/ai/verify-quest/jobs/${jobId}`),
     chat: (message, context) => api.post('/ai/chat', { message, context }),
     generateItinerary: (data) => api.post('/ai/generate-itinerary', data),
     health: () => api.get('/ai/health'),
@@ -227,8 +228,8 @@ export const postsApi = {
     }),
 
     // Get posts within user's geographic radius
-    getNearbyPosts: (lat, lng, radius = 10, limit = 50) =>
-        api.get('/api/posts/nearby', { params: { lat, lng, radius, limit } }),
+    getNearbyPosts: (lat, lng, radius = 10, limit = 50, cursor) =>
+        api.get('/api/posts/nearby', { params: { lat, lng, radius, limit, cursor } }),
 
     // Get a single post by ID
     getPost: (id) => api.get(`/api/posts/${id}`),
@@ -249,8 +250,8 @@ export const postsApi = {
     getMediaUrl: (fileId) => `${API_BASE_URL}/api/posts/media/${fileId}`,
 
     // Comments
-    getComments: (postId, limit = 50) =>
-        api.get(`/api/posts/${postId}/comments`, { params: { limit } }),
+    getComments: (postId, limit = 50, cursor) =>
+        api.get(`/api/posts/${postId}/comments`, { params: { limit, cursor } }),
     addComment: (postId, text) =>
         api.post(`/api/posts/${postId}/comments`, { text }),
     deleteComment: (postId, commentId) =>
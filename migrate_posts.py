@@ -0,0 +1,49 @@
+"""
+One-time post data migrations
+
+Moves data out of legacy post document layouts into the collections the
+posts API now reads, and builds the hashtag rollups. Every step is idempotent; the web app also runs them
+once at startup (app.py maintain_posts), so this script is only needed to
+migrate ahead of a deploy or to re-run a step by hand.
+
+Usage:
+    python migrate_posts.py            # run every step
+    python migrate_posts.py likes      # run selected steps
+"""
+
+import argparse
+
+from models.post import (
+    migrate_post_likes, migrate_post_comments, migrate_hashtag_rollups, mark_migration_complete
+)
+
+# Step name -> (function, what its return value counts)
+MIGRATIONS = {
+    'likes': (migrate_post_likes, 'post(s) with legacy likes arrays migrated'),
+    'comments': (migrate_post_comments, 'post(s) with embedded comments migrated'),
+    'hashtags': (migrate_hashtag_rollups, 'hashtag rollup(s) built')
+}
+
+
+def run_migrations(names=None):
+    """
+    Run the named migration steps (all of them by default), in order
+
+    Each finished step is recorded, which switches off the per-request
+    legacy fallbacks in models/post.py (see migration_complete).
+    """
+    for name in names or MIGRATIONS:
+        migrate, description = MIGRATIONS[name]
+        print(f"[OK] {name}: {migrate()} {description}")
+        mark_migration_complete(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run one-time post data migrations')
+    parser.add_argument('steps', nargs='*', choices=list(MIGRATIONS), help='Steps to run (default: all)')
+    args = parser.parse_args()
+    run_migrations(args.steps)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,37 @@ AI Chat History model - stores user chatbot conversations
 Each user has their own chat history document with up to 20 messages
 """
 from models import db
+from pymongo.errors import DuplicateKeyError
+from config import Config
+from utils.write_buffer import WriteBehindBuffer
 from datetime import datetime
 
 ai_chat_collection = db.ai_chat_history
+ai_chat_logs_collection = db.ai_chat_logs
+ai_chat_summaries_collection = db.ai_chat_summaries  # Rolling summary per (user, conversation)
+
+# Unsummarized messages kept per conversation if summarizing keeps failing
+MAX_PENDING_MESSAGES = 50
+
+try:
+    # Client conversation IDs are guessable, so summaries are scoped to their user
+    ai_chat_summaries_collection.create_index([('user_id', 1), ('conversation_id', 1)], unique=True)
+except Exception as e:
+    print(f"Note: AI chat summary index may already exist: {e}")
+
+try:
+    # Superseded by the (user_id, conversation_id) index above
+    ai_chat_summaries_collection.drop_index('conversation_id_1')
+except Exception:
+    pass
+
+# /ai/chat exchanges are logged in batches off the request path
+_ai_log_buffer = WriteBehindBuffer(
+    ai_chat_logs_collection,
+    batch_size=Config.AI_LOG_BATCH_SIZE,
+    flush_interval=Config.AI_LOG_FLUSH_INTERVAL_SECONDS,
+    max_pending=Config.AI_LOG_MAX_PENDING
+)
 
 def get_user_chat_history(user_id):
     """
@@ -82,7 +110,10 @@ def clear_chat_history(user_id):
     """Clear all chat history for a user"""
     return ai_chat_collection.update_one(
         {'user_id': user_id},
-        {'$set': {'messages': [], 'updated_at': datetime.utcnow()}}
+        {'$set': {
+            'messages': [],
+            'updated_at': datetime.utcnow()
+        }}
     )
 
 def get_chat_context(user_id):
@@ -97,3 +128,99 @@ def get_chat_context(user_id):
         {'role': msg['role'], 'content': msg['text']}
         for msg in messages
     ]
+
+def get_conversation_summary(user_id, conversation_id):
+    """
+    Get the rolling summary of one of a user's conversations' older AI chat turns
+    
+    Returns:
+        dict: {'summary': str, 'pending': list, 'last_message_id': id or None}
+              pending holds messages that left the client's recent window
+              but are not in the summary yet; last_message_id is the newest
+              message already stored (summarized or pending)
+    """
+    doc = ai_chat_summaries_collection.find_one({'user_id': user_id, 'conversation_id': conversation_id})
+    if not doc:
+        return {'summary': '', 'pending': [], 'last_message_id': None}
+    return {
+        'summary': doc.get('summary', ''),
+        'pending': doc.get('pending', []),
+        'last_message_id': doc.get('last_message_id')
+    }
+
+def add_pending_messages(user_id, conversation_id, messages, last_message_id):
+    """
+    Store messages that slid out of the client's recent window
+    
+    Args:
+        user_id: Authenticated owner of the conversation
+        conversation_id: Client conversation/session ID
+        messages: [{'id', 'role', 'content'}] newer than the stored last_message_id
+        last_message_id: ID of the newest message in `messages`
+    
+    Returns:
+        bool: False if a concurrent request already stored them
+    """
+    try:
+        result = ai_chat_summaries_collection.update_one(
+            {
+                'user_id': user_id,
+                'conversation_id': conversation_id,
+                '$or': [
+                    {'last_message_id': None},
+                    {'last_message_id': {'$lt': last_message_id}}
+                ]
+            },
+            {
+                '$push': {'pending': {'$each': messages, '$slice': -MAX_PENDING_MESSAGES}},
+                '$set': {'last_message_id': last_message_id, 'updated_at': datetime.utcnow()},
+                '$setOnInsert': {
+                    'user_id': user_id,
+                    'conversation_id': conversation_id,
+                    'summary': '',
+                    'created_at': datetime.utcnow()
+                }
+            },
+            upsert=True
+        )
+        return result.modified_count > 0 or result.upserted_id is not None
+    except DuplicateKeyError:
+        return False  # Document exists and already covers these messages
+
+def update_conversation_summary(user_id, conversation_id, summary, folded_ids):
+    """
+    Store the rolling summary and drop the pending messages it now covers
+    
+    Args:
+        user_id: Authenticated owner of the conversation
+        conversation_id: Client conversation/session ID
+        summary: Updated summary text
+        folded_ids: IDs of the pending messages folded into `summary`
+    """
+    return ai_chat_summaries_collection.update_one(
+        {'user_id': user_id, 'conversation_id': conversation_id},
+        {
+            '$set': {'summary': summary, 'summary_updated_at': datetime.utcnow()},
+            '$pull': {'pending': {'id': {'$in': folded_ids}}}
+        }
+    )
+
+def get_ai_log_stats():
+    """Pending and dropped counts of the batched AI exchange log"""
+    return _ai_log_buffer.stats()
+
+def log_ai_exchange(user_id, message, response, context_used=None, trip_id=None, model=None):
+    """
+    Queue a chatbot exchange for the AI log collection
+    
+    The write happens in the background, batched with other exchanges.
+    """
+    _ai_log_buffer.add({
+        'user_id': user_id,
+        'message': message,
+        'response': response,
+        'context_used': context_used,
+        'trip_id': trip_id,
+        'model': model,
+        'timestamp': datetime.utcnow()
+    })
@@ -5,11 +5,24 @@ Stores posts with geospatial location for proximity-based content filtering
 from models import db
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
+import base64
+import time
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import gridfs
+from config import Config
+from utils.geo_utils import (
+    EARTH_RADIUS_KM, distances_from, latlng_from_geojson,
+    geohash_encode, geohash_precision_for_radius, geohash_cells_covering
+)
 
 # MongoDB collections
 posts_collection = db.posts
 post_media_collection = db.post_media
+post_likes_collection = db.post_likes  # One document per (post_id, user_id) like
+post_comments_collection = db.post_comments  # One document per comment
+hashtag_rollups_collection = db.hashtag_rollups  # Hashtag counts per (geohash cell, hour)
+post_migrations_collection = db.post_migrations  # One document per finished migrate_posts.py step
 
 # GridFS for storing media files
 fs = gridfs.GridFS(db, collection='post_files')
@@ -17,9 +30,44 @@ fs = gridfs.GridFS(db, collection='post_files')
 # Ensure geospatial index exists
 try:
     posts_collection.create_index([("location", "2dsphere")])
+    # Nearby feed: keyset bounds on (created_at, _id) are checked in the index
+    posts_collection.create_index([("location", "2dsphere"), ("created_at", -1), ("_id", -1)])
+    # Trending: walk posts in score order, checking the geo filter in the index
+    posts_collection.create_index([("trending_score", -1), ("location", "2dsphere")])
+    # Trending rescore: stale scores among the posts of the trending window
+    posts_collection.create_index([("created_at", -1), ("trending_epoch", 1)])
 except Exception as e:
     print(f"Note: Geo index may already exist: {e}")
 
+try:
+    post_likes_collection.create_index([("post_id", 1), ("user_id", 1)], unique=True)
+except Exception as e:
+    print(f"Note: Post likes index may already exist: {e}")
+
+try:
+    post_comments_collection.create_index([("post_id", 1), ("created_at", 1), ("_id", 1)])
+except Exception as e:
+    print(f"Note: Post comments index may already exist: {e}")
+
+# Hashtag rollups are kept at these geohash precisions (~20km and ~5km cells)
+HASHTAG_ROLLUP_PRECISIONS = (4, 5)
+HASHTAG_WINDOW_DAYS = 7
+
+
+def _create_hashtag_rollup_indexes(collection):
+    collection.create_index([("cell", 1), ("bucket", 1), ("hashtag", 1)], unique=True)
+    # Buckets older than the trending window (plus a day of slack) expire on their own
+    collection.create_index("bucket", expireAfterSeconds=(HASHTAG_WINDOW_DAYS + 1) * 86400)
+
+try:
+    _create_hashtag_rollup_indexes(hashtag_rollups_collection)
+except Exception as e:
+    print(f"Note: Hashtag rollup indexes may already exist: {e}")
+
+# Feed reads never need the legacy likes/comments arrays
+# (see migrate_post_likes and migrate_post_comments) or the score epoch
+FEED_PROJECTION = {'likes': 0, 'comments': 0, 'trending_epoch': 0}
+
 
 def create_post(user_id, post_type, caption, location_coords, location_name, 
                 media_files=None, visibility_radius_km=10):
@@ -87,11 +135,11 @@ def create_post(user_id, post_type, caption, location_coords, location_name,
         'visibility_radius_km': visibility_radius_km,
         'media': media,
         'views': 0,
-        'likes': [],  # Array of user_ids who liked
-        'likes_count': 0,
-        'comments': [],  # Array of comment objects
-        'comments_count': 0,
+        'likes_count': 0,  # Likes themselves live in post_likes
+        'comments_count': 0,  # Comments live in post_comments
         'shares_count': 0,
+        'trending_score': 0,
+        'trending_epoch': trending_epoch(),
         'created_at': datetime.utcnow(),
         'updated_at': datetime.utcnow(),
         'expires_at': expires_at,
@@ -100,9 +148,37 @@ def create_post(user_id, post_type, caption, location_coords, location_name,
     
     result = posts_collection.insert_one(post)
     post['_id'] = result.inserted_id
+    update_hashtag_rollups(post, 1)
     return post
 
 
+# ===========================
+# Keyset Cursors
+# ===========================
+
+def encode_cursor(created_at, doc_id):
+    """Opaque pagination cursor for the (created_at, _id) position of a document"""
+    raw = f"{created_at.isoformat()}|{doc_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of encode_cursor
+
+    Returns:
+        tuple: (created_at datetime, ObjectId)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        created_at, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
 def extract_hashtags(text):
     """Extract hashtags from text"""
     import re
@@ -112,21 +188,47 @@ def extract_hashtags(text):
     return list(set(hashtags))  # Remove duplicates
 
 
-def get_nearby_posts(longitude, latitude, radius_km=10, limit=50, skip=0, post_type=None):
+def get_nearby_posts(longitude, latitude, radius_km=10, limit=50, cursor=None, post_type=None):
     """
-    Get posts within a geographic radius using MongoDB $geoNear
+    Get posts within a geographic radius using MongoDB $geoNear, newest first
+    
+    Pagination is keyset-based: the cursor's (created_at, _id) bound is part
+    of the $geoNear query, so posts from earlier pages are never re-read and
+    deep pages cost the same as the first one.
     
     Args:
         longitude: User's longitude
         latitude: User's latitude  
         radius_km: Radius in kilometers to search
         limit: Maximum posts to return
-        skip: Number of posts to skip (pagination)
+        cursor: next_cursor from the previous page (None for the first page)
         post_type: Optional filter by post type
         
     Returns:
-        List of posts within radius, sorted by distance
+        tuple: (posts, next_cursor) - next_cursor is None on the last page
+        
+    Raises:
+        ValueError: If the cursor is malformed
     """
+    query = {
+        'is_active': True,
+        '$or': [
+            {'expires_at': None},
+            {'expires_at': {'$gt': datetime.utcnow()}}
+        ]
+    }
+    
+    # Add post_type filter if specified
+    if post_type:
+        query['post_type'] = post_type
+    
+    if cursor:
+        created_at, post_id = decode_cursor(cursor)
+        query['$and'] = [{'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': post_id}}
+        ]}]
+    
     pipeline = [
         {
             '$geoNear': {
@@ -134,41 +236,37 @@ def get_nearby_posts(longitude, latitude, radius_km=10, limit=50, skip=0, post_t
                     'type': 'Point',
                     'coordinates': [longitude, latitude]
                 },
+                'key': 'location',  # Several 2dsphere indexes cover location
                 'distanceField': 'distance_meters',
                 'maxDistance': radius_km * 1000,  # Convert km to meters
                 'spherical': True,
-                'query': {
-                    'is_active': True,
-                    '$or': [
-                        {'expires_at': None},
-                        {'expires_at': {'$gt': datetime.utcnow()}}
-                    ]
-                }
+                'query': query
             }
         },
-        {'$sort': {'created_at': -1}},
-        {'$skip': skip},
-        {'$limit': limit}
+        {'$sort': {'created_at': -1, '_id': -1}},
+        {'$limit': limit + 1},
+        {'$project': FEED_PROJECTION}
     ]
     
-    # Add post_type filter if specified
-    if post_type:
-        pipeline[0]['$geoNear']['query']['post_type'] = post_type
-    
     posts = list(posts_collection.aggregate(pipeline))
     
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1]['created_at'], posts[-1]['_id'])
+    
     # Convert ObjectId to string for JSON serialization
     for post in posts:
         post['_id'] = str(post['_id'])
         post['distance_km'] = round(post.get('distance_meters', 0) / 1000, 2)
         
-    return posts
+    return posts, next_cursor
 
 
 def get_post_by_id(post_id):
     """Get a single post by ID"""
     try:
-        post = posts_collection.find_one({'_id': ObjectId(post_id)})
+        post = posts_collection.find_one({'_id': ObjectId(post_id)}, FEED_PROJECTION)
         if post:
             post['_id'] = str(post['_id'])
         return post
@@ -179,7 +277,7 @@ def get_post_by_id(post_id):
 def get_user_posts(user_id, limit=50, skip=0):
     """Get all posts by a specific user"""
     posts = list(posts_collection.find(
-        {'user_id': user_id, 'is_active': True}
+        {'user_id': user_id, 'is_active': True}, FEED_PROJECTION
     ).sort('created_at', -1).skip(skip).limit(limit))
     
     for post in posts:
@@ -191,45 +289,170 @@ def get_user_posts(user_id, limit=50, skip=0):
 def like_post(post_id, user_id):
     """
     Toggle like on a post
+
+    The unique (post_id, user_id) index decides the toggle atomically: the
+    insert either succeeds (like) or hits the duplicate (unlike), so
+    concurrent taps can't double-count. The counter update is guarded so
+    likes_count never goes below zero.
+
     Returns: {'liked': bool, 'likes_count': int}
     """
     try:
-        post = posts_collection.find_one({'_id': ObjectId(post_id)})
-        if not post:
-            return None
-            
-        likes = post.get('likes', [])
-        
-        if user_id in likes:
-            # Unlike
-            posts_collection.update_one(
-                {'_id': ObjectId(post_id)},
-                {
-                    '$pull': {'likes': user_id},
-                    '$inc': {'likes_count': -1}
-                }
-            )
-            return {'liked': False, 'likes_count': post.get('likes_count', 1) - 1}
+        post_oid = ObjectId(post_id)
+        _ensure_likes_migrated(post_oid)
+        like = {'post_id': post_oid, 'user_id': user_id}
+        try:
+            post_likes_collection.insert_one({**like, 'created_at': datetime.utcnow()})
+            liked = True
+        except DuplicateKeyError:
+            liked = False
+            removed = post_likes_collection.find_one_and_delete(like, projection={'created_at': 1})
+            if not removed:
+                # A concurrent unlike got there first; nothing to decrement
+                post = posts_collection.find_one({'_id': post_oid}, {'likes_count': 1})
+                return {'liked': False, 'likes_count': post.get('likes_count', 0)} if post else None
+
+        if liked:
+            query, update = {'_id': post_oid}, engagement_update('likes_count', 1)
         else:
-            # Like
-            posts_collection.update_one(
-                {'_id': ObjectId(post_id)},
-                {
-                    '$push': {'likes': user_id},
-                    '$inc': {'likes_count': 1}
-                }
-            )
-            return {'liked': True, 'likes_count': post.get('likes_count', 0) + 1}
+            query = {'_id': post_oid, 'likes_count': {'$gt': 0}}
+            update = engagement_update('likes_count', -1, event_at=removed.get('created_at'))
+        post = posts_collection.find_one_and_update(
+            query,
+            update,
+            projection={'likes_count': 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+        if post is None:
+            if liked:
+                # No such post: undo the like
+                post_likes_collection.delete_one(like)
+                return None
+            return {'liked': False, 'likes_count': 0} if posts_collection.find_one({'_id': post_oid}, {'_id': 1}) else None
+        return {'liked': liked, 'likes_count': post.get('likes_count', 0)}
     except:
         return None
 
 
+def get_liked_post_ids(user_id, post_ids):
+    """
+    Which of `post_ids` the user has liked, in one indexed $in query
+
+    Until migrate_posts.py has moved every legacy likes array, posts are
+    also checked against theirs (by _id, without loading the array).
+
+    Returns:
+        set: Post IDs (as strings)
+    """
+    if not user_id or not post_ids:
+        return set()
+    post_oids = [ObjectId(pid) for pid in post_ids]
+    likes = post_likes_collection.find(
+        {'post_id': {'$in': post_oids}, 'user_id': user_id},
+        {'post_id': 1, '_id': 0}
+    )
+    liked = {str(like['post_id']) for like in likes}
+    if not migration_complete('likes'):
+        legacy = posts_collection.find({'_id': {'$in': post_oids}, 'likes': user_id}, {'_id': 1})
+        liked |= {str(post['_id']) for post in legacy}
+    return liked
+
+
+# Migration name -> True once finished, else the monotonic time its
+# "not finished" answer is trusted until
+_migration_state = {}
+_MIGRATION_RECHECK_SECONDS = 60
+
+
+def mark_migration_complete(name):
+    """Record that migrate_posts.py step `name` has run to completion"""
+    post_migrations_collection.update_one(
+        {'_id': name}, {'$set': {'completed_at': datetime.utcnow()}}, upsert=True
+    )
+    _migration_state[name] = True
+
+
+def migration_complete(name):
+    """
+    Whether migrate_posts.py step `name` has finished
+
+    The legacy-layout fallbacks are skipped once it has. A finished step
+    is cached for good; an unfinished one is rechecked at most every
+    _MIGRATION_RECHECK_SECONDS, so a migration run elsewhere is picked up.
+    """
+    state = _migration_state.get(name)
+    if state is True:
+        return True
+    now = time.monotonic()
+    if state is not None and now < state:
+        return False
+    done = post_migrations_collection.find_one({'_id': name}, {'_id': 1}) is not None
+    _migration_state[name] = True if done else now + _MIGRATION_RECHECK_SECONDS
+    return done
+
+
+def _migrate_likes_of(post):
+    """
+    Move one post's legacy likes array into post_likes
+
+    The array has no like times; they are dated at the post's creation,
+    where rescore_trending_posts counted them, so an unlike removes what
+    the like added to the score.
+    """
+    likers = post.get('likes') or []
+    liked_at = post.get('created_at') or datetime.utcnow()
+    if likers:
+        try:
+            post_likes_collection.insert_many(
+                [{'post_id': post['_id'], 'user_id': uid, 'created_at': liked_at}
+                 for uid in dict.fromkeys(likers)],
+                ordered=False
+            )
+        except BulkWriteError:
+            pass  # Duplicates from a previous run
+    posts_collection.update_one(
+        {'_id': post['_id']},
+        {
+            '$set': {'likes_count': post_likes_collection.count_documents({'post_id': post['_id']})},
+            '$unset': {'likes': ''}
+        }
+    )
+
+
+def _ensure_likes_migrated(post_oid):
+    """Migrate a single post's legacy likes before they are toggled (until migrate_posts.py has run)"""
+    if migration_complete('likes'):
+        return
+    post = posts_collection.find_one({'_id': post_oid, 'likes': {'$exists': True}}, {'likes': 1, 'created_at': 1})
+    if post:
+        _migrate_likes_of(post)
+
+
+def migrate_post_likes(batch_size=500):
+    """
+    One-off migration: move legacy `likes` arrays into post_likes
+
+    Run by migrate_posts.py (and once at app startup). Safe to re-run;
+    likes already copied are skipped by the unique index.
+
+    Returns:
+        int: Number of posts migrated
+    """
+    migrated = 0
+    cursor = posts_collection.find({'likes': {'$exists': True}}, {'likes': 1, 'created_at': 1}, batch_size=batch_size)
+    for post in cursor:
+        _migrate_likes_of(post)
+        migrated += 1
+    return migrated
+
+
 def record_view(post_id, user_id):
     """Record a view on a post (increments view count)"""
     try:
         posts_collection.update_one(
             {'_id': ObjectId(post_id)},
-            {'$inc': {'views': 1}}
+            engagement_update('views', 1)
         )
         return True
     except:
@@ -242,11 +465,15 @@ def delete_post(post_id, user_id):
     Only allows deletion by the post owner
     """
     try:
-        result = posts_collection.update_one(
-            {'_id': ObjectId(post_id), 'user_id': user_id},
-            {'$set': {'is_active': False, 'updated_at': datetime.utcnow()}}
+        post = posts_collection.find_one_and_update(
+            {'_id': ObjectId(post_id), 'user_id': user_id, 'is_active': True},
+            {'$set': {'is_active': False, 'updated_at': datetime.utcnow()}},
+            projection={'hashtags': 1, 'location': 1, 'created_at': 1}
         )
-        return result.modified_count > 0
+        if not post:
+            return False
+        update_hashtag_rollups(post, -1)
+        return True
     except:
         return False
 
@@ -270,160 +497,377 @@ def get_media_file(file_id):
 def cleanup_expired_stories():
     """
     Remove expired stories (called periodically)
-    Sets is_active to False for expired posts
+    Sets is_active to False for expired posts and takes their hashtags out
+    of the rollups
     """
-    result = posts_collection.update_many(
-        {
-            'post_type': 'story',
-            'expires_at': {'$lt': datetime.utcnow()},
-            'is_active': True
-        },
-        {'$set': {'is_active': False}}
-    )
-    return result.modified_count
+    expired = 0
+    now = datetime.utcnow()
+    while True:
+        # One story at a time, so concurrent cleanups never decrement twice
+        story = posts_collection.find_one_and_update(
+            {
+                'post_type': 'story',
+                'expires_at': {'$lt': now},
+                'is_active': True
+            },
+            {'$set': {'is_active': False}},
+            projection={'hashtags': 1, 'location': 1, 'created_at': 1}
+        )
+        if not story:
+            return expired
+        update_hashtag_rollups(story, -1)
+        expired += 1
 
 
 # ===========================
 # Comments Functions
 # ===========================
 
+def serialize_comment(comment):
+    """API shape of a post_comments document (comment_id instead of _id)"""
+    comment['comment_id'] = str(comment.pop('_id'))
+    comment.pop('post_id', None)
+    return comment
+
+
 def add_comment(post_id, user_id, text):
     """Add a comment to a post"""
     try:
+        post_oid = ObjectId(post_id)
         comment = {
-            'comment_id': str(ObjectId()),
+            'post_id': post_oid,
             'user_id': user_id,
             'text': text,
             'created_at': datetime.utcnow(),
             'likes': [],
             'likes_count': 0
         }
-        
-        posts_collection.update_one(
-            {'_id': ObjectId(post_id)},
-            {
-                '$push': {'comments': comment},
-                '$inc': {'comments_count': 1}
-            }
-        )
-        return comment
+        post_comments_collection.insert_one(comment)
+
+        result = posts_collection.update_one({'_id': post_oid}, engagement_update('comments_count', 1))
+        if not result.matched_count:
+            # No such post: undo the comment
+            post_comments_collection.delete_one({'_id': comment['_id']})
+            return None
+        return serialize_comment(comment)
     except:
         return None
 
 
-def get_comments(post_id, limit=50, skip=0):
-    """Get comments for a post"""
+def get_comments(post_id, limit=50, cursor=None):
+    """
+    Get a page of comments for a post, oldest first
+
+    Pages are keyed on (created_at, _id), so deep pages cost the same as
+    the first one. Until migrate_posts.py has run, a post still holding
+    legacy embedded comments is migrated when its first page is read.
+
+    Args:
+        cursor: next_cursor from the previous page (None for the first page)
+
+    Returns:
+        tuple: (comments, next_cursor) - next_cursor is None on the last page
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
     try:
-        post = posts_collection.find_one(
-            {'_id': ObjectId(post_id)},
-            {'comments': {'$slice': [skip, limit]}}
-        )
-        if post:
-            return post.get('comments', [])
-        return []
-    except:
-        return []
+        query = {'post_id': ObjectId(post_id)}
+    except Exception:
+        return [], None
+
+    if not cursor:
+        _ensure_comments_migrated(query['post_id'])
+    else:
+        created_at, comment_id = decode_cursor(cursor)
+        query['$or'] = [
+            {'created_at': {'$gt': created_at}},
+            {'created_at': created_at, '_id': {'$gt': comment_id}}
+        ]
+
+    comments = list(post_comments_collection.find(query).sort(
+        [('created_at', 1), ('_id', 1)]
+    ).limit(limit + 1))
+
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1]['created_at'], comments[-1]['_id'])
+
+    return [serialize_comment(c) for c in comments], next_cursor
 
 
 def delete_comment(post_id, comment_id, user_id):
     """Delete a comment (only by comment author)"""
     try:
-        result = posts_collection.update_one(
-            {'_id': ObjectId(post_id)},
-            {
-                '$pull': {'comments': {'comment_id': comment_id, 'user_id': user_id}},
-                '$inc': {'comments_count': -1}
-            }
+        post_oid = ObjectId(post_id)
+        _ensure_comments_migrated(post_oid)
+        removed = post_comments_collection.find_one_and_delete(
+            {'_id': ObjectId(comment_id), 'post_id': post_oid, 'user_id': user_id},
+            projection={'created_at': 1}
         )
-        return result.modified_count > 0
+        if not removed:
+            return False
+        posts_collection.update_one(
+            {'_id': post_oid, 'comments_count': {'$gt': 0}},
+            engagement_update('comments_count', -1, event_at=removed.get('created_at'))
+        )
+        return True
     except:
         return False
 
 
 def like_comment(post_id, comment_id, user_id):
-    """Toggle like on a comment"""
+    """
+    Toggle like on a comment
+
+    Each branch is a single conditional update: the filter only matches
+    when the user has (or hasn't) liked the comment, so the membership
+    check and the write happen atomically.
+    """
     try:
-        post = posts_collection.find_one({'_id': ObjectId(post_id)})
-        if not post:
-            return None
-        
-        for comment in post.get('comments', []):
-            if comment.get('comment_id') == comment_id:
-                if user_id in comment.get('likes', []):
-                    # Unlike
-                    posts_collection.update_one(
-                        {'_id': ObjectId(post_id), 'comments.comment_id': comment_id},
-                        {
-                            '$pull': {'comments.$.likes': user_id},
-                            '$inc': {'comments.$.likes_count': -1}
-                        }
-                    )
-                    return {'liked': False}
-                else:
-                    # Like
-                    posts_collection.update_one(
-                        {'_id': ObjectId(post_id), 'comments.comment_id': comment_id},
-                        {
-                            '$push': {'comments.$.likes': user_id},
-                            '$inc': {'comments.$.likes_count': 1}
-                        }
-                    )
-                    return {'liked': True}
+        comment_query = {'_id': ObjectId(comment_id), 'post_id': ObjectId(post_id)}
+        _ensure_comments_migrated(comment_query['post_id'])
+
+        # Like: only matches if the user isn't already in the comment's likes
+        result = post_comments_collection.update_one(
+            {**comment_query, 'likes': {'$ne': user_id}},
+            {
+                '$addToSet': {'likes': user_id},
+                '$inc': {'likes_count': 1}
+            }
+        )
+        if result.modified_count:
+            return {'liked': True}
+
+        # Unlike: only matches if the user is in the comment's likes
+        result = post_comments_collection.update_one(
+            {**comment_query, 'likes': user_id},
+            {
+                '$pull': {'likes': user_id},
+                '$inc': {'likes_count': -1}
+            }
+        )
+        if result.modified_count:
+            return {'liked': False}
         return None
     except:
         return None
 
 
+def _migrate_comments_of(post):
+    """Move one post's legacy embedded comments into post_comments"""
+    docs = []
+    for comment in post.get('comments') or []:
+        doc = {k: v for k, v in comment.items() if k != 'comment_id'}
+        doc['post_id'] = post['_id']
+        if ObjectId.is_valid(comment.get('comment_id')):
+            doc['_id'] = ObjectId(comment['comment_id'])
+        docs.append(doc)
+    if docs:
+        try:
+            post_comments_collection.insert_many(docs, ordered=False)
+        except BulkWriteError:
+            pass  # Duplicates from a previous run
+    posts_collection.update_one(
+        {'_id': post['_id']},
+        {
+            '$set': {'comments_count': post_comments_collection.count_documents({'post_id': post['_id']})},
+            '$unset': {'comments': ''}
+        }
+    )
+
+
+def _ensure_comments_migrated(post_oid):
+    """Migrate a single post's legacy comments before they are read or changed (until migrate_posts.py has run)"""
+    if migration_complete('comments'):
+        return
+    post = posts_collection.find_one({'_id': post_oid, 'comments': {'$exists': True}}, {'comments': 1})
+    if post:
+        _migrate_comments_of(post)
+
+
+def migrate_post_comments(batch_size=200):
+    """
+    One-off migration: move legacy embedded comments into post_comments
+
+    Run by migrate_posts.py (and once at app startup). Existing comment_ids
+    are kept as the new documents' _id, so the migration is safe to re-run.
+
+    Returns:
+        int: Number of posts migrated
+    """
+    migrated = 0
+    cursor = posts_collection.find({'comments': {'$exists': True}}, {'comments': 1}, batch_size=batch_size)
+    for post in cursor:
+        _migrate_comments_of(post)
+        migrated += 1
+    return migrated
+
+
 # ===========================
 # Trending Posts
 # ===========================
 
+# Engagement weights (per unit of each counter) for the trending score
+TRENDING_WEIGHTS = {'likes_count': 2, 'comments_count': 3, 'views': 0.1, 'shares_count': 4}
+
+_TRENDING_EPOCH_ORIGIN = datetime(2024, 1, 1)
+
+# Only posts this recent are ranked (and kept on the current scale)
+TRENDING_WINDOW_DAYS = 7
+
+# Boosts grow as 2^(time since epoch / half-life); epochs are shortened to
+# at most this many half-lives so the factor stays far from float overflow
+_MAX_EPOCH_HALF_LIVES = 512
+
+# Epoch this process last rescored stored scores onto (see ensure_trending_epoch)
+_rescored_epoch = None
+
+
+def trending_epoch(now=None):
+    """Start of the current trending-score epoch (see _epoch_period)"""
+    now = now or datetime.utcnow()
+    period = _epoch_period()
+    return _TRENDING_EPOCH_ORIGIN + ((now - _TRENDING_EPOCH_ORIGIN) // period) * period
+
+
+def _epoch_period():
+    """Epoch length: TRENDING_EPOCH_DAYS, capped at _MAX_EPOCH_HALF_LIVES half-lives"""
+    return min(
+        timedelta(days=Config.TRENDING_EPOCH_DAYS),
+        timedelta(hours=Config.TRENDING_HALF_LIFE_HOURS * _MAX_EPOCH_HALF_LIVES)
+    )
+
+
+def seconds_until_next_epoch(now=None):
+    """Seconds until the next trending-score epoch starts"""
+    now = now or datetime.utcnow()
+    return (trending_epoch(now) + _epoch_period() - now).total_seconds()
+
+
+def _half_life_ms():
+    return Config.TRENDING_HALF_LIFE_HOURS * 3600 * 1000
+
+
+def _rescaled_score(epoch):
+    """Aggregation expression: the stored trending_score converted to `epoch`'s scale"""
+    return {'$multiply': [
+        {'$ifNull': ['$trending_score', 0]},
+        {'$pow': [2, {'$divide': [
+            {'$subtract': [{'$ifNull': ['$trending_epoch', epoch]}, epoch]},
+            _half_life_ms()
+        ]}]}
+    ]}
+
+
+def engagement_update(counter, delta, event_at=None):
+    """
+    Update pipeline that applies an engagement event to a post
+    
+    Instead of decaying every score over time, each event is worth
+    weight * 2^(time since epoch / half-life): later events count for more,
+    which ranks posts exactly as if all scores decayed with the half-life.
+    Stored scores stay comparable, so trending is an indexed sort. A post
+    last touched in an earlier epoch is rescaled in the same update.
+    
+    Args:
+        counter: Post counter the event changes (a TRENDING_WEIGHTS key)
+        delta: +1, or -1 to undo (unlike, deleted comment)
+        event_at: When the event being undone happened (its like/comment
+                  created_at), so the boost it added is what gets removed
+    """
+    now = datetime.utcnow()
+    epoch = trending_epoch(now)
+    event_at = min(event_at or now, now)
+    boost = delta * TRENDING_WEIGHTS[counter] * 2 ** ((event_at - epoch).total_seconds() * 1000 / _half_life_ms())
+    return [{'$set': {
+        counter: {'$add': [{'$ifNull': [f'${counter}', 0]}, delta]},
+        'trending_score': {'$max': [0, {'$add': [_rescaled_score(epoch), boost]}]},
+        'trending_epoch': epoch
+    }}]
+
+
+def rescore_trending_posts():
+    """
+    Periodic job: bring every post's trending_score onto the current epoch
+    
+    Posts untouched since an earlier epoch are rescaled; posts without a
+    score (created before scores were stored) are seeded from their counters
+    as if all their engagement happened at creation. Only posts of the
+    trending window are visited (via the (created_at, trending_epoch)
+    index); older posts are rescaled by engagement_update when touched.
+    
+    Returns:
+        int: Number of posts updated
+    """
+    global _rescored_epoch
+    epoch = trending_epoch()
+    window = {'$gte': datetime.utcnow() - timedelta(days=TRENDING_WINDOW_DAYS)}
+    rescaled = posts_collection.update_many(
+        {'created_at': window, 'trending_epoch': {'$lt': epoch}},
+        [{'$set': {'trending_score': _rescaled_score(epoch), 'trending_epoch': epoch}}]
+    )
+    engagement = {'$add': [
+        {'$multiply': [{'$ifNull': [f'${counter}', 0]}, weight]}
+        for counter, weight in TRENDING_WEIGHTS.items()
+    ]}
+    seeded = posts_collection.update_many(
+        {'created_at': window, 'trending_score': {'$exists': False}},
+        [{'$set': {
+            'trending_score': {'$multiply': [engagement, {'$pow': [2, {'$divide': [
+                {'$subtract': ['$created_at', epoch]}, _half_life_ms()
+            ]}]}]},
+            'trending_epoch': epoch
+        }}]
+    )
+    _rescored_epoch = epoch
+    return rescaled.modified_count + seeded.modified_count
+
+
+def ensure_trending_epoch():
+    """
+    Rescore once per epoch before ranking
+    
+    At an epoch rollover the first engagement events are stored on the new
+    scale while untouched posts are still on the old one, so the two don't
+    compare until rescore_trending_posts has run. Trending reads call this
+    so they never sort mixed scales, whenever the periodic job gets to it.
+    """
+    if _rescored_epoch != trending_epoch():
+        rescore_trending_posts()
+
+
 def get_trending_posts(longitude, latitude, radius_km=25, limit=20):
     """
-    Get trending posts near a location based on engagement
-    Trending score = likes_count * 2 + comments_count * 3 + views * 0.1
+    Get trending posts near a location
+    
+    A top-K read on the stored, time-decayed trending_score (see
+    engagement_update) using the (trending_score, location) index.
     """
-    pipeline = [
-        {
-            '$geoNear': {
-                'near': {
-                    'type': 'Point',
-                    'coordinates': [longitude, latitude]
-                },
-                'distanceField': 'distance_meters',
-                'maxDistance': radius_km * 1000,
-                'spherical': True,
-                'query': {
-                    'is_active': True,
-                    'post_type': {'$ne': 'story'},  # Exclude stories
-                    'created_at': {'$gte': datetime.utcnow() - timedelta(days=7)},  # Last 7 days
-                    '$or': [
-                        {'expires_at': None},
-                        {'expires_at': {'$gt': datetime.utcnow()}}
-                    ]
-                }
-            }
-        },
+    ensure_trending_epoch()
+    posts = list(posts_collection.find(
         {
-            '$addFields': {
-                'trending_score': {
-                    '$add': [
-                        {'$multiply': ['$likes_count', 2]},
-                        {'$multiply': ['$comments_count', 3]},
-                        {'$multiply': ['$views', 0.1]}
-                    ]
-                }
-            }
+            'location': {'$geoWithin': {
+                '$centerSphere': [[longitude, latitude], radius_km / EARTH_RADIUS_KM]
+            }},
+            'is_active': True,
+            'post_type': {'$ne': 'story'},  # Exclude stories
+            'created_at': {'$gte': datetime.utcnow() - timedelta(days=TRENDING_WINDOW_DAYS)},
+            '$or': [
+                {'expires_at': None},
+                {'expires_at': {'$gt': datetime.utcnow()}}
+            ]
         },
-        {'$sort': {'trending_score': -1}},
-        {'$limit': limit}
-    ]
+        FEED_PROJECTION
+    ).sort('trending_score', -1).limit(limit))
     
-    posts = list(posts_collection.aggregate(pipeline))
-    
-    for post in posts:
-        post['_id'] = str(post['_id'])
-        post['distance_km'] = round(post.get('distance_meters', 0) / 1000, 2)
+    if posts:
+        points = latlng_from_geojson([post['location']['coordinates'] for post in posts])
+        distances = distances_from(latitude, longitude, points, EARTH_RADIUS_KM)
+        for post, distance in zip(posts, distances):
+            post['_id'] = str(post['_id'])
+            post['distance_km'] = round(float(distance), 2)
         
     return posts
 
@@ -454,14 +898,16 @@ def search_by_hashtag(hashtag, longitude=None, latitude=None, radius_km=50, limi
                         'type': 'Point',
                         'coordinates': [longitude, latitude]
                     },
-                    'distanceField': 'distance_meters',
+                    'key': 'location',
+                'distanceField': 'distance_meters',
                     'maxDistance': radius_km * 1000,
                     'spherical': True,
                     'query': query
                 }
             },
             {'$sort': {'created_at': -1}},
-            {'$limit': limit}
+            {'$limit': limit},
+            {'$project': FEED_PROJECTION}
         ]
         posts = list(posts_collection.aggregate(pipeline))
         for post in posts:
@@ -469,39 +915,129 @@ def search_by_hashtag(hashtag, longitude=None, latitude=None, radius_km=50, limi
             post['distance_km'] = round(post.get('distance_meters', 0) / 1000, 2)
     else:
         # Non-geo search
-        posts = list(posts_collection.find(query).sort('created_at', -1).limit(limit))
+        posts = list(posts_collection.find(query, FEED_PROJECTION).sort('created_at', -1).limit(limit))
         for post in posts:
             post['_id'] = str(post['_id'])
     
     return posts
 
 
-def get_trending_hashtags(longitude, latitude, radius_km=25, limit=10):
-    """Get trending hashtags near a location"""
-    pipeline = [
+def _hour_bucket(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _hashtag_rollup_keys(post):
+    """(cell, bucket, hashtag) rollup keys of a post at every rollup precision"""
+    longitude, latitude = post['location']['coordinates']
+    bucket = _hour_bucket(post['created_at'])
+    return [
+        (geohash_encode(latitude, longitude, precision), bucket, hashtag)
+        for precision in HASHTAG_ROLLUP_PRECISIONS
+        for hashtag in post.get('hashtags') or []
+    ]
+
+
+def update_hashtag_rollups(post, delta):
+    """
+    Add (delta=1) or remove (delta=-1) a post's hashtags from the rollups
+    
+    Rollups are a derived view: a failed update is logged, not raised, and
+    rebuild_hashtag_rollups() can regenerate them.
+    """
+    ops = [
+        UpdateOne(
+            {'cell': cell, 'bucket': bucket, 'hashtag': hashtag},
+            {'$inc': {'count': delta}},
+            upsert=delta > 0
+        )
+        for cell, bucket, hashtag in _hashtag_rollup_keys(post)
+    ]
+    if not ops:
+        return
+    try:
+        hashtag_rollups_collection.bulk_write(ops, ordered=False)
+    except Exception as e:
+        print(f"[WARN] Hashtag rollup update failed for post {post.get('_id')}: {e}")
+
+
+def rebuild_hashtag_rollups():
+    """
+    Regenerate the rollups from the active posts of the trending window
+    
+    The rollups are written to a staging collection with the same indexes,
+    which is then renamed over hashtag_rollups, so readers never see a
+    partial set. Increments made while the rebuild runs are lost.
+    
+    Returns:
+        int: Number of rollup documents written
+    """
+    counts = {}
+    posts = posts_collection.find(
         {
-            '$geoNear': {
-                'near': {
-                    'type': 'Point',
-                    'coordinates': [longitude, latitude]
-                },
-                'distanceField': 'distance_meters',
-                'maxDistance': radius_km * 1000,
-                'spherical': True,
-                'query': {
-                    'is_active': True,
-                    'created_at': {'$gte': datetime.utcnow() - timedelta(days=7)},
-                    'hashtags': {'$exists': True, '$ne': []}
-                }
-            }
+            'is_active': True,
+            'created_at': {'$gte': datetime.utcnow() - timedelta(days=HASHTAG_WINDOW_DAYS)},
+            'hashtags': {'$exists': True, '$ne': []}
         },
-        {'$unwind': '$hashtags'},
-        {'$group': {'_id': '$hashtags', 'count': {'$sum': 1}}},
-        {'$sort': {'count': -1}},
+        {'hashtags': 1, 'location': 1, 'created_at': 1}
+    )
+    for post in posts:
+        for key in _hashtag_rollup_keys(post):
+            counts[key] = counts.get(key, 0) + 1
+
+    staging = db[f'{hashtag_rollups_collection.name}_rebuild']
+    staging.drop()
+    _create_hashtag_rollup_indexes(staging)  # Also creates the collection when there is nothing to insert
+    if counts:
+        staging.insert_many([
+            {'cell': cell, 'bucket': bucket, 'hashtag': hashtag, 'count': count}
+            for (cell, bucket, hashtag), count in counts.items()
+        ])
+    staging.rename(hashtag_rollups_collection.name, dropTarget=True)
+    return len(counts)
+
+
+def migrate_hashtag_rollups():
+    """
+    One-off migration: build the hashtag rollups if they have never been built
+
+    Run by migrate_posts.py (and once at app startup). Posts created before
+    rollups existed are only counted once the rollups are rebuilt; an empty
+    collection is taken to mean they never were.
+
+    Returns:
+        int: Number of rollup documents written
+    """
+    if hashtag_rollups_collection.estimated_document_count():
+        return 0
+    return rebuild_hashtag_rollups()
+
+
+def get_trending_hashtags(longitude, latitude, radius_km=25, limit=10):
+    """
+    Get trending hashtags near a location
+    
+    Merges the hourly rollups of the geohash cells covering the radius over
+    the last HASHTAG_WINDOW_DAYS. Cells are picked at the coarsest rollup
+    precision that still fits the radius, so only a handful are read; the
+    area covered may extend up to one cell beyond the radius.
+    """
+    radius_m = radius_km * 1000
+    precision = min(
+        max(geohash_precision_for_radius(radius_m), HASHTAG_ROLLUP_PRECISIONS[0]),
+        HASHTAG_ROLLUP_PRECISIONS[-1]
+    )
+    cells = list(geohash_cells_covering(latitude, longitude, radius_m, precision))
+    since = _hour_bucket(datetime.utcnow() - timedelta(days=HASHTAG_WINDOW_DAYS))
+    
+    pipeline = [
+        {'$match': {'cell': {'$in': cells}, 'bucket': {'$gte': since}}},
+        {'$group': {'_id': '$hashtag', 'count': {'$sum': '$count'}}},
+        {'$match': {'count': {'$gt': 0}}},
+        {'$sort': {'count': -1, '_id': 1}},
         {'$limit': limit}
     ]
     
-    result = list(posts_collection.aggregate(pipeline))
+    result = list(hashtag_rollups_collection.aggregate(pipeline))
     return [{'hashtag': item['_id'], 'count': item['count']} for item in result]
 
 
@@ -518,6 +1054,7 @@ def get_nearby_stories(longitude, latitude, radius_km=10, limit=50):
                     'type': 'Point',
                     'coordinates': [longitude, latitude]
                 },
+                'key': 'location',
                 'distanceField': 'distance_meters',
                 'maxDistance': radius_km * 1000,
                 'spherical': True,
@@ -529,7 +1066,8 @@ def get_nearby_stories(longitude, latitude, radius_km=10, limit=50):
             }
         },
         {'$sort': {'created_at': -1}},
-        {'$limit': limit}
+        {'$limit': limit},
+        {'$project': FEED_PROJECTION}
     ]
     
     stories = list(posts_collection.aggregate(pipeline))
@@ -546,7 +1084,7 @@ def increment_shares(post_id):
     try:
         posts_collection.update_one(
             {'_id': ObjectId(post_id)},
-            {'$inc': {'shares_count': 1}}
+            engagement_update('shares_count', 1)
         )
         return True
     except:
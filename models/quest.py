@@ -3,6 +3,8 @@ Quest model - Tasks created by local guides
 """
 from models import db
 from datetime import datetime
+from config import Config
+from utils.image_hash import hamming_distance, hash_bands
 
 quests_collection = db.quests
 quest_completions_collection = db.quest_completions
@@ -83,3 +85,148 @@ def get_user_completions(user_id):
     """Get all quest completions for a user"""
     from bson.objectid import ObjectId
     return list(quest_completions_collection.find({'user_id': ObjectId(user_id)}))
+
+# Traveler progress on AI-verified clean-up quests (see routes/quest_routes.py)
+quest_submissions_collection = db.quest_submissions
+
+# Perceptual-hash bands of submitted photos, for duplicate lookups
+try:
+    quest_submissions_collection.create_index([("hash_bands", 1)])
+except Exception as e:
+    print(f"Note: Submission hash index may already exist: {e}")
+
+def find_duplicate_photos(image_hash, exclude_submission_id=None):
+    """
+    Find submission photos that are (near) duplicates of an image
+    
+    Candidates come from the indexed hash bands; the exact Hamming distance
+    is checked here. Band collisions are rare, so every candidate is checked.
+    
+    Returns:
+        list: {'submission_id', 'quest_id', 'user_id', 'status', 'role',
+              'distance', 'score', 'before_hash'} matches, closest first
+    """
+    query = {'hash_bands': {'$in': hash_bands(image_hash)}}
+    if exclude_submission_id is not None:
+        query['_id'] = {'$ne': exclude_submission_id}
+    
+    candidates = quest_submissions_collection.find(
+        query,
+        {'image_hashes': 1, 'before_score': 1, 'after_score': 1, 'user_id': 1, 'quest_id': 1, 'status': 1}
+    )
+    
+    matches = []
+    for candidate in candidates:
+        hashes = candidate.get('image_hashes', {})
+        for role in ('before', 'after'):
+            if not hashes.get(role):
+                continue
+            distance = hamming_distance(image_hash, hashes[role])
+            if distance <= Config.QUEST_IMAGE_DUPLICATE_DISTANCE:
+                matches.append({
+                    'submission_id': candidate['_id'],
+                    'quest_id': candidate.get('quest_id'),
+                    'user_id': candidate.get('user_id'),
+                    'status': candidate.get('status'),
+                    'role': role,
+                    'distance': distance,
+                    'score': candidate.get(f'{role}_score'),
+                    'before_hash': hashes.get('before')
+                })
+    return sorted(matches, key=lambda match: match['distance'])
+
+def classify_duplicate_photos(matches, user_id, quest_id, role, before_hash=None):
+    """
+    Split duplicate matches into a reusable cached score and conflicts
+    
+    A score is only reused when the same user resubmits the same photo, in
+    the same role, on the same quest, and the earlier attempt was not
+    verified (its photos can't earn XP twice). For an AFTER photo the
+    BEFORE photos must match too. Every other match is a reused photo.
+    
+    Returns:
+        tuple: (reusable match or None, list of conflicting matches)
+    """
+    reusable, conflicts = None, []
+    for match in matches:
+        same_attempt = (
+            match['user_id'] == user_id and match['quest_id'] == quest_id and match['role'] == role
+            and match['status'] != 'verified'
+        )
+        if same_attempt and role == 'after':
+            same_attempt = (
+                before_hash is not None and match['before_hash'] is not None
+                and hamming_distance(before_hash, match['before_hash']) <= Config.QUEST_IMAGE_DUPLICATE_DISTANCE
+            )
+        if not same_attempt:
+            conflicts.append(match)
+        elif reusable is None and match['score'] is not None:
+            reusable = match
+    return reusable, conflicts
+
+def store_before_score(submission_id, before_score):
+    """Save the BEFORE image's trashiness score on an in-progress submission"""
+    return quest_submissions_collection.update_one(
+        {'_id': submission_id, 'status': 'in_progress'},
+        {'$set': {'before_score': before_score, 'before_scored_at': datetime.utcnow()}}
+    )
+
+def record_quest_verification(submission_id, user_id, points, after_image, result, after_hash=None):
+    """
+    Store the AI verification outcome on a quest submission and award XP
+    if the quest was verified
+
+    Only a submission that is still open (in_progress, or verifying in
+    async mode) is updated, so a duplicate request or a re-run job can't
+    award XP twice.
+
+    Returns:
+        bool: True if the outcome was recorded (False if already finished)
+    """
+    from bson.objectid import ObjectId
+    
+    update = {
+        'after_image': after_image,
+        'verified': result.get('verified', False),
+        'confidence': result.get('confidence', 0),
+        'verified_at': datetime.utcnow(),
+        'status': 'verified' if result.get('verified') else 'failed'
+    }
+    # Scores are missing when verification stopped early (range check, AI error)
+    for key in ('before_score', 'after_score'):
+        if result.get(key) is not None:
+            update[key] = result[key]
+    if result.get('fraud_flag'):
+        update['fraud_flag'] = result['fraud_flag']
+        update['status'] = 'flagged'
+    
+    change = {'$set': update}
+    if after_hash:
+        update['image_hashes.after'] = after_hash
+        change['$addToSet'] = {'hash_bands': {'$each': hash_bands(after_hash)}}
+    
+    recorded = quest_submissions_collection.update_one(
+        {'_id': submission_id, 'status': {'$in': ['in_progress', 'verifying']}},
+        change
+    ).modified_count == 1
+    
+    if recorded and result.get('verified'):
+        db.users.update_one(
+            {'_id': ObjectId(user_id)},
+            {'$inc': {'xp': points}}
+        )
+    return recorded
+
+def mark_quest_verified(quest_id, verification, elapsed_time):
+    """Mark a quest verified by the before/after image check (/ai/verify-quest)"""
+    return quests_collection.update_one(
+        {'_id': quest_id},
+        {
+            '$set': {
+                'status': 'verified',
+                'verification_data': verification,
+                'verified_at': datetime.utcnow(),
+                'elapsed_time': elapsed_time
+            }
+        }
+    )
@@ -62,3 +62,71 @@ def add_crowd_prediction(trip_id, location, date, prediction_data):
         {'_id': ObjectId(trip_id)},
         {'$set': {f'crowd_predictions.{key}': prediction_data}}
     )
+
+def save_generated_itinerary(trip_id, itinerary, model=None):
+    """
+    Store an AI-generated itinerary on the trip
+    
+    Each day carries its own version (starting at 1) so single days can be
+    regenerated later without touching the rest of the plan.
+    """
+    now = datetime.utcnow()
+    days = [
+        dict(day_info, version=1, generated_at=now)
+        for day_info in itinerary.get('days', [])
+    ]
+    return update_trip(trip_id, {
+        'generated_itinerary': {
+            'days': days,
+            'tips': itinerary.get('tips', []),
+            'budget_estimate': itinerary.get('budget_estimate'),
+            'model': model,
+            'history': [],
+            'generated_at': now,
+            'updated_at': now
+        }
+    })
+
+def replace_itinerary_day(trip_id, current_day, new_day, model=None):
+    """
+    Replace one day of the stored itinerary with a regenerated version
+    
+    The previous version is kept in generated_itinerary.history (last 50).
+    The update only applies if the day is still at current_day's version.
+    
+    Args:
+        trip_id: Trip ID
+        current_day: The stored day dict being replaced
+        new_day: Regenerated day dict
+        model: Model that produced new_day
+    
+    Returns:
+        dict: The stored new day, or None if the day changed concurrently
+    """
+    from bson.objectid import ObjectId
+    now = datetime.utcnow()
+    day_number = current_day.get('day')
+    version = current_day.get('version', 1)
+    
+    stored_day = dict(new_day, day=day_number, version=version + 1, generated_at=now, model=model)
+    previous = {k: v for k, v in current_day.items() if k not in ('day', 'version')}
+    
+    result = trips_collection.update_one(
+        {
+            '_id': ObjectId(trip_id),
+            'generated_itinerary.days': {'$elemMatch': {'day': day_number, 'version': version}}
+        },
+        {
+            '$set': {
+                'generated_itinerary.days.$': stored_day,
+                'generated_itinerary.updated_at': now
+            },
+            '$push': {
+                'generated_itinerary.history': {
+                    '$each': [{'day': day_number, 'version': version, 'content': previous, 'replaced_at': now}],
+                    '$slice': -50
+                }
+            }
+        }
+    )
+    return stored_day if result.modified_count else None
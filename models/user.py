@@ -3,10 +3,24 @@ User model for both tourists and local guides
 """
 from models import db
 from datetime import datetime
+from config import Config
+import threading
+import time
 import bcrypt
 
 users_collection = db.users
 
+# Feeds look authors up by Firebase UID in batches
+try:
+    users_collection.create_index([("firebase_uid", 1)])
+except Exception as e:
+    print(f"Note: firebase_uid index may already exist: {e}")
+
+# Short-TTL cache of public author fields (see get_author_profiles)
+AUTHOR_PROFILE_FIELDS = ('name', 'profile_image')
+_author_cache = {}  # firebase_uid -> (expires_at, profile or None)
+_author_cache_lock = threading.Lock()
+
 def create_user(email, password, role='tourist', phone=None, name=None):
     """Create a new user"""
     print(f"DEBUG: Creating user with email: {email}, role: {role}")
@@ -60,10 +74,15 @@ def verify_password(user, password):
 def update_user(user_id, updates):
     """Update user information"""
     from bson.objectid import ObjectId
-    return users_collection.update_one(
+    result = users_collection.update_one(
         {'_id': ObjectId(user_id)},
         {'$set': updates}
     )
+    if any(field in updates for field in AUTHOR_PROFILE_FIELDS):
+        user = users_collection.find_one({'_id': ObjectId(user_id)}, {'firebase_uid': 1})
+        if user and user.get('firebase_uid'):
+            invalidate_author_profile(user['firebase_uid'])
+    return result
 
 def find_locals_nearby(latitude, longitude, max_distance_km=50):
     """Find verified local guides near a location"""
@@ -146,10 +165,64 @@ def create_user_from_firebase(firebase_uid, email, password=None, preference='us
 
 def update_user_by_firebase_uid(firebase_uid, updates):
     """Update user by Firebase UID"""
-    return users_collection.update_one(
+    result = users_collection.update_one(
         {'firebase_uid': firebase_uid},
         {'$set': updates}
     )
+    if any(field in updates for field in AUTHOR_PROFILE_FIELDS):
+        invalidate_author_profile(firebase_uid)
+    return result
+
+def get_author_profiles(firebase_uids):
+    """
+    Public profile fields (name, profile_image) for a set of authors
+    
+    Cache misses are fetched with one $in query projected to those fields,
+    and cached for Config.AUTHOR_CACHE_TTL_SECONDS (unknown users too).
+    
+    Args:
+        firebase_uids: Iterable of Firebase UIDs (duplicates/None are fine)
+    
+    Returns:
+        dict: firebase_uid -> {'name', 'profile_image'} or None if not found
+    """
+    now = time.monotonic()
+    profiles = {}
+    missing = []
+    with _author_cache_lock:
+        for uid in set(uid for uid in firebase_uids if uid):
+            cached = _author_cache.get(uid)
+            if cached and cached[0] > now:
+                profiles[uid] = cached[1]
+            else:
+                missing.append(uid)
+    
+    if missing:
+        found = {
+            user['firebase_uid']: {field: user.get(field) for field in AUTHOR_PROFILE_FIELDS if field in user}
+            for user in users_collection.find(
+                {'firebase_uid': {'$in': missing}},
+                {'_id': 0, 'firebase_uid': 1, **{field: 1 for field in AUTHOR_PROFILE_FIELDS}}
+            )
+        }
+        expires_at = now + Config.AUTHOR_CACHE_TTL_SECONDS
+        with _author_cache_lock:
+            if len(_author_cache) + len(missing) > Config.AUTHOR_CACHE_MAX_ENTRIES:
+                # Drop expired entries; if still full, start over
+                for uid in [uid for uid, (expiry, _) in _author_cache.items() if expiry <= now]:
+                    del _author_cache[uid]
+                if len(_author_cache) + len(missing) > Config.AUTHOR_CACHE_MAX_ENTRIES:
+                    _author_cache.clear()
+            for uid in missing:
+                profiles[uid] = found.get(uid)
+                _author_cache[uid] = (expires_at, profiles[uid])
+    
+    return profiles
+
+def invalidate_author_profile(firebase_uid):
+    """Forget a cached author profile after the user changes it"""
+    with _author_cache_lock:
+        _author_cache.pop(firebase_uid, None)
 
 def add_ai_message(firebase_uid, role, text):
     """
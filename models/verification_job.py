@@ -0,0 +1,280 @@
+"""
+Verification job model - MongoDB-backed queue for quest verification
+Jobs are enqueued by the web app and consumed by ai/verification_worker.py
+"""
+from models import db
+from datetime import datetime, timedelta
+import os
+import uuid
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from config import Config
+
+verification_jobs_collection = db.verification_jobs
+verification_workers_collection = db.verification_workers  # Heartbeat per ready worker process
+
+# Job kinds
+JOB_BEFORE_SCORE = 'before_score'          # Score a quest's BEFORE image at quest start
+JOB_QUEST_COMPLETION = 'quest_completion'  # Verify a quest submission's AFTER image
+JOB_IMAGE_PAIR = 'image_pair'              # Before/after pair sent to /ai/verify-quest
+
+# Images uploaded with a job (JOB_IMAGE_PAIR); jobs only store their paths
+JOB_IMAGE_FOLDER = os.path.join(Config.UPLOAD_FOLDER, 'verification_jobs')
+os.makedirs(JOB_IMAGE_FOLDER, exist_ok=True)
+
+try:
+    verification_jobs_collection.create_index([("status", 1), ("created_at", 1)])
+    verification_jobs_collection.create_index([("notified", 1), ("status", 1)])
+    # Finished jobs expire on their own (unfinished jobs have finished_at None)
+    verification_jobs_collection.create_index(
+        "finished_at", expireAfterSeconds=int(Config.VERIFICATION_JOB_RETENTION_HOURS * 3600)
+    )
+except Exception as e:
+    print(f"Note: Verification job indexes may already exist: {e}")
+
+# A worker missing this many heartbeats is considered gone
+_MISSED_HEARTBEATS = 3
+
+try:
+    verification_workers_collection.create_index(
+        "heartbeat_at", expireAfterSeconds=int(Config.VERIFICATION_WORKER_HEARTBEAT_SECONDS * _MISSED_HEARTBEATS)
+    )
+except Exception as e:
+    print(f"Note: Verification worker index may already exist: {e}")
+
+
+def save_job_image(image_bytes, role):
+    """
+    Write an uploaded image to JOB_IMAGE_FOLDER for a job to reference
+
+    Raw bytes are not stored in the job: two phone photos can exceed
+    MongoDB's 16 MB document limit.
+
+    Returns:
+        str: File path
+    """
+    path = os.path.join(JOB_IMAGE_FOLDER, f"{uuid.uuid4().hex}_{role}.jpg")
+    with open(path, 'wb') as f:
+        f.write(image_bytes)
+    return path
+
+
+def discard_job_images(job):
+    """Delete the uploaded images of a finished JOB_IMAGE_PAIR job"""
+    if job['kind'] != JOB_IMAGE_PAIR:
+        return  # Quest jobs reference the submission's own photos
+    for key in ('before_image', 'after_image'):
+        path = job.get('payload', {}).get(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def enqueue_verification_job(kind, payload, user_id=None):
+    """
+    Add a verification job to the queue
+
+    Args:
+        kind: One of JOB_BEFORE_SCORE, JOB_QUEST_COMPLETION, JOB_IMAGE_PAIR
+        payload: Job input (image paths, GPS, ids)
+        user_id: Owner of the job (for status lookups)
+
+    Returns:
+        ObjectId: Job ID
+    """
+    job = {
+        'kind': kind,
+        'payload': payload,
+        'user_id': user_id,
+        'status': 'queued',  # queued, running, done, failed
+        'attempts': 0,
+        'result': None,
+        'error': None,
+        'notified': False,
+        'created_at': datetime.utcnow(),
+        'started_at': None,
+        'finished_at': None,
+        'lease_expires_at': None,
+        'worker': None
+    }
+    return verification_jobs_collection.insert_one(job).inserted_id
+
+
+def claim_verification_jobs(worker_id, limit):
+    """
+    Atomically claim up to `limit` jobs, oldest first
+
+    Queued jobs and running jobs whose lease expired (crashed worker) are
+    eligible. Each claim is a find_one_and_update, so two workers never
+    get the same job.
+
+    Returns:
+        list: Claimed job documents
+    """
+    jobs = []
+    now = datetime.utcnow()
+    while len(jobs) < limit:
+        job = verification_jobs_collection.find_one_and_update(
+            {
+                '$or': [
+                    {'status': 'queued'},
+                    {'status': 'running', 'lease_expires_at': {'$lt': now}}
+                ],
+                'attempts': {'$lt': Config.VERIFICATION_JOB_MAX_ATTEMPTS}
+            },
+            {
+                '$set': {
+                    'status': 'running',
+                    'worker': worker_id,
+                    'started_at': now,
+                    'lease_expires_at': now + timedelta(seconds=Config.VERIFICATION_JOB_LEASE_SECONDS)
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if not job:
+            break
+        jobs.append(job)
+    return jobs
+
+
+def reap_exhausted_jobs():
+    """
+    Fail jobs whose worker died on their last attempt
+
+    claim_verification_jobs never reclaims a job that has used all its
+    attempts, so without this a job left running with an expired lease
+    would stay running forever.
+
+    Returns:
+        list: Reaped jobs as they were before failing (payload included, for cleanup)
+    """
+    jobs = []
+    now = datetime.utcnow()
+    while True:
+        job = verification_jobs_collection.find_one_and_update(
+            {
+                'status': 'running',
+                'lease_expires_at': {'$lt': now},
+                'attempts': {'$gte': Config.VERIFICATION_JOB_MAX_ATTEMPTS}
+            },
+            {
+                '$set': {
+                    'status': 'failed',
+                    'error': 'Worker stopped during the final attempt',
+                    'finished_at': now,
+                    'lease_expires_at': None
+                },
+                '$unset': {'payload': ''}
+            },
+            return_document=ReturnDocument.BEFORE
+        )
+        if not job:
+            return jobs
+        jobs.append(job)
+
+
+def complete_verification_job(job_id, result):
+    """Store a job's result (its input payload is dropped)"""
+    return verification_jobs_collection.update_one(
+        {'_id': job_id},
+        {
+            '$set': {
+                'status': 'done',
+                'result': result,
+                'finished_at': datetime.utcnow(),
+                'lease_expires_at': None
+            },
+            '$unset': {'payload': ''}
+        }
+    )
+
+
+def fail_verification_job(job_id, error, permanent=False):
+    """
+    Record a failed attempt
+
+    The job goes back to the queue until it has used
+    Config.VERIFICATION_JOB_MAX_ATTEMPTS attempts, unless `permanent`
+    (retrying can't succeed). A final failure drops the input payload.
+
+    Returns:
+        bool: True if the job failed permanently
+    """
+    final = permanent
+    if not final:
+        job = verification_jobs_collection.find_one({'_id': job_id}, {'attempts': 1})
+        final = not job or job['attempts'] >= Config.VERIFICATION_JOB_MAX_ATTEMPTS
+    update = {'$set': {
+        'status': 'failed' if final else 'queued',
+        'error': str(error),
+        'finished_at': datetime.utcnow() if final else None,
+        'lease_expires_at': None
+    }}
+    if final:
+        update['$unset'] = {'payload': ''}
+    verification_jobs_collection.update_one({'_id': job_id}, update)
+    return final
+
+
+def get_verification_job(job_id):
+    """Get a job without its input payload"""
+    try:
+        return verification_jobs_collection.find_one({'_id': ObjectId(job_id)}, {'payload': 0})
+    except Exception:
+        return None
+
+
+def record_worker_heartbeat(worker_id):
+    """Mark a worker process as alive with its model loaded"""
+    verification_workers_collection.update_one(
+        {'_id': worker_id},
+        {'$set': {'heartbeat_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def get_worker_status():
+    """
+    Readiness snapshot of the worker pool (QUEST_VERIFIER_ASYNC)
+
+    Returns:
+        dict: {'ready', 'workers', 'queued'} - ready once at least one worker
+              has sent a heartbeat recently
+    """
+    cutoff = datetime.utcnow() - timedelta(
+        seconds=Config.VERIFICATION_WORKER_HEARTBEAT_SECONDS * _MISSED_HEARTBEATS
+    )
+    workers = verification_workers_collection.count_documents({'heartbeat_at': {'$gte': cutoff}})
+    queued = verification_jobs_collection.count_documents({'status': 'queued'})
+    return {'ready': workers > 0, 'workers': workers, 'queued': queued}
+
+
+def claim_finished_job_for_notification():
+    """
+    Take one finished job that hasn't been announced yet
+
+    Used by the Socket.IO notifier; the conditional update makes sure only
+    one web process emits each result.
+    """
+    return verification_jobs_collection.find_one_and_update(
+        {'notified': False, 'status': {'$in': ['done', 'failed']}},
+        {'$set': {'notified': True}},
+        projection={'payload': 0},
+        sort=[('finished_at', 1)]
+    )
+
+
+def serialize_verification_job(job):
+    """JSON-safe job status"""
+    return {
+        'job_id': str(job['_id']),
+        'kind': job['kind'],
+        'status': job['status'],
+        'result': job.get('result'),
+        'error': job.get('error') if job['status'] == 'failed' else None,
+        'attempts': job.get('attempts', 0),
+        'created_at': job['created_at'].isoformat(),
+        'finished_at': job['finished_at'].isoformat() if job.get('finished_at') else None
+    }
@@ -2,16 +2,38 @@
 AI-powered routes using Gemini API
 Heatmap generation, quest verification, and chatbot
 """
-from flask import Blueprint, request, jsonify
-from utils.jwt_utils import token_required
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from utils.jwt_utils import token_required, decode_token
 from services.gemini_service import (
     generate_heatmap_data,
     verify_quest_image,
     chatbot_response,
-    generate_trip_itinerary
+    generate_trip_itinerary,
+    stream_trip_itinerary,
+    parse_itinerary_json,
+    generate_fallback_itinerary,
+    regenerate_itinerary_day,
+    summarize_conversation,
+    estimate_tokens
 )
+from models.ai_chat import (
+    get_conversation_summary, add_pending_messages, update_conversation_summary, log_ai_exchange,
+    get_ai_log_stats
+)
+from models.trip import get_trip_by_id, save_generated_itinerary, replace_itinerary_day
+from models.quest import mark_quest_verified
+from models.verification_job import (
+    enqueue_verification_job, get_verification_job, serialize_verification_job, save_job_image, JOB_IMAGE_PAIR
+)
+from services.search_service import search_transportation, search_general_info
+from services.llm_telemetry import get_llm_metrics
+from utils.json_stream import IncrementalArrayParser
 from config import Config
+from concurrent.futures import ThreadPoolExecutor, wait
 import json
+import re
+import threading
+import time
 
 def format_itinerary_to_text(itinerary_dict, destination, days):
     """
@@ -71,7 +93,277 @@ def format_itinerary_to_text(itinerary_dict, destination, days):
         text_parts.append(f"⏰ Best Time: {itinerary_dict['best_time_to_visit']}\n")
     
     return ''.join(text_parts)
+
+# (user_id, conversation_id) pairs whose summary is currently being refreshed
+_summaries_in_flight = set()
+_summaries_lock = threading.Lock()
+
+def _refresh_conversation_summary(user_id, conversation_id, summary, pending):
+    """Fold pending messages into the stored summary (runs off the request path)"""
+    try:
+        new_summary = summarize_conversation(summary, pending)
+        if new_summary:
+            update_conversation_summary(user_id, conversation_id, new_summary, [msg['id'] for msg in pending])
+    except Exception as e:
+        print(f"Conversation summary error: {e}")
+    finally:
+        with _summaries_lock:
+            _summaries_in_flight.discard((user_id, conversation_id))
+
+def _message_id(msg):
+    """Numeric client message ID (Date.now() in the chat page), or None"""
+    try:
+        return float(msg.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+def build_conversation_context(user_id, conversation_id, chat_history):
+    """
+    Build prompt context from the chat history sent by the frontend
+    
+    The client only sends its latest messages. Messages older than the
+    recent window are stored server-side by message ID as they slide out,
+    and folded into a rolling summary every few turns; the summary, the
+    not-yet-summarized messages and the recent ones are kept under the
+    token budget. Stored state is scoped to the authenticated `user_id`.
+    Without a user, a conversation_id or message IDs, only the recent
+    messages are used.
+    
+    Returns:
+        dict: Context keys ('conversation_summary', 'conversation_history')
+    """
+    recent_count = Config.AI_CHAT_RECENT_TURNS
+    older = chat_history[:-recent_count] if len(chat_history) > recent_count else []
+    recent = chat_history[-recent_count:]
+    
+    summary, pending = '', []
+    if user_id and conversation_id:
+        stored = get_conversation_summary(user_id, conversation_id)
+        summary, pending = stored['summary'], stored['pending']
+        last_id = stored['last_message_id']
+        
+        new_older = [
+            {'id': _message_id(msg), 'role': msg.get('role', 'user'), 'content': msg.get('content', '')}
+            for msg in older
+            if _message_id(msg) is not None and (last_id is None or _message_id(msg) > last_id)
+        ]
+        if new_older and add_pending_messages(user_id, conversation_id, new_older, new_older[-1]['id']):
+            pending = pending + new_older
+        
+        # Summarize in the background; this turn sends the pending messages verbatim
+        if len(pending) >= Config.AI_CHAT_SUMMARY_EVERY:
+            with _summaries_lock:
+                start_refresh = (user_id, conversation_id) not in _summaries_in_flight
+                if start_refresh:
+                    _summaries_in_flight.add((user_id, conversation_id))
+            if start_refresh:
+                threading.Thread(
+                    target=_refresh_conversation_summary,
+                    args=(user_id, conversation_id, summary, pending),
+                    daemon=True
+                ).start()
+    
+    # Newest messages first until the budget is spent
+    budget = Config.AI_CHAT_CONTEXT_TOKEN_BUDGET - estimate_tokens(summary)
+    history_text = []
+    for msg in reversed(pending + recent):
+        line = f"{msg.get('role', 'user').upper()}: {msg.get('content', '')}"
+        cost = estimate_tokens(line)
+        if cost > budget:
+            break
+        budget -= cost
+        history_text.append(line)
+    history_text.reverse()
+    
+    context = {}
+    if summary:
+        context['conversation_summary'] = summary
+    if history_text:
+        context['conversation_history'] = '\n'.join(history_text)
+    return context
+
+def format_itinerary_day_markdown(day_info):
+    """Markdown for a single itinerary day (activities and meals)"""
+    day_num = day_info.get('day', 1)
+    day_title = day_info.get('title', f'Day {day_num}')
+    itinerary_text = f"**Day {day_num}: {day_title}**\n\n"
+    
+    # Activities
+    for activity in day_info.get('activities', []):
+        time = activity.get('time', '')
+        name = activity.get('activity', '')
+        location = activity.get('location', '')
+        desc = activity.get('description', '')
+        itinerary_text += f"  {time} - **{name}** at {location}\n"
+        if desc:
+            itinerary_text += f"    {desc}\n"
+    
+    # Meals
+    itinerary_text += "\n  **Meals:**\n"
+    for meal in day_info.get('meals', []):
+        meal_type = meal.get('type', '').capitalize()
+        suggestion = meal.get('suggestion', '')
+        cuisine = meal.get('cuisine', '')
+        itinerary_text += f"    • {meal_type}: {suggestion}"
+        if cuisine:
+            itinerary_text += f" ({cuisine})"
+        itinerary_text += "\n"
+    
+    return itinerary_text + "\n"
+
+def format_itinerary_extras_markdown(itinerary_data):
+    """Markdown for the travel tips and budget that follow the days"""
+    itinerary_text = ''
+    
+    # Tips
+    if itinerary_data.get('tips'):
+        itinerary_text += "\n**Travel Tips:**\n"
+        for tip in itinerary_data['tips']:
+            itinerary_text += f"  • {tip}\n"
+    
+    # Budget
+    if itinerary_data.get('budget_estimate'):
+        itinerary_text += f"\n**Budget Estimate:** {itinerary_data['budget_estimate']}\n"
+    
+    return itinerary_text
+
+def format_itinerary_markdown(itinerary_data, destination, duration_days):
+    """Convert itinerary JSON to the markdown text shown in the chat UI"""
+    itinerary_text = f"**{duration_days}-Day Itinerary for {destination}**\n\n"
+    for day_info in itinerary_data.get('days', []):
+        itinerary_text += format_itinerary_day_markdown(day_info)
+    return itinerary_text + format_itinerary_extras_markdown(itinerary_data)
+
+def get_duration_days(data):
+    """
+    Trip length from start_date/end_date or duration_days in a request body
+    
+    Raises:
+        ValueError: If neither is provided or the duration is out of range
+    """
+    if data.get('start_date') and data.get('end_date'):
+        from email.utils import parsedate_to_datetime
+        
+        # Try multiple date formats
+        try:
+            # Try ISO format first
+            start = datetime.fromisoformat(data['start_date'].replace('Z', '+00:00'))
+            end = datetime.fromisoformat(data['end_date'].replace('Z', '+00:00'))
+        except ValueError:
+            try:
+                # Try GMT/HTTP date format
+                start = parsedate_to_datetime(data['start_date'])
+                end = parsedate_to_datetime(data['end_date'])
+            except Exception:
+                # Try parsing as string
+                from dateutil import parser
+                start = parser.parse(data['start_date'])
+                end = parser.parse(data['end_date'])
+        
+        duration_days = (end - start).days + 1
+    elif data.get('duration_days'):
+        duration_days = int(data['duration_days'])
+    else:
+        raise ValueError('Either duration_days or (start_date and end_date) required')
+    
+    if duration_days < 1 or duration_days > 30:
+        raise ValueError('duration must be between 1 and 30 days')
+    return duration_days
+
+def format_fallback_itinerary_markdown(destination, duration_days):
+    """Generic day plan used when the AI itinerary is unavailable"""
+    itinerary_formatted = f"**{duration_days}-Day Trip to {destination}**\n\n"
+    for i in range(duration_days):
+        itinerary_formatted += f"**Day {i+1}:**\n"
+        itinerary_formatted += f"  9:00 AM - Explore {destination}\n"
+        itinerary_formatted += f"  2:00 PM - Local cuisine tasting\n"
+        itinerary_formatted += f"  5:00 PM - Visit popular attractions\n\n"
+    return itinerary_formatted
+
+def search_hotels(destination):
+    """
+    Get hotels with nightly prices using Google Search (Karnataka focus)
+    
+    Returns:
+        list: Hotels that have a parsed price
+    
+    Raises:
+        RuntimeError: If the search service is unavailable
+    """
+    # Add Karnataka context to hotel search
+    hotels_search = search_general_info(f"hotels in {destination} Karnataka booking price")
+    if hotels_search is None:
+        raise RuntimeError('Hotel search unavailable')
+    
+    hotels = []
+    for result in hotels_search.get('organic_results', [])[:8]:
+        title = result['title']
+        snippet = result['snippet']
+        
+        # Extract price if present - look for actual nightly rates
+        fare = 'Check website'
+        text = snippet + ' ' + title
+        
+        # Look for patterns like "₹5,000", "Rs. 5000", "₹3000/night"
+        rupee_matches = re.findall(r'(?:₹|Rs\.?\s*)([0-9,]+)', text)
+        
+        if rupee_matches:
+            # Convert to numbers and find reasonable hotel prices
+            amounts = [int(m.replace(',', '')) for m in rupee_matches]
+            # Filter for typical hotel rates (₹500 - ₹50,000 per night)
+            hotel_prices = [a for a in amounts if 500 <= a <= 50000]
+            if hotel_prices:
+                # Use the most common price or average if multiple
+                avg_price = sum(hotel_prices) // len(hotel_prices) if len(hotel_prices) > 1 else hotel_prices[0]
+                fare = f"₹{avg_price:,}/night"
+        
+        # Try dollar conversion as fallback
+        if fare == 'Check website':
+            dollar_matches = re.findall(r'\$\s*([0-9,]+)', text)
+            if dollar_matches:
+                dollar_amounts = [int(m.replace(',', '')) for m in dollar_matches]
+                hotel_dollar_prices = [a for a in dollar_amounts if 10 <= a <= 1000]
+                if hotel_dollar_prices:
+                    avg_dollar = sum(hotel_dollar_prices) // len(hotel_dollar_prices) if len(hotel_dollar_prices) > 1 else hotel_dollar_prices[0]
+                    fare = f"₹{int(avg_dollar * 83):,}/night"
+        
+        hotels.append({
+            'name': title,
+            'fare': fare,
+            'description': snippet[:150],
+            'link': result['link'],
+            'source': 'Google Search'
+        })
+    
+    # Filter to only show hotels with actual prices
+    return [h for h in hotels if h['fare'] != 'Check website']
+
+# Shared pool for the /generate-itinerary fan-out. Not used as a context
+# manager: branches still queued at the deadline are cancelled, and running
+# stragglers finish in the background without starting further calls.
+_fanout_executor = ThreadPoolExecutor(
+    max_workers=Config.ITINERARY_FANOUT_WORKERS,
+    thread_name_prefix='itinerary-fanout'
+)
+
+def _fanout_branch(deadline, fn, *args, **kwargs):
+    """Run a fan-out branch unless its request's deadline passed while it was queued"""
+    if time.monotonic() >= deadline:
+        raise TimeoutError('deadline passed before the branch started')
+    return fn(*args, **kwargs)
+
+def _fanout_result(future):
+    """Return (result, error) for a fan-out branch, treating unfinished or cancelled as timed out"""
+    if not future.done() or future.cancelled():
+        return None, 'timed out'
+    try:
+        return future.result(), None
+    except Exception as e:
+        print(f"Itinerary fan-out branch failed: {e}")
+        return None, str(e)
+
 from models import db
+from bson.objectid import ObjectId
 import base64
 from datetime import datetime
 
@@ -179,75 +471,102 @@ def verify_quest():
         
         # NEW: Before/After comparison flow for cleanup quests
         if before_image and after_image and quest_type == 'trash_cleanup':
-            try:
-                from ai.quest_verifier import verify_cleanliness
-                import tempfile
-                import os
+            from ai.quest_verifier import wait_until_ready, get_verifier_status
+            
+            # Decode base64 images in memory; the verifier takes raw bytes
+            def decode_base64_image(base64_str):
+                if base64_str.startswith('data:'):
+                    base64_str = base64_str.split(',')[1]
+                return base64.b64decode(base64_str)
+            
+            # Hand off to the verification workers; poll the job or listen
+            # for the 'quest_verification' Socket.IO event
+            if Config.QUEST_VERIFIER_ASYNC:
+                from ai.quest_verifier import image_hash, check_same_image, assess_image
                 
-                # Save base64 images to temp files for verifier
-                def save_base64_image(base64_str, prefix):
-                    if base64_str.startswith('data:'):
-                        base64_str = base64_str.split(',')[1]
-                    
-                    import base64 as b64
-                    img_data = b64.b64decode(base64_str)
-                    
-                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg', prefix=prefix)
-                    temp_file.write(img_data)
-                    temp_file.close()
-                    return temp_file.name
+                # Only the job's owner can read its result, so a job needs one
+                job_owner = _optional_token_user()
+                if not job_owner:
+                    return jsonify({'error': 'Authentication token is missing'}), 401
                 
-                before_path = save_base64_image(before_image, 'before_')
-                after_path = save_base64_image(after_image, 'after_')
+                before_bytes = decode_base64_image(before_image)
+                after_bytes = decode_base64_image(after_image)
                 
-                try:
-                    # Use mock GPS coordinates (can be enhanced to use real location)
-                    user_gps = (12.9716, 77.5946)  # Default: Bangalore
-                    quest_gps = (12.9716, 77.5946)
-                    
-                    result = verify_cleanliness(before_path, after_path, user_gps, quest_gps, radius_m=500)
-                    
-                    # Cleanup temp files
-                    os.unlink(before_path)
-                    os.unlink(after_path)
-                    
-                    verification = {
-                        'verified': result.get('verified', False),
-                        'confidence': result.get('confidence', 0),
-                        'reason': result.get('reason'),
-                        'quest_type': quest_type,
-                        'elapsed_time': elapsed_time,
-                        'comparison_mode': True
-                    }
-                    
-                    # Update quest in database if verified
-                    if quest_id and verification.get('verified'):
-                        quests_collection = db.quests
-                        quests_collection.update_one(
-                            {'_id': quest_id},
-                            {
-                                '$set': {
-                                    'status': 'verified',
-                                    'verification_data': verification,
-                                    'verified_at': datetime.utcnow(),
-                                    'elapsed_time': elapsed_time
-                                }
-                            }
-                        )
-                    
+                # Unusable photos are rejected here rather than queued
+                for role, image_bytes in (('Before', before_bytes), ('After', after_bytes)):
+                    _, issue = assess_image(image_bytes)
+                    if issue:
+                        return jsonify({'error': f'{role} photo rejected: {issue}'}), 400
+                
+                # Same photo twice is rejected here rather than queued
+                same_image = check_same_image(image_hash(before_bytes), image_hash(after_bytes))
+                if same_image:
                     return jsonify({
                         'message': 'Quest verification complete (before/after comparison)',
-                        'verification': verification,
+                        'verification': {
+                            'verified': False,
+                            'confidence': 0,
+                            'reason': same_image['reason'],
+                            'fraud_flag': same_image['fraud_flag'],
+                            'quest_type': quest_type,
+                            'elapsed_time': elapsed_time,
+                            'comparison_mode': True
+                        },
                         'quest_id': quest_id
                     }), 200
-                    
-                except Exception as e:
-                    # Cleanup on error
-                    if os.path.exists(before_path):
-                        os.unlink(before_path)
-                    if os.path.exists(after_path):
-                        os.unlink(after_path)
-                    raise e
+                
+                job_id = enqueue_verification_job(JOB_IMAGE_PAIR, {
+                    'before_image': save_job_image(before_bytes, 'before'),
+                    'after_image': save_job_image(after_bytes, 'after'),
+                    'quest_id': quest_id,
+                    'quest_type': quest_type,
+                    'elapsed_time': elapsed_time
+                }, user_id=ObjectId(job_owner['user_id']))
+                return jsonify({
+                    'message': 'Quest verification queued',
+                    'job_id': str(job_id),
+                    'status_url': f'/ai/verify-quest/jobs/{job_id}',
+                    'quest_id': quest_id
+                }), 202
+            
+            # Wait briefly for the model instead of triggering a load per request
+            if not wait_until_ready(Config.QUEST_VERIFIER_READY_TIMEOUT_SECONDS):
+                return jsonify({
+                    'error': 'Verification is warming up, please retry shortly',
+                    'verifier': get_verifier_status()
+                }), 503, {'Retry-After': '5'}
+            
+            try:
+                from ai.quest_verifier import verify_cleanliness
+                
+                before_bytes = decode_base64_image(before_image)
+                after_bytes = decode_base64_image(after_image)
+                
+                # Use mock GPS coordinates (can be enhanced to use real location)
+                user_gps = (12.9716, 77.5946)  # Default: Bangalore
+                quest_gps = (12.9716, 77.5946)
+                
+                result = verify_cleanliness(before_bytes, after_bytes, user_gps, quest_gps, radius_m=500)
+                
+                verification = {
+                    'verified': result.get('verified', False),
+                    'confidence': result.get('confidence', 0),
+                    'reason': result.get('reason'),
+                    'fraud_flag': result.get('fraud_flag'),
+                    'quest_type': quest_type,
+                    'elapsed_time': elapsed_time,
+                    'comparison_mode': True
+                }
+                
+                # Update quest in database if verified
+                if quest_id and verification.get('verified'):
+                    mark_quest_verified(quest_id, verification, elapsed_time)
+                
+                return jsonify({
+                    'message': 'Quest verification complete (before/after comparison)',
+                    'verification': verification,
+                    'quest_id': quest_id
+                }), 200
                     
             except Exception as e:
                 print(f"Before/after verification error: {e}")
@@ -319,7 +638,8 @@ def chat():
     POST /ai/chat
     Body: {
         "message": "What are the best places to visit in Paris?",
-        "history": [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}],
+        "history": [{"id": 1718000000000, "role": "user", "content": "..."}, ...],
+        "conversation_id": "client_session_id",  // Keys the rolling summary (with the bearer token's user)
         "trip_id": "optional_trip_id",  // Include specific trip context
         "include_stories": true  // Include local stories from DB
     }
@@ -334,21 +654,26 @@ def chat():
         user_message = data['message']
         trip_id = data.get('trip_id')
         include_stories = data.get('include_stories', False)
-        chat_history = data.get('history', [])  # Get conversation history from frontend
+        # History and conversation id may also arrive nested under "context"
+        client_context = data.get('context') or {}
+        chat_history = data.get('history') or client_context.get('history') or []
+        conversation_id = data.get('conversation_id') or client_context.get('conversation_id')
         
         # Build context
         context = {
             'user_preferences': {}
         }
         
-        # Add conversation history as context (last 10 messages)
+        # Add conversation history as context (rolling summary + recent turns)
         if chat_history and len(chat_history) > 0:
-            history_text = []
-            for msg in chat_history[-10:]:  # Last 10 messages
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                history_text.append(f"{role.upper()}: {content}")
-            context['conversation_history'] = '\n'.join(history_text)
+            try:
+                # Summaries are only kept for authenticated callers
+                chat_user = _optional_token_user()
+                context.update(build_conversation_context(
+                    chat_user['user_id'] if chat_user else None, conversation_id, chat_history
+                ))
+            except Exception as e:
+                print(f"Could not build conversation context: {e}")
         
         # Fetch user's saved trips from database to provide context
         try:
@@ -401,16 +726,15 @@ def chat():
         # Handle response
         response_message = result.get('message') or result.get('response', 'Sorry, I encountered an error.')
         
-        # Store conversation in database (optional)
-        conversations_collection = db.conversations
-        conversations_collection.insert_one({
-            'user_id': current_user['user_id'],
-            'message': user_message,
-            'response': response_message,
-            'context_used': result.get('context_used'),
-            'trip_id': trip_id,
-            'timestamp': datetime.utcnow()
-        })
+        # Log the exchange (buffered, written in batches off the request path)
+        log_ai_exchange(
+            current_user['user_id'],
+            user_message,
+            response_message,
+            context_used=result.get('context_used'),
+            trip_id=trip_id,
+            model=result.get('model')
+        )
         
         return jsonify({
             'message': response_message,
@@ -433,12 +757,16 @@ def generate_itinerary():
         "start_date": "2025-12-15",
         "end_date": "2025-12-20",
         "origin": "Mumbai",  // Optional for transportation
+        "trip_id": "optional_trip_id",  // Save the itinerary on this trip (owner's bearer token required)
         "preferences": {
             "interests": ["culture", "food", "nature"],
             "budget": "medium",
             "pace": "relaxed"
         }
     }
+    
+    The response's "sections" object marks each part (itinerary,
+    transportation, hotels) as complete, degraded or skipped.
     """
     try:
         current_user = DEMO_USER
@@ -449,169 +777,104 @@ def generate_itinerary():
         
         destination = data['destination']
         preferences = data.get('preferences', {})
+        trip_id = data.get('trip_id')
+        if trip_id and not ObjectId.is_valid(trip_id):
+            return jsonify({'error': 'Invalid trip_id'}), 400
+        # Saving onto a trip requires the trip owner's token
+        if trip_id and not _owned_trip(trip_id, _optional_token_user()):
+            return jsonify({'error': 'Trip not found or not authorized'}), 403
         
         # Calculate duration from dates or use provided duration_days
-        if data.get('start_date') and data.get('end_date'):
-            from datetime import datetime
-            from email.utils import parsedate_to_datetime
-            
-            # Try multiple date formats
-            try:
-                # Try ISO format first
-                start = datetime.fromisoformat(data['start_date'].replace('Z', '+00:00'))
-                end = datetime.fromisoformat(data['end_date'].replace('Z', '+00:00'))
-            except ValueError:
-                try:
-                    # Try GMT/HTTP date format
-                    start = parsedate_to_datetime(data['start_date'])
-                    end = parsedate_to_datetime(data['end_date'])
-                except Exception:
-                    # Try parsing as string
-                    from dateutil import parser
-                    start = parser.parse(data['start_date'])
-                    end = parser.parse(data['end_date'])
-            
-            duration_days = (end - start).days + 1
-        elif data.get('duration_days'):
-            duration_days = int(data['duration_days'])
-        else:
-            return jsonify({'error': 'Either duration_days or (start_date and end_date) required'}), 400
+        try:
+            duration_days = get_duration_days(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if duration_days < 1 or duration_days > 30:
-            return jsonify({'error': 'duration must be between 1 and 30 days'}), 400
+        # Run the LLM itinerary and the transport/hotel searches concurrently;
+        # whatever has not finished by the shared deadline is reported as degraded
+        origin = data.get('origin')
+        start_date = data.get('start_date')
+        deadline = time.monotonic() + Config.ITINERARY_FANOUT_TIMEOUT_SECONDS
+        futures = {
+            'itinerary': _fanout_executor.submit(
+                _fanout_branch, deadline, generate_trip_itinerary,
+                destination, duration_days, preferences, deadline=deadline
+            ),
+            'hotels': _fanout_executor.submit(_fanout_branch, deadline, search_hotels, destination)
+        }
+        if origin:
+            futures['flights'] = _fanout_executor.submit(
+                _fanout_branch, deadline, search_transportation, origin, destination, start_date, mode='flights'
+            )
+            futures['trains'] = _fanout_executor.submit(
+                _fanout_branch, deadline, search_transportation, origin, destination, start_date, mode='trains'
+            )
+        wait(futures.values(), timeout=Config.ITINERARY_FANOUT_TIMEOUT_SECONDS)
+        # Branches still queued would otherwise run (and call out) after this response
+        for future in futures.values():
+            future.cancel()
         
-        # Generate itinerary using Gemini
-        try:
-            result = generate_trip_itinerary(destination, duration_days, preferences)
-            
-            # Format itinerary as readable text
-            if result.get('success') and result.get('itinerary'):
-                itinerary_data = result['itinerary']
-                itinerary_text = f"**{duration_days}-Day Itinerary for {destination}**\n\n"
-                
-                # Format each day
-                for day_info in itinerary_data.get('days', []):
-                    day_num = day_info.get('day', 1)
-                    day_title = day_info.get('title', f'Day {day_num}')
-                    itinerary_text += f"**Day {day_num}: {day_title}**\n\n"
-                    
-                    # Activities
-                    for activity in day_info.get('activities', []):
-                        time = activity.get('time', '')
-                        name = activity.get('activity', '')
-                        location = activity.get('location', '')
-                        desc = activity.get('description', '')
-                        itinerary_text += f"  {time} - **{name}** at {location}\n"
-                        if desc:
-                            itinerary_text += f"    {desc}\n"
-                    
-                    # Meals
-                    itinerary_text += "\n  **Meals:**\n"
-                    for meal in day_info.get('meals', []):
-                        meal_type = meal.get('type', '').capitalize()
-                        suggestion = meal.get('suggestion', '')
-                        cuisine = meal.get('cuisine', '')
-                        itinerary_text += f"    • {meal_type}: {suggestion}"
-                        if cuisine:
-                            itinerary_text += f" ({cuisine})"
-                        itinerary_text += "\n"
-                    
-                    itinerary_text += "\n"
-                
-                # Tips
-                if itinerary_data.get('tips'):
-                    itinerary_text += "\n**Travel Tips:**\n"
-                    for tip in itinerary_data['tips']:
-                        itinerary_text += f"  • {tip}\n"
-                
-                # Budget
-                if itinerary_data.get('budget_estimate'):
-                    itinerary_text += f"\n**Budget Estimate:** {itinerary_data['budget_estimate']}\n"
-                
-                itinerary_formatted = itinerary_text
-            else:
-                # Fallback
-                itinerary_formatted = f"**{duration_days}-Day Trip to {destination}**\n\n"
-                for i in range(duration_days):
-                    itinerary_formatted += f"**Day {i+1}:**\n"
-                    itinerary_formatted += f"  9:00 AM - Explore {destination}\n"
-                    itinerary_formatted += f"  2:00 PM - Local cuisine tasting\n"
-                    itinerary_formatted += f"  5:00 PM - Visit popular attractions\n\n"
-        except Exception as e:
-            print(f"Gemini itinerary error: {e}")
-            itinerary_formatted = f"**{duration_days}-Day Trip to {destination}**\n\nItinerary generation in progress..."
+        sections = {}
         
-        # Get transportation options if origin provided
+        # Itinerary
+        result, error = _fanout_result(futures['itinerary'])
+        if result and result.get('success') and result.get('itinerary'):
+            itinerary_formatted = format_itinerary_markdown(result['itinerary'], destination, duration_days)
+            sections['itinerary'] = {'status': 'complete'}
+            if trip_id:
+                try:
+                    save_generated_itinerary(trip_id, result['itinerary'], model=result.get('model'))
+                except Exception as e:
+                    print(f"Could not save generated itinerary: {e}")
+        else:
+            itinerary_formatted = format_fallback_itinerary_markdown(destination, duration_days)
+            sections['itinerary'] = {
+                'status': 'degraded',
+                'reason': error or (result or {}).get('error', 'AI service unavailable')
+            }
+        
+        # Transportation (flights and trains are separate searches)
         transportation = None
-        origin = data.get('origin')
         if origin:
-            try:
-                from services.search_service import search_transportation
-                start_date = data.get('start_date')
-                transportation = search_transportation(origin, destination, start_date, mode='all')
-            except Exception as e:
-                print(f"Transportation search error: {e}")
-                transportation = None
+            transportation = {
+                'source': 'google_search',
+                'origin': origin,
+                'destination': destination,
+                'date': start_date,
+                'flights': [],
+                'trains': []
+            }
+            reasons = []
+            for mode in ('flights', 'trains'):
+                result, error = _fanout_result(futures[mode])
+                if result:
+                    transportation[mode] = result.get(mode, [])
+                    error = result.get('error')
+                if error:
+                    reasons.append(f"{mode}: {error}")
+            if reasons:
+                transportation['error'] = '; '.join(reasons)
+                sections['transportation'] = {'status': 'degraded', 'reason': '; '.join(reasons)}
+            else:
+                sections['transportation'] = {'status': 'complete'}
+        else:
+            sections['transportation'] = {'status': 'skipped', 'reason': 'origin not provided'}
         
-        # Get hotels using Google Search (Karnataka focus)
-        hotels = []
-        try:
-            from services.search_service import search_general_info
-            import re
-            # Add Karnataka context to hotel search
-            hotels_search = search_general_info(f"hotels in {destination} Karnataka booking price")
-            if hotels_search and hotels_search.get('organic_results'):
-                for result in hotels_search['organic_results'][:8]:
-                    title = result['title']
-                    snippet = result['snippet']
-                    
-                    # Extract price if present - look for actual nightly rates
-                    fare = 'Check website'
-                    text = snippet + ' ' + title
-                    
-                    # Look for patterns like "₹5,000", "Rs. 5000", "₹3000/night"
-                    rupee_matches = re.findall(r'(?:₹|Rs\.?\s*)([0-9,]+)', text)
-                    
-                    if rupee_matches:
-                        # Convert to numbers and find reasonable hotel prices
-                        amounts = [int(m.replace(',', '')) for m in rupee_matches]
-                        # Filter for typical hotel rates (₹500 - ₹50,000 per night)
-                        hotel_prices = [a for a in amounts if 500 <= a <= 50000]
-                        if hotel_prices:
-                            # Use the most common price or average if multiple
-                            avg_price = sum(hotel_prices) // len(hotel_prices) if len(hotel_prices) > 1 else hotel_prices[0]
-                            fare = f"₹{avg_price:,}/night"
-                    
-                    # Try dollar conversion as fallback
-                    if fare == 'Check website':
-                        dollar_matches = re.findall(r'\$\s*([0-9,]+)', text)
-                        if dollar_matches:
-                            dollar_amounts = [int(m.replace(',', '')) for m in dollar_matches]
-                            hotel_dollar_prices = [a for a in dollar_amounts if 10 <= a <= 1000]
-                            if hotel_dollar_prices:
-                                avg_dollar = sum(hotel_dollar_prices) // len(hotel_dollar_prices) if len(hotel_dollar_prices) > 1 else hotel_dollar_prices[0]
-                                fare = f"₹{int(avg_dollar * 83):,}/night"
-                    
-                    hotels.append({
-                        'name': title,
-                        'fare': fare,
-                        'description': snippet[:150],
-                        'link': result['link'],
-                        'source': 'Google Search'
-                    })
-            
-            # Filter to only show hotels with actual prices
-            hotels = [h for h in hotels if h['fare'] != 'Check website']
-        except Exception as e:
-            print(f"Hotels search error: {e}")
+        # Hotels
+        hotels, error = _fanout_result(futures['hotels'])
+        if error:
             hotels = []
+            sections['hotels'] = {'status': 'degraded', 'reason': error}
+        else:
+            sections['hotels'] = {'status': 'complete'}
         
         # Return formatted response
         return jsonify({
             'message': 'Itinerary generated successfully',
             'itinerary': itinerary_formatted,
             'transportation': transportation,
-            'hotels': hotels
+            'hotels': hotels,
+            'sections': sections
         }), 200
         
     except Exception as e:
@@ -619,6 +882,259 @@ def generate_itinerary():
         traceback.print_exc()
         return jsonify({'error': f'Itinerary generation failed: {str(e)}'}), 500
 
+@ai_bp.route('/generate-itinerary/stream', methods=['POST'])
+def stream_itinerary():
+    """
+    Stream an AI itinerary day by day as server-sent events
+    
+    POST /ai/generate-itinerary/stream
+    Body: same as /ai/generate-itinerary (origin is ignored; trip_id saves
+    the itinerary once the stream completes)
+    
+    Events:
+        start    {"destination", "duration_days"}
+        day      {"index", "day", "markdown"} - one per day as soon as it parses
+        summary  {"tips", "budget_estimate", "markdown"}
+        done     {"days", "model", "complete"}
+        error    {"error"}
+    """
+    data = request.get_json() or {}
+    
+    if not data.get('destination'):
+        return jsonify({'error': 'destination is required'}), 400
+    try:
+        duration_days = get_duration_days(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    destination = data['destination']
+    preferences = data.get('preferences', {})
+    trip_id = data.get('trip_id')
+    if trip_id and not ObjectId.is_valid(trip_id):
+        return jsonify({'error': 'Invalid trip_id'}), 400
+    # Saving onto a trip requires the trip owner's token
+    if trip_id and not _owned_trip(trip_id, _optional_token_user()):
+        return jsonify({'error': 'Trip not found or not authorized'}), 403
+    
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+    
+    def generate():
+        yield sse('start', {'destination': destination, 'duration_days': duration_days})
+        
+        parser = IncrementalArrayParser('days')
+        days = []
+        days_sent = 0
+        model = None
+        error = None
+        try:
+            for model, chunk in stream_trip_itinerary(destination, duration_days, preferences):
+                for day_info in parser.feed(chunk):
+                    days.append(day_info)
+                    yield sse('day', {
+                        'index': days_sent,
+                        'day': day_info,
+                        'markdown': format_itinerary_day_markdown(day_info)
+                    })
+                    days_sent += 1
+        except Exception as e:
+            print(f"Itinerary stream error: {e}")
+            error = str(e)
+        
+        # Nothing usable arrived - send the generic plan so the client still renders days
+        if days_sent == 0:
+            fallback = generate_fallback_itinerary(destination, duration_days)['itinerary']
+            for day_info in fallback['days']:
+                yield sse('day', {
+                    'index': days_sent,
+                    'day': day_info,
+                    'markdown': format_itinerary_day_markdown(day_info)
+                })
+                days_sent += 1
+            extras = fallback
+        else:
+            try:
+                extras = parse_itinerary_json(parser.text)
+            except ValueError:
+                extras = {}
+        
+        if extras.get('tips') or extras.get('budget_estimate'):
+            yield sse('summary', {
+                'tips': extras.get('tips', []),
+                'budget_estimate': extras.get('budget_estimate'),
+                'markdown': format_itinerary_extras_markdown(extras)
+            })
+        
+        complete = error is None and parser.finished
+        if trip_id and complete:
+            try:
+                save_generated_itinerary(trip_id, dict(extras, days=days), model=model)
+            except Exception as e:
+                print(f"Could not save streamed itinerary: {e}")
+        
+        if error:
+            yield sse('error', {'error': error})
+        yield sse('done', {'days': days_sent, 'model': model, 'complete': complete})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _optional_token_user():
+    """Decoded JWT payload if the request carries a valid bearer token, else None"""
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    return decode_token(auth_header.split(' ', 1)[1])
+
+def _owned_trip(trip_id, current_user):
+    """The trip if it exists and belongs to `current_user`, else None"""
+    if not current_user or not ObjectId.is_valid(trip_id):
+        return None
+    trip = get_trip_by_id(trip_id)
+    if not trip or str(trip.get('user_id')) != str(current_user.get('user_id')):
+        return None
+    return trip
+
+def _strip_generated_at(day_info):
+    """JSON-friendly copy of a stored itinerary day"""
+    day_info = dict(day_info)
+    if isinstance(day_info.get('generated_at'), datetime):
+        day_info['generated_at'] = day_info['generated_at'].isoformat()
+    return day_info
+
+@ai_bp.route('/trips/<trip_id>/itinerary', methods=['GET'])
+@token_required
+def get_trip_itinerary(trip_id, current_user):
+    """
+    Get the AI itinerary saved on a trip
+    
+    GET /ai/trips/<trip_id>/itinerary
+    """
+    try:
+        if not ObjectId.is_valid(trip_id):
+            return jsonify({'error': 'Invalid trip_id'}), 400
+        
+        trip = _owned_trip(trip_id, current_user)
+        if not trip or not trip.get('generated_itinerary'):
+            return jsonify({'error': 'No saved itinerary for this trip'}), 404
+        
+        itinerary = trip['generated_itinerary']
+        days = sorted(itinerary.get('days', []), key=lambda d: d.get('day', 0))
+        return jsonify({
+            'trip_id': trip_id,
+            'destination': trip.get('destination'),
+            'days': [_strip_generated_at(d) for d in days],
+            'tips': itinerary.get('tips', []),
+            'budget_estimate': itinerary.get('budget_estimate'),
+            'itinerary': format_itinerary_markdown(dict(itinerary, days=days), trip.get('destination'), len(days)),
+            'updated_at': itinerary.get('updated_at').isoformat() if itinerary.get('updated_at') else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get itinerary: {str(e)}'}), 500
+
+@ai_bp.route('/trips/<trip_id>/itinerary/days/<int:day>/regenerate', methods=['POST'])
+@token_required
+def regenerate_trip_itinerary_day(trip_id, day, current_user):
+    """
+    Regenerate one day of a trip's saved itinerary
+    
+    The other days are sent to the model as a short outline only, so an
+    edit costs about one day of tokens instead of the whole plan.
+    
+    POST /ai/trips/<trip_id>/itinerary/days/<day>/regenerate
+    Body: {
+        "instructions": "More outdoor activities, skip temples"  // optional
+    }
+    """
+    try:
+        if not ObjectId.is_valid(trip_id):
+            return jsonify({'error': 'Invalid trip_id'}), 400
+        
+        data = request.get_json(silent=True) or {}
+        
+        trip = _owned_trip(trip_id, current_user)
+        if not trip or not trip.get('generated_itinerary'):
+            return jsonify({'error': 'No saved itinerary for this trip'}), 404
+        
+        days = trip['generated_itinerary'].get('days', [])
+        current_day = next((d for d in days if d.get('day') == day), None)
+        if not current_day:
+            return jsonify({'error': f'Day {day} not found in itinerary'}), 404
+        
+        other_days = [d for d in days if d.get('day') != day]
+        result = regenerate_itinerary_day(
+            trip.get('destination'),
+            day,
+            other_days,
+            trip.get('preferences', {}),
+            instructions=data.get('instructions')
+        )
+        if not result.get('success'):
+            return jsonify({'error': result.get('error', 'Day regeneration failed')}), 503
+        
+        stored_day = replace_itinerary_day(trip_id, current_day, result['day'], model=result.get('model'))
+        if not stored_day:
+            return jsonify({'error': 'Day was modified concurrently, please retry'}), 409
+        
+        return jsonify({
+            'message': f'Day {day} regenerated',
+            'day': _strip_generated_at(stored_day),
+            'markdown': format_itinerary_day_markdown(stored_day)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Day regeneration failed: {str(e)}'}), 500
+
+@ai_bp.route('/verify-quest/ready', methods=['GET'])
+def verify_quest_ready():
+    """
+    Readiness of the quest verification model
+    
+    GET /ai/verify-quest/ready
+    200 once the model is loaded and warmed up, 503 while cold/loading/failed.
+    With QUEST_VERIFIER_ASYNC the model lives in the verification workers,
+    so this reports whether any worker is up (and the queue depth) instead.
+    """
+    if Config.QUEST_VERIFIER_ASYNC:
+        from models.verification_job import get_worker_status
+        
+        status = dict(get_worker_status(), mode='async')
+    else:
+        from ai.quest_verifier import get_verifier_status
+        
+        status = get_verifier_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@ai_bp.route('/verify-quest/jobs/<job_id>', methods=['GET'])
+@token_required
+def verify_quest_job(job_id, current_user):
+    """
+    Poll an asynchronous before/after verification job
+    
+    GET /ai/verify-quest/jobs/<job_id>
+    Only the user who queued the job can read it.
+    """
+    job = get_verification_job(job_id)
+    if not job or str(job.get('user_id')) != str(current_user['user_id']):
+        return jsonify({'error': 'Verification job not found'}), 404
+    return jsonify(serialize_verification_job(job)), 200
+
+@ai_bp.route('/metrics', methods=['GET'])
+def ai_metrics():
+    """
+    LLM call telemetry per provider and operation
+    
+    GET /ai/metrics
+    Latency/queue-wait/time-to-first-token histograms (ms), token counts,
+    error and JSON parse failure counters, and provider fallback transitions,
+    plus the pending/dropped counts of the batched AI exchange log.
+    """
+    return jsonify(dict(get_llm_metrics(), ai_log=get_ai_log_stats())), 200
+
 @ai_bp.route('/health', methods=['GET'])
 def ai_health():
     """Check if Gemini API is configured"""
@@ -629,7 +1145,13 @@ def ai_health():
         'endpoints': [
             'POST /ai/heatmap - Generate crowd heatmap',
             'POST /ai/verify-quest - Verify quest with image',
+            'GET /ai/verify-quest/ready - Verification model (or worker pool) readiness',
+            'GET /ai/verify-quest/jobs/<job_id> - Asynchronous verification result',
             'POST /ai/chat - Tourism chatbot',
-            'POST /ai/generate-itinerary - AI itinerary generator'
+            'POST /ai/generate-itinerary - AI itinerary generator',
+            'POST /ai/generate-itinerary/stream - Itinerary streamed day by day (SSE)',
+            'GET /ai/metrics - LLM latency and token telemetry',
+            'GET /ai/trips/<trip_id>/itinerary - Saved trip itinerary',
+            'POST /ai/trips/<trip_id>/itinerary/days/<day>/regenerate - Regenerate one day'
         ]
     }), 200
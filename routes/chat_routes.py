@@ -6,6 +6,7 @@ from utils.jwt_utils import token_required
 from bson.objectid import ObjectId
 from datetime import datetime, timedelta
 from models import db
+from utils.geo_utils import distances_from, latlng_from_geojson, EARTH_RADIUS_KM
 
 # Collections
 users_collection = db.users
@@ -202,10 +203,6 @@ def get_nearby_travelers(current_user):
         return jsonify({'error': str(e)}), 500
 
 
-<<<<<<< HEAD
-
-=======
->>>>>>> 903cb9fbccf072c57bd74e7579de5fa03aa0a744
 # ===========================
 # AI Chat History Endpoints
 # ===========================
@@ -447,12 +444,11 @@ def get_nearby_users():
         
         users = list(user_locations_collection.find(query).limit(50))
         
+        # Distances to all results in one vectorized call
+        distances_km = nearby_distances_km(lat, lng, users)
+        
         result = []
-        for user in users:
-            # Calculate distance
-            user_coords = user.get('location', {}).get('coordinates', [0, 0])
-            dist_km = calculate_distance(lat, lng, user_coords[1], user_coords[0])
-            
+        for user, dist_km in zip(users, distances_km):
             result.append({
                 '_id': user.get('user_id', str(user.get('_id', ''))),
                 'name': user.get('name', 'Anonymous'),
@@ -506,11 +502,10 @@ def get_nearby_locals():
         online_threshold = datetime.utcnow() - timedelta(minutes=ONLINE_TIMEOUT_MINUTES)
         locals_list = list(user_locations_collection.find(query).limit(30))
         
+        distances_km = nearby_distances_km(lat, lng, locals_list)
+        
         result = []
-        for local in locals_list:
-            coords = local.get('location', {}).get('coordinates', [0, 0])
-            dist_km = calculate_distance(lat, lng, coords[1], coords[0])
-            
+        for local, dist_km in zip(locals_list, distances_km):
             result.append({
                 '_id': local.get('user_id', str(local.get('_id', ''))),
                 'name': local.get('name', 'Local Guide'),
@@ -593,20 +588,12 @@ def start_premium_chat():
         return jsonify({'error': str(e)}), 500
 
 
-def calculate_distance(lat1, lng1, lat2, lng2):
-    """Calculate distance between two points in km using Haversine formula"""
-    import math
-    R = 6371  # Earth's radius in km
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
-    
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+def nearby_distances_km(lat, lng, location_docs):
+    """Distances in km from (lat, lng) to each user_locations document"""
+    if not location_docs:
+        return []
+    coords = [doc.get('location', {}).get('coordinates', [0, 0]) for doc in location_docs]
+    return distances_from(lat, lng, latlng_from_geojson(coords), radius=EARTH_RADIUS_KM).tolist()
 
 
 # ===========================
@@ -776,11 +763,10 @@ def get_nearby_travelers_for_local():
         online_threshold = datetime.utcnow() - timedelta(minutes=ONLINE_TIMEOUT_MINUTES)
         travelers = list(user_locations_collection.find(query).limit(30))
         
+        distances_km = nearby_distances_km(lat, lng, travelers)
+        
         result = []
-        for traveler in travelers:
-            coords = traveler.get('location', {}).get('coordinates', [0, 0])
-            dist_km = calculate_distance(lat, lng, coords[1], coords[0])
-            
+        for traveler, dist_km in zip(travelers, distances_km):
             result.append({
                 '_id': traveler.get('user_id', str(traveler.get('_id', ''))),
                 'name': traveler.get('name', 'Traveler'),
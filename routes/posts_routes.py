@@ -11,13 +11,52 @@ from models.post import (
     like_post, record_view, delete_post, get_media_file,
     add_comment, get_comments, delete_comment, like_comment,
     get_trending_posts, search_by_hashtag, get_trending_hashtags,
-    get_nearby_stories, increment_shares
+    get_nearby_stories, increment_shares, get_liked_post_ids
 )
-from models.user import find_user_by_firebase_uid
+from models.user import get_author_profiles
 
 posts_bp = Blueprint('posts', __name__)
 
 
+def author_info(user_id, profiles):
+    """Public author block for a post/comment from get_author_profiles() results"""
+    profile = profiles.get(user_id)
+    return {
+        'user_id': user_id,
+        'name': profile.get('name', 'Anonymous') if profile else 'Anonymous',
+        'profile_image': profile.get('profile_image') if profile else None
+    }
+
+
+def enrich_for_viewer(items, current_user_id, liked_ids=None):
+    """
+    Prepare posts, stories or comments for the client: author info from one
+    batched lookup, is_liked for the viewer, ISO dates
+
+    Args:
+        liked_ids: IDs the viewer liked (posts); when None, is_liked comes
+                   from each item's embedded likes array (comments)
+    """
+    profiles = get_author_profiles(item.get('user_id') for item in items)
+    for item in items:
+        item['user'] = author_info(item.get('user_id'), profiles)
+        if liked_ids is None:
+            item['is_liked'] = current_user_id in item.get('likes', [])
+        else:
+            item['is_liked'] = item.get('_id') in liked_ids
+        item.pop('likes', None)
+        for field in ('created_at', 'expires_at'):
+            if item.get(field):
+                item[field] = item[field].isoformat()
+    return items
+
+
+def enrich_posts_for_viewer(posts, current_user_id):
+    """enrich_for_viewer for posts/stories, resolving is_liked with one post_likes query"""
+    liked_ids = get_liked_post_ids(current_user_id, [post['_id'] for post in posts])
+    return enrich_for_viewer(posts, current_user_id, liked_ids)
+
+
 def token_required(f):
     """Decorator to require valid JWT token"""
     @wraps(f)
@@ -126,11 +165,8 @@ def create_new_post(current_user_id):
         )
         
         # Get user info for response
-        user = find_user_by_firebase_uid(current_user_id)
-        user_info = {
-            'name': user.get('name', 'Anonymous') if user else 'Anonymous',
-            'profile_image': user.get('profile_image') if user else None
-        }
+        user_info = author_info(current_user_id, get_author_profiles([current_user_id]))
+        user_info.pop('user_id')
         
         return jsonify({
             'success': True,
@@ -162,7 +198,7 @@ def get_posts_nearby(current_user_id):
     - lng: User's longitude (required)
     - radius: Search radius in km (optional, default 10)
     - limit: Max posts to return (optional, default 50)
-    - skip: Pagination offset (optional, default 0)
+    - cursor: next_cursor from the previous page (optional)
     - type: Filter by post type (optional)
     """
     try:
@@ -170,44 +206,33 @@ def get_posts_nearby(current_user_id):
         lng = request.args.get('lng', type=float)
         radius = request.args.get('radius', 10, type=float)
         limit = request.args.get('limit', 50, type=int)
-        skip = request.args.get('skip', 0, type=int)
+        cursor = request.args.get('cursor')
         post_type = request.args.get('type')
         
         if lat is None or lng is None:
             return jsonify({'error': 'Latitude and longitude are required'}), 400
         
         # Get nearby posts
-        posts = get_nearby_posts(
-            longitude=lng,
-            latitude=lat,
-            radius_km=radius,
-            limit=min(limit, 100),  # Cap at 100
-            skip=skip,
-            post_type=post_type
-        )
+        try:
+            posts, next_cursor = get_nearby_posts(
+                longitude=lng,
+                latitude=lat,
+                radius_km=radius,
+                limit=min(limit, 100),  # Cap at 100
+                cursor=cursor,
+                post_type=post_type
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
         
-        # Enrich posts with user info
-        for post in posts:
-            user = find_user_by_firebase_uid(post.get('user_id'))
-            post['user'] = {
-                'user_id': post.get('user_id'),
-                'name': user.get('name', 'Anonymous') if user else 'Anonymous',
-                'profile_image': user.get('profile_image') if user else None
-            }
-            # Check if current user liked this post
-            post['is_liked'] = current_user_id in post.get('likes', [])
-            # Remove likes array (just send count)
-            post.pop('likes', None)
-            # Format dates
-            if post.get('created_at'):
-                post['created_at'] = post['created_at'].isoformat()
-            if post.get('expires_at'):
-                post['expires_at'] = post['expires_at'].isoformat()
+        # Author info for the whole page in one query
+        enrich_posts_for_viewer(posts, current_user_id)
         
         return jsonify({
             'success': True,
             'posts': posts,
-            'count': len(posts)
+            'count': len(posts),
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -253,19 +278,7 @@ def get_single_post(current_user_id, post_id):
         if not post:
             return jsonify({'error': 'Post not found'}), 404
         
-        # Enrich with user info
-        user = find_user_by_firebase_uid(post.get('user_id'))
-        post['user'] = {
-            'user_id': post.get('user_id'),
-            'name': user.get('name', 'Anonymous') if user else 'Anonymous',
-            'profile_image': user.get('profile_image') if user else None
-        }
-        post['is_liked'] = current_user_id in post.get('likes', [])
-        post.pop('likes', None)
-        
-        # Format dates
-        if post.get('created_at'):
-            post['created_at'] = post['created_at'].isoformat()
+        enrich_posts_for_viewer([post], current_user_id)
         
         return jsonify({
             'success': True,
@@ -365,30 +378,29 @@ def serve_media(file_id):
 @posts_bp.route('/<post_id>/comments', methods=['GET'])
 @token_required
 def get_post_comments(current_user_id, post_id):
-    """Get comments for a post"""
+    """
+    Get comments for a post
+
+    Query params:
+    - limit: Max comments to return (optional, default 50)
+    - cursor: next_cursor from the previous page (optional)
+    """
     try:
         limit = request.args.get('limit', 50, type=int)
-        skip = request.args.get('skip', 0, type=int)
+        cursor = request.args.get('cursor')
         
-        comments = get_comments(post_id, limit=limit, skip=skip)
+        try:
+            comments, next_cursor = get_comments(post_id, limit=min(limit, 100), cursor=cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
         
-        # Enrich with user info
-        for comment in comments:
-            user = find_user_by_firebase_uid(comment.get('user_id'))
-            comment['user'] = {
-                'user_id': comment.get('user_id'),
-                'name': user.get('name', 'Anonymous') if user else 'Anonymous',
-                'profile_image': user.get('profile_image') if user else None
-            }
-            comment['is_liked'] = current_user_id in comment.get('likes', [])
-            comment.pop('likes', None)
-            if comment.get('created_at'):
-                comment['created_at'] = comment['created_at'].isoformat()
+        enrich_for_viewer(comments, current_user_id)
         
         return jsonify({
             'success': True,
             'comments': comments,
-            'count': len(comments)
+            'count': len(comments),
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -416,13 +428,9 @@ def create_comment(current_user_id, post_id):
             return jsonify({'error': 'Failed to add comment'}), 500
         
         # Get user info
-        user = find_user_by_firebase_uid(current_user_id)
-        comment['user'] = {
-            'user_id': current_user_id,
-            'name': user.get('name', 'Anonymous') if user else 'Anonymous',
-            'profile_image': user.get('profile_image') if user else None
-        }
+        comment['user'] = author_info(current_user_id, get_author_profiles([current_user_id]))
         comment['is_liked'] = False
+        comment.pop('likes', None)
         comment['created_at'] = comment['created_at'].isoformat()
         
         return jsonify({
@@ -491,18 +499,7 @@ def get_trending(current_user_id):
         
         posts = get_trending_posts(lng, lat, radius_km=radius, limit=limit)
         
-        # Enrich with user info
-        for post in posts:
-            user = find_user_by_firebase_uid(post.get('user_id'))
-            post['user'] = {
-                'user_id': post.get('user_id'),
-                'name': user.get('name', 'Anonymous') if user else 'Anonymous',
-                'profile_image': user.get('profile_image') if user else None
-            }
-            post['is_liked'] = current_user_id in post.get('likes', [])
-            post.pop('likes', None)
-            if post.get('created_at'):
-                post['created_at'] = post['created_at'].isoformat()
+        enrich_posts_for_viewer(posts, current_user_id)
         
         return jsonify({
             'success': True,
@@ -533,18 +530,7 @@ def search_hashtag(current_user_id, hashtag):
             limit=limit
         )
         
-        # Enrich with user info
-        for post in posts:
-            user = find_user_by_firebase_uid(post.get('user_id'))
-            post['user'] = {
-                'user_id': post.get('user_id'),
-                'name': user.get('name', 'Anonymous') if user else 'Anonymous',
-                'profile_image': user.get('profile_image') if user else None
-            }
-            post['is_liked'] = current_user_id in post.get('likes', [])
-            post.pop('likes', None)
-            if post.get('created_at'):
-                post['created_at'] = post['created_at'].isoformat()
+        enrich_posts_for_viewer(posts, current_user_id)
         
         return jsonify({
             'success': True,
@@ -602,20 +588,7 @@ def get_stories(current_user_id):
         
         stories = get_nearby_stories(lng, lat, radius_km=radius, limit=limit)
         
-        # Enrich with user info
-        for story in stories:
-            user = find_user_by_firebase_uid(story.get('user_id'))
-            story['user'] = {
-                'user_id': story.get('user_id'),
-                'name': user.get('name', 'Anonymous') if user else 'Anonymous',
-                'profile_image': user.get('profile_image') if user else None
-            }
-            story['is_liked'] = current_user_id in story.get('likes', [])
-            story.pop('likes', None)
-            if story.get('created_at'):
-                story['created_at'] = story['created_at'].isoformat()
-            if story.get('expires_at'):
-                story['expires_at'] = story['expires_at'].isoformat()
+        enrich_posts_for_viewer(stories, current_user_id)
         
         return jsonify({
             'success': True,
@@ -7,13 +7,27 @@
 
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from werkzeug.utils import secure_filename
-import os, math
+import os
 
 from models import db
-from ai.quest_verifier import verify_cleanliness
+from models.quest import (
+    store_before_score, record_quest_verification, find_duplicate_photos, classify_duplicate_photos
+)
+from models.verification_job import (
+    enqueue_verification_job, get_verification_job, serialize_verification_job,
+    JOB_BEFORE_SCORE, JOB_QUEST_COMPLETION
+)
+from ai.quest_verifier import (
+    verify_cleanliness, score_images, assess_image, image_hash, check_same_image, duplicate_photo_result,
+    wait_until_ready, get_verifier_status
+)
+from config import Config
 from utils.jwt_utils import token_required
+from utils.image_hash import hash_bands
+from utils.geo_utils import haversine
 
 quest_bp = Blueprint('quests', __name__, url_prefix='/api/quests')
 
@@ -23,6 +37,9 @@ MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Scores before images off the request path (see start_quest)
+_scoring_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='before-score')
+
 # =====================
 # Helper Functions
 # =====================
@@ -30,15 +47,18 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Haversine formula (meters)"""
-    R = 6371000
-    phi1, phi2 = map(math.radians, [lat1, lat2])
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    a = math.sin(delta_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(delta_lambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+def score_before_image(submission_id, image):
+    """
+    Score the BEFORE image and store it on the submission so completion
+    only has to run the AFTER image through the model
+    """
+    try:
+        before_score = score_images([image], strict=True)[0]
+    except Exception as e:
+        print(f"[WARN] Before image scoring failed for {submission_id}: {e}")
+        return
+
+    store_before_score(submission_id, before_score)
 
 
 # =====================
@@ -65,7 +85,7 @@ def start_quest(current_user, quest_id):
 
         # Check GPS proximity
         quest_lng, quest_lat = quest['location']['coordinates']
-        distance = calculate_distance(user_lat, user_lng, quest_lat, quest_lng)
+        distance = haversine(user_lat, user_lng, quest_lat, quest_lng)
         if distance > 100:
             return jsonify({'error': 'Too far from quest location', 'distance_m': round(distance, 2)}), 403
 
@@ -81,15 +101,50 @@ def start_quest(current_user, quest_id):
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         before_file.save(filepath)
 
+        # Reject blurry/dark/tiny photos now so the user can retake them
+        before_array, issue = assess_image(filepath)
+        if issue:
+            os.remove(filepath)
+            return jsonify({'error': f'Before photo rejected: {issue}'}), 400
+
+        # Perceptual hash: the user's own retry reuses its cached score;
+        # a photo from any other submission is rejected
+        before_hash = image_hash(filepath)
+        duplicate, conflicts = classify_duplicate_photos(
+            find_duplicate_photos(before_hash), ObjectId(current_user['_id']), ObjectId(quest_id), 'before'
+        )
+        if conflicts:
+            os.remove(filepath)
+            return jsonify({'error': 'Before photo was already used in another quest submission'}), 409
+
         # Save progress in submissions collection
-        db.quest_submissions.insert_one({
+        submission = {
             'quest_id': ObjectId(quest_id),
             'user_id': ObjectId(current_user['_id']),
             'before_image': filepath,
+            'image_hashes': {'before': before_hash},
+            'hash_bands': hash_bands(before_hash),
             'status': 'in_progress',
             'started_at': datetime.utcnow(),
             'location': {'lat': user_lat, 'lng': user_lng}
-        })
+        }
+        if duplicate:
+            submission['before_score'] = duplicate['score']
+            submission['before_duplicate_of'] = duplicate
+        inserted = db.quest_submissions.insert_one(submission)
+
+        # Score the before image in the background while the user cleans up
+        if duplicate:
+            print(f"[AI] Before image duplicates submission {duplicate['submission_id']} "
+                  f"({duplicate['distance']} bits), reusing its score")
+        elif Config.QUEST_VERIFIER_ASYNC:
+            enqueue_verification_job(
+                JOB_BEFORE_SCORE,
+                {'submission_id': inserted.inserted_id, 'before_image': filepath},
+                user_id=ObjectId(current_user['_id'])
+            )
+        else:
+            _scoring_executor.submit(score_before_image, inserted.inserted_id, before_array)
 
         return jsonify({
             'success': True,
@@ -135,7 +190,7 @@ def complete_quest(current_user, quest_id):
 
         # Check proximity again
         quest_lng, quest_lat = quest['location']['coordinates']
-        distance = calculate_distance(user_lat, user_lng, quest_lat, quest_lng)
+        distance = haversine(user_lat, user_lng, quest_lat, quest_lng)
         if distance > 100:
             return jsonify({'error': 'Too far from quest location to complete', 'distance_m': round(distance, 2)}), 403
 
@@ -147,33 +202,98 @@ def complete_quest(current_user, quest_id):
         if not allowed_file(after_file.filename):
             return jsonify({'error': 'Invalid file type'}), 400
 
+        # Wait briefly for the model instead of triggering a load per request
+        # (in async mode the verification workers own the model)
+        if not Config.QUEST_VERIFIER_ASYNC and not wait_until_ready(Config.QUEST_VERIFIER_READY_TIMEOUT_SECONDS):
+            return jsonify({
+                'error': 'Verification is warming up, please retry shortly',
+                'verifier': get_verifier_status()
+            }), 503, {'Retry-After': '5'}
+
         filename = secure_filename(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_after_{after_file.filename}")
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         after_file.save(filepath)
 
-        # Run AI verification
-        before_path = submission['before_image']
-        result = verify_cleanliness(before_path, filepath, (user_lat, user_lng), (quest_lat, quest_lng))
-
-        # Update submission
-        db.quest_submissions.update_one(
-            {'_id': submission['_id']},
-            {'$set': {
-                'after_image': filepath,
-                'verified': result.get('verified', False),
-                'confidence': result.get('confidence', 0),
-                'verified_at': datetime.utcnow(),
-                'status': 'verified' if result.get('verified') else 'failed'
-            }}
+        after_array, issue = assess_image(filepath)
+        if issue:
+            os.remove(filepath)
+            return jsonify({'error': f'After photo rejected: {issue}'}), 400
+
+        # Same photo as the before image, or a photo from another
+        # submission -> fraud flag, no inference. Only a retry of the same
+        # before/after pair by the same user reuses its cached score.
+        after_hash = image_hash(filepath)
+        before_hash = submission.get('image_hashes', {}).get('before')
+        fraud = check_same_image(before_hash, after_hash) if before_hash else None
+        duplicate, conflicts = classify_duplicate_photos(
+            find_duplicate_photos(after_hash, exclude_submission_id=submission['_id']),
+            submission['user_id'], submission['quest_id'], 'after', before_hash
         )
+        if not fraud and conflicts:
+            fraud = duplicate_photo_result(conflicts[0])
+        if fraud:
+            if not record_quest_verification(
+                submission['_id'], current_user['_id'], quest.get('points', 50), filepath, fraud, after_hash
+            ):
+                return jsonify({'error': 'Quest submission already completed'}), 409
+            return jsonify({
+                'success': False,
+                'message': f"❌ Verification failed: {fraud['reason']}",
+                'confidence': 0
+            }), 200
 
-        # Award XP if verified
-        if result.get('verified'):
-            db.users.update_one(
-                {'_id': ObjectId(current_user['_id'])},
-                {'$inc': {'xp': quest.get('points', 50)}}
+        after_score = duplicate['score'] if duplicate else None
+        before_score = submission.get('before_score')
+
+        # Hand off to the verification workers; the client polls the job
+        # or listens for the 'quest_verification' Socket.IO event
+        if Config.QUEST_VERIFIER_ASYNC and (before_score is None or after_score is None):
+            claimed = db.quest_submissions.update_one(
+                {'_id': submission['_id'], 'status': 'in_progress'},
+                {'$set': {'status': 'verifying', 'after_image': filepath}}
+            )
+            if claimed.modified_count != 1:
+                # A concurrent request already submitted this quest
+                return jsonify({'error': 'Quest submission already being verified'}), 409
+            job_id = enqueue_verification_job(
+                JOB_QUEST_COMPLETION,
+                {
+                    'submission_id': submission['_id'],
+                    'before_image': submission['before_image'],
+                    'after_image': filepath,
+                    'before_score': before_score,
+                    'after_score': after_score,
+                    'after_hash': after_hash,
+                    'user_gps': [user_lat, user_lng],
+                    'quest_gps': [quest_lat, quest_lng],
+                    'points': quest.get('points', 50)
+                },
+                user_id=ObjectId(current_user['_id'])
             )
+            return jsonify({
+                'success': True,
+                'message': '⏳ Verification queued.',
+                'job_id': str(job_id),
+                'status_url': f'/api/quests/verification-jobs/{job_id}'
+            }), 202
+
+        # Run AI verification in-request. The before score is normally stored
+        # at quest start; if scoring hasn't finished (or failed) both images
+        # are scored here
+        before_path = submission['before_image']
+        result = verify_cleanliness(
+            before_path, after_array if after_score is None else filepath, (user_lat, user_lng), (quest_lat, quest_lng),
+            before_score=before_score, after_score=after_score,
+            before_hash=before_hash, after_hash=after_hash
+        )
 
+        # Update submission and award XP if verified
+        if not record_quest_verification(
+            submission['_id'], current_user['_id'], quest.get('points', 50), filepath, result, after_hash
+        ):
+            return jsonify({'error': 'Quest submission already completed'}), 409
+
+        if result.get('verified'):
             return jsonify({
                 'success': True,
                 'message': f"✅ Quest verified successfully! +{quest.get('points', 50)} XP earned.",
@@ -190,6 +310,20 @@ def complete_quest(current_user, quest_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# =====================
+# Verification Job Status
+# =====================
+
+@quest_bp.route('/verification-jobs/<job_id>', methods=['GET'])
+@token_required
+def get_verification_job_status(current_user, job_id):
+    """Poll an asynchronous quest verification job (QUEST_VERIFIER_ASYNC)"""
+    job = get_verification_job(job_id)
+    if not job or job.get('user_id') != ObjectId(current_user['_id']):
+        return jsonify({'error': 'Verification job not found'}), 404
+    return jsonify(serialize_verification_job(job)), 200
+
+
 """
 🌱 Fetch All AI Clean-Up Quests
 Returns all available quests for display in the frontend
@@ -5,11 +5,20 @@ Provides chatbot, itinerary generation, and image verification
 from openai import OpenAI
 import google.generativeai as genai
 from config import Config
+from services.llm_telemetry import (
+    track_llm_call,
+    record_fallback,
+    record_json_parse_failure,
+    groq_usage,
+    groq_stream_usage,
+    gemini_usage
+)
 import json
 import base64
 from PIL import Image
 import io
 import os
+import time
 
 # Initialize Groq client (OpenAI-compatible) - PRIMARY
 groq_client = None
@@ -114,6 +123,10 @@ def chatbot_response(user_message, context=None):
     context_parts = []
     
     if context:
+        # Add rolling summary of earlier turns
+        if context.get('conversation_summary'):
+            context_parts.append(f"Summary of earlier conversation:\n{context['conversation_summary']}")
+        
         # Add conversation history
         if context.get('conversation_history'):
             context_parts.append(f"Previous conversation:\n{context['conversation_history']}")
@@ -132,6 +145,7 @@ def chatbot_response(user_message, context=None):
             context_parts.append(f"Trip details: {plan.get('destination')} from {plan.get('start_date')} to {plan.get('end_date')}")
     
     context_str = "\n\n".join(context_parts) if context_parts else ""
+    failed_provider = None
     
     # Try Groq first
     groq = _get_groq_client()
@@ -146,12 +160,14 @@ def chatbot_response(user_message, context=None):
             
             messages.append({"role": "user", "content": user_message})
             
-            response = groq.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7
-            )
+            with track_llm_call('groq', 'chat') as call:
+                response = groq.chat.completions.create(
+                    model=GROQ_MODEL,
+                    messages=messages,
+                    max_tokens=500,
+                    temperature=0.7
+                )
+                call.set_usage(*groq_usage(response))
             print("Groq chat success")
             return {
                 'success': True,
@@ -161,10 +177,13 @@ def chatbot_response(user_message, context=None):
             }
         except Exception as e:
             print(f"Groq error, trying Gemini fallback: {e}")
+            failed_provider = 'groq'
     
     # Fallback to Gemini
     gemini = _get_gemini_model()
     if gemini:
+        if failed_provider:
+            record_fallback('chat', failed_provider, 'gemini')
         try:
             print(f"Attempting Gemini chat fallback with model: {GEMINI_MODEL}")
             prompt = f"{SYSTEM_PROMPT}\n\n"
@@ -172,7 +191,9 @@ def chatbot_response(user_message, context=None):
                 prompt += f"Context:\n{context_str}\n\n"
             prompt += f"User: {user_message}"
             
-            response = gemini.generate_content(prompt)
+            with track_llm_call('gemini', 'chat') as call:
+                response = gemini.generate_content(prompt)
+                call.set_usage(*gemini_usage(response))
             return {
                 'success': True,
                 'message': response.text,
@@ -181,8 +202,11 @@ def chatbot_response(user_message, context=None):
             }
         except Exception as e:
             print(f"Gemini fallback error: {e}")
+            failed_provider = 'gemini'
     
     # Both failed
+    if failed_provider:
+        record_fallback('chat', failed_provider, 'static')
     return {
         'success': False,
         'error': 'No AI service available',
@@ -191,54 +215,291 @@ def chatbot_response(user_message, context=None):
     }
 
 
-def generate_trip_itinerary(destination, duration_days, preferences):
-    """Generate trip itinerary - tries Groq first, then Gemini"""
-    prompt = f"""Create a {duration_days}-day itinerary for {destination}, Karnataka.
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) used for prompt budgeting"""
+    return len(text) // 4 + 1 if text else 0
+
+
+SUMMARY_PROMPT = """Update the running summary of a tourism chat between a USER and the Vayaa ASSISTANT.
+Keep destinations, dates, budget, interests and any decisions made. Drop greetings and small talk.
+Reply with the updated summary only, under 120 words."""
+
+
+def summarize_conversation(previous_summary, messages):
+    """
+    Fold new chat messages into a rolling conversation summary
+
+    Args:
+        previous_summary: Existing summary text (may be empty)
+        messages: List of {'role': ..., 'content': ...} dicts not yet summarized
+
+    Returns:
+        str: Updated summary, or None if no AI service could produce one
+    """
+    transcript = '\n'.join(
+        f"{msg.get('role', 'user').upper()}: {msg.get('content', '')}" for msg in messages
+    )
+    prompt = f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    failed_provider = None
+
+    groq = _get_groq_client()
+    if groq:
+        try:
+            with track_llm_call('groq', 'summary') as call:
+                response = groq.chat.completions.create(
+                    model=GROQ_MODEL,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=200,
+                    temperature=0.2
+                )
+                call.set_usage(*groq_usage(response))
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Groq summary error, trying Gemini: {e}")
+            failed_provider = 'groq'
+
+    gemini = _get_gemini_model()
+    if gemini:
+        if failed_provider:
+            record_fallback('summary', failed_provider, 'gemini')
+        try:
+            with track_llm_call('gemini', 'summary') as call:
+                response = gemini.generate_content(f"{SUMMARY_PROMPT}\n\n{prompt}")
+                call.set_usage(*gemini_usage(response))
+            return response.text.strip()
+        except Exception as e:
+            print(f"Gemini summary error: {e}")
+            failed_provider = 'gemini'
+
+    if failed_provider:
+        record_fallback('summary', failed_provider, 'none')
+    return None
+
+
+def _itinerary_prompt(destination, duration_days, preferences):
+    """Prompt asking for a JSON itinerary with the days array first"""
+    return f"""Create a {duration_days}-day itinerary for {destination}, Karnataka.
 Include: Karnataka cuisine, temples, palaces, natural attractions.
 Preferences: {preferences if preferences else 'Popular attractions'}
 
 Return ONLY valid JSON (no markdown):
 {{"days": [{{"day": 1, "title": "Theme", "activities": [{{"time": "9:00 AM", "activity": "Activity", "location": "Location", "duration": "2 hours"}}], "meals": [{{"type": "breakfast", "suggestion": "Food"}}]}}], "tips": ["Tip 1"], "budget_estimate": "₹X per day"}}"""
 
+
+def parse_itinerary_json(text):
+    """Strip markdown code fences from an LLM reply and parse the JSON"""
+    text = text.strip()
+    if text.startswith('```'): text = text.split('```')[1].split('```')[0].strip()
+    if text.startswith('json'): text = text[4:].strip()
+    return json.loads(text)
+
+
+def generate_trip_itinerary(destination, duration_days, preferences, deadline=None):
+    """
+    Generate trip itinerary - tries Groq first, then Gemini
+
+    Args:
+        deadline: Optional time.monotonic() value; once it has passed, a
+                  failed provider falls back to the static itinerary
+                  instead of calling the next one
+    """
+    prompt = _itinerary_prompt(destination, duration_days, preferences)
+    failed_provider = None
+
     # Try Groq first
     groq = _get_groq_client()
     if groq:
         try:
             print(f"Attempting Groq itinerary generation for {destination} with model {GROQ_MODEL}...")
-            response = groq.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a Karnataka tourism expert. Return ONLY valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=2000,
-                temperature=0.7
-            )
-            text = response.choices[0].message.content.strip()
+            with track_llm_call('groq', 'itinerary') as call:
+                response = groq.chat.completions.create(
+                    model=GROQ_MODEL,
+                    messages=[
+                        {"role": "system", "content": "You are a Karnataka tourism expert. Return ONLY valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=2000,
+                    temperature=0.7
+                )
+                call.set_usage(*groq_usage(response))
             print("Groq response received. Parsing JSON...")
-            if text.startswith('```'): text = text.split('```')[1].split('```')[0].strip()
-            if text.startswith('json'): text = text[4:].strip()
-            return {'success': True, 'itinerary': json.loads(text), 'model': f'groq/{GROQ_MODEL}'}
+            try:
+                itinerary = parse_itinerary_json(response.choices[0].message.content)
+            except ValueError:
+                record_json_parse_failure('groq', 'itinerary')
+                raise
+            return {'success': True, 'itinerary': itinerary, 'model': f'groq/{GROQ_MODEL}'}
         except Exception as e:
             print(f"Groq itinerary error, trying Gemini: {e}")
+            failed_provider = 'groq'
     
-    # Fallback to Gemini
+    # Fallback to Gemini (unless the caller has already given up waiting)
     gemini = _get_gemini_model()
-    if gemini:
+    if gemini and (deadline is None or time.monotonic() < deadline):
+        if failed_provider:
+            record_fallback('itinerary', failed_provider, 'gemini')
         try:
-            response = gemini.generate_content(prompt)
-            text = response.text.strip()
-            if text.startswith('```'): text = text.split('```')[1].split('```')[0].strip()
-            if text.startswith('json'): text = text[4:].strip()
-            return {'success': True, 'itinerary': json.loads(text), 'model': f'gemini/{GEMINI_MODEL}'}
+            with track_llm_call('gemini', 'itinerary') as call:
+                response = gemini.generate_content(prompt)
+                call.set_usage(*gemini_usage(response))
+            try:
+                itinerary = parse_itinerary_json(response.text)
+            except ValueError:
+                record_json_parse_failure('gemini', 'itinerary')
+                raise
+            return {'success': True, 'itinerary': itinerary, 'model': f'gemini/{GEMINI_MODEL}'}
         except Exception as e:
             print(f"Gemini itinerary error: {e}")
+            failed_provider = 'gemini'
     
     # Fallback itinerary
-    return _generate_fallback_itinerary(destination, duration_days)
+    if failed_provider:
+        record_fallback('itinerary', failed_provider, 'static')
+    return generate_fallback_itinerary(destination, duration_days)
+
+
+def regenerate_itinerary_day(destination, day_number, other_days, preferences, instructions=None):
+    """
+    Regenerate a single itinerary day, using the rest of the plan as context
+
+    Only a one-line outline of each other day is sent, so the prompt and the
+    reply stay roughly one day long regardless of trip length.
+
+    Returns:
+        dict: {'success': True, 'day': {...}, 'model': str} or {'success': False, 'error': str}
+    """
+    outline = []
+    for day_info in other_days:
+        activities = ', '.join(a.get('activity', '') for a in day_info.get('activities', []))
+        outline.append(f"Day {day_info.get('day')}: {day_info.get('title', '')} - {activities}")
+
+    prompt = f"""Rewrite day {day_number} of a {len(other_days) + 1}-day itinerary for {destination}, Karnataka.
+Preferences: {preferences if preferences else 'Popular attractions'}
+Other days (do not repeat their activities):
+{chr(10).join(outline) if outline else '(none)'}
+{f'Traveller request for this day: {instructions}' if instructions else ''}
+
+Return ONLY valid JSON for this one day (no markdown):
+{{"day": {day_number}, "title": "Theme", "activities": [{{"time": "9:00 AM", "activity": "Activity", "location": "Location", "duration": "2 hours"}}], "meals": [{{"type": "breakfast", "suggestion": "Food"}}]}}"""
+
+    failed_provider = None
+
+    groq = _get_groq_client()
+    if groq:
+        try:
+            with track_llm_call('groq', 'itinerary_day') as call:
+                response = groq.chat.completions.create(
+                    model=GROQ_MODEL,
+                    messages=[
+                        {"role": "system", "content": "You are a Karnataka tourism expert. Return ONLY valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=600,
+                    temperature=0.7
+                )
+                call.set_usage(*groq_usage(response))
+            try:
+                day = parse_itinerary_json(response.choices[0].message.content)
+            except ValueError:
+                record_json_parse_failure('groq', 'itinerary_day')
+                raise
+            return {'success': True, 'day': day, 'model': f'groq/{GROQ_MODEL}'}
+        except Exception as e:
+            print(f"Groq day regeneration error, trying Gemini: {e}")
+            failed_provider = 'groq'
+
+    gemini = _get_gemini_model()
+    if gemini:
+        if failed_provider:
+            record_fallback('itinerary_day', failed_provider, 'gemini')
+        try:
+            with track_llm_call('gemini', 'itinerary_day') as call:
+                response = gemini.generate_content(prompt)
+                call.set_usage(*gemini_usage(response))
+            try:
+                day = parse_itinerary_json(response.text)
+            except ValueError:
+                record_json_parse_failure('gemini', 'itinerary_day')
+                raise
+            return {'success': True, 'day': day, 'model': f'gemini/{GEMINI_MODEL}'}
+        except Exception as e:
+            print(f"Gemini day regeneration error: {e}")
+            failed_provider = 'gemini'
+
+    if failed_provider:
+        record_fallback('itinerary_day', failed_provider, 'none')
+    return {'success': False, 'error': 'AI service unavailable'}
+
+
+def stream_trip_itinerary(destination, duration_days, preferences):
+    """
+    Stream the itinerary JSON text as it is generated - Groq first, then Gemini
+
+    Yields:
+        tuple: (model, text_chunk)
+
+    Falls back to Gemini only if Groq fails before producing any text.
+    Raises RuntimeError if no AI service is available.
+    """
+    prompt = _itinerary_prompt(destination, duration_days, preferences)
+
+    failed_provider = None
+
+    groq = _get_groq_client()
+    if groq:
+        started = False
+        try:
+            with track_llm_call('groq', 'itinerary_stream') as call:
+                stream = groq.chat.completions.create(
+                    model=GROQ_MODEL,
+                    messages=[
+                        {"role": "system", "content": "You are a Karnataka tourism expert. Return ONLY valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=2000,
+                    temperature=0.7,
+                    stream=True
+                )
+                for chunk in stream:
+                    prompt_tokens, completion_tokens = groq_stream_usage(chunk)
+                    if prompt_tokens is not None:
+                        call.set_usage(prompt_tokens, completion_tokens)
+                    if not chunk.choices:
+                        continue
+                    text = chunk.choices[0].delta.content
+                    if text:
+                        started = True
+                        call.first_token()
+                        yield f'groq/{GROQ_MODEL}', text
+            return
+        except Exception as e:
+            if started:
+                raise
+            print(f"Groq itinerary stream error, trying Gemini: {e}")
+            failed_provider = 'groq'
+
+    gemini = _get_gemini_model()
+    if gemini:
+        if failed_provider:
+            record_fallback('itinerary_stream', failed_provider, 'gemini')
+        with track_llm_call('gemini', 'itinerary_stream') as call:
+            for chunk in gemini.generate_content(prompt, stream=True):
+                # Usage totals arrive with the stream; the last chunk wins
+                prompt_tokens, completion_tokens = gemini_usage(chunk)
+                if prompt_tokens is not None:
+                    call.set_usage(prompt_tokens, completion_tokens)
+                if chunk.text:
+                    call.first_token()
+                    yield f'gemini/{GEMINI_MODEL}', chunk.text
+        return
+
+    raise RuntimeError('No AI service available')
 
 
-def _generate_fallback_itinerary(destination, duration_days):
+def generate_fallback_itinerary(destination, duration_days):
     """Generate fallback itinerary when all APIs fail"""
     return {
         'success': False,
@@ -0,0 +1,236 @@
+"""
+LLM call telemetry
+In-memory latency/token histograms and counters per provider and operation
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from config import Config
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+_lock = threading.Lock()
+_metrics = {}
+_fallbacks = {}
+_semaphores = {}
+_started_at = datetime.utcnow()
+
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are estimated from bucket bounds"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        labels = [f'le_{b}' for b in self.bounds] + ['inf']
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 2) if self.count else None,
+            'max': round(self.max, 2),
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+def _new_metrics():
+    return {
+        'calls': 0,
+        'errors': 0,
+        'rejected': 0,
+        'json_parse_failures': 0,
+        'queue_wait_ms': Histogram(LATENCY_BUCKETS_MS),
+        'time_to_first_token_ms': Histogram(LATENCY_BUCKETS_MS),
+        'latency_ms': Histogram(LATENCY_BUCKETS_MS),
+        'prompt_tokens': Histogram(TOKEN_BUCKETS),
+        'completion_tokens': Histogram(TOKEN_BUCKETS)
+    }
+
+
+def _get_metrics(provider, operation):
+    key = (provider, operation)
+    if key not in _metrics:
+        _metrics[key] = _new_metrics()
+    return _metrics[key]
+
+
+class LLMCapacityError(RuntimeError):
+    """No call slot for the provider freed up within LLM_QUEUE_TIMEOUT_SECONDS"""
+
+
+def _get_semaphore(provider):
+    """Per-provider call limiter, or None when LLM_MAX_CONCURRENT_CALLS is 0"""
+    if Config.LLM_MAX_CONCURRENT_CALLS <= 0:
+        return None
+    with _lock:
+        if provider not in _semaphores:
+            _semaphores[provider] = threading.BoundedSemaphore(Config.LLM_MAX_CONCURRENT_CALLS)
+        return _semaphores[provider]
+
+
+class LLMCall:
+    """Measurements for one provider call, filled in by the caller"""
+
+    def __init__(self, provider, operation, queue_wait_ms):
+        self.provider = provider
+        self.operation = operation
+        self.queue_wait_ms = queue_wait_ms
+        self.started = time.perf_counter()
+        self.first_token_ms = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.error = False
+
+    def first_token(self):
+        """Mark the arrival of the first output (first chunk when streaming)"""
+        if self.first_token_ms is None:
+            self.first_token_ms = (time.perf_counter() - self.started) * 1000
+
+    def set_usage(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+@contextmanager
+def track_llm_call(provider, operation):
+    """
+    Time an LLM call and record it in the histograms
+
+    If Config.LLM_MAX_CONCURRENT_CALLS is set, calls to one provider are
+    limited to that many; the time spent waiting for a slot is recorded as
+    queue wait, and LLMCapacityError is raised after
+    Config.LLM_QUEUE_TIMEOUT_SECONDS so callers can fall back. Note that a
+    streamed call holds its slot until the stream is consumed. Usage:
+
+        with track_llm_call('groq', 'chat') as call:
+            response = client.chat.completions.create(...)
+            call.set_usage(*groq_usage(response))
+    """
+    semaphore = _get_semaphore(provider)
+    queue_wait_ms = None
+    if semaphore:
+        enqueued = time.perf_counter()
+        acquired = semaphore.acquire(timeout=Config.LLM_QUEUE_TIMEOUT_SECONDS)
+        queue_wait_ms = (time.perf_counter() - enqueued) * 1000
+        if not acquired:
+            with _lock:
+                metrics = _get_metrics(provider, operation)
+                metrics['rejected'] += 1
+                metrics['queue_wait_ms'].observe(queue_wait_ms)
+            raise LLMCapacityError(f'{provider} is at its concurrent call limit')
+    call = LLMCall(provider, operation, queue_wait_ms)
+    try:
+        yield call
+    except Exception:
+        call.error = True
+        raise
+    finally:
+        if semaphore:
+            semaphore.release()
+        latency_ms = (time.perf_counter() - call.started) * 1000
+        with _lock:
+            metrics = _get_metrics(provider, operation)
+            metrics['calls'] += 1
+            if call.error:
+                metrics['errors'] += 1
+            if call.queue_wait_ms is not None:
+                metrics['queue_wait_ms'].observe(call.queue_wait_ms)
+            metrics['latency_ms'].observe(latency_ms)
+            if not call.error:
+                # Non-streaming responses arrive in one piece
+                ttft = call.first_token_ms if call.first_token_ms is not None else latency_ms
+                metrics['time_to_first_token_ms'].observe(ttft)
+            if call.prompt_tokens is not None:
+                metrics['prompt_tokens'].observe(call.prompt_tokens)
+            if call.completion_tokens is not None:
+                metrics['completion_tokens'].observe(call.completion_tokens)
+
+
+def record_json_parse_failure(provider, operation):
+    """Count a reply that could not be parsed as the expected JSON"""
+    with _lock:
+        _get_metrics(provider, operation)['json_parse_failures'] += 1
+
+
+def record_fallback(operation, from_provider, to_provider):
+    """Count a transition to the next provider (or to static fallback content)"""
+    key = f'{from_provider}->{to_provider}'
+    with _lock:
+        transitions = _fallbacks.setdefault(operation, {})
+        transitions[key] = transitions.get(key, 0) + 1
+
+
+def groq_usage(response):
+    """(prompt_tokens, completion_tokens) from an OpenAI-compatible response"""
+    usage = getattr(response, 'usage', None)
+    if not usage:
+        return None, None
+    return usage.prompt_tokens, usage.completion_tokens
+
+
+def groq_stream_usage(chunk):
+    """(prompt_tokens, completion_tokens) from a streamed chunk; only the last one carries usage"""
+    usage = getattr(chunk, 'usage', None)
+    if not usage:
+        # Groq reports stream usage in its x_groq extension (a dict via the OpenAI client)
+        x_groq = getattr(chunk, 'x_groq', None)
+        usage = x_groq.get('usage') if isinstance(x_groq, dict) else getattr(x_groq, 'usage', None)
+    if not usage:
+        return None, None
+    if isinstance(usage, dict):
+        return usage.get('prompt_tokens'), usage.get('completion_tokens')
+    return usage.prompt_tokens, usage.completion_tokens
+
+
+def gemini_usage(response):
+    """(prompt_tokens, completion_tokens) from a Gemini response, if reported"""
+    usage = getattr(response, 'usage_metadata', None)
+    if not usage:
+        return None, None
+    return getattr(usage, 'prompt_token_count', None), getattr(usage, 'candidates_token_count', None)
+
+
+def get_llm_metrics():
+    """Snapshot of all counters and histograms"""
+    with _lock:
+        providers = {}
+        for (provider, operation), metrics in _metrics.items():
+            providers.setdefault(provider, {})[operation] = {
+                name: value.snapshot() if isinstance(value, Histogram) else value
+                for name, value in metrics.items()
+            }
+        return {
+            'since': _started_at.isoformat(),
+            'max_concurrent_calls_per_provider': Config.LLM_MAX_CONCURRENT_CALLS or None,
+            'providers': providers,
+            'fallbacks': {op: dict(t) for op, t in _fallbacks.items()}
+        }
@@ -0,0 +1,230 @@
+"""
+Geospatial utilities
+Vectorized Haversine distances, bounding-box prefilters and geohash cells.
+Points are (lat, lng) pairs; GeoJSON coordinates ([lng, lat]) are converted
+with latlng_from_geojson.
+"""
+import math
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+EARTH_RADIUS_KM = 6371.0
+
+# =====================================================
+# Haversine distances
+# =====================================================
+
+def haversine(lat1, lng1, lat2, lng2, radius=EARTH_RADIUS_M):
+    """
+    Great-circle distance between points
+
+    Arguments may be scalars or NumPy-broadcastable arrays; a scalar call
+    returns a float.
+
+    Args:
+        radius: Earth radius in the unit wanted (EARTH_RADIUS_M or EARTH_RADIUS_KM)
+    """
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    distance = 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return float(distance) if distance.ndim == 0 else distance
+
+
+def latlng_from_geojson(coordinates):
+    """(N, 2) array of (lat, lng) from a list of GeoJSON [lng, lat] coordinates"""
+    points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    return points[:, ::-1]
+
+
+def distances_from(lat, lng, points, radius=EARTH_RADIUS_M):
+    """
+    Distances from one origin to N points in a single vectorized call
+
+    Args:
+        points: (N, 2) array-like of (lat, lng)
+
+    Returns:
+        np.ndarray: N distances
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return np.atleast_1d(haversine(lat, lng, points[:, 0], points[:, 1], radius))
+
+
+def distance_matrix(points_a, points_b, radius=EARTH_RADIUS_M):
+    """
+    Pairwise distances between two point sets
+
+    Returns:
+        np.ndarray: (N, M) matrix, entry [i, j] = distance(points_a[i], points_b[j])
+    """
+    a = np.asarray(points_a, dtype=np.float64).reshape(-1, 2)
+    b = np.asarray(points_b, dtype=np.float64).reshape(-1, 2)
+    return np.atleast_2d(haversine(a[:, None, 0], a[:, None, 1], b[None, :, 0], b[None, :, 1], radius))
+
+# =====================================================
+# Bounding-box prefilters
+# =====================================================
+
+def bounding_box(lat, lng, radius_m):
+    """
+    Lat/lng box that contains every point within `radius_m` of the origin
+
+    Returns:
+        tuple: (min_lat, min_lng, max_lat, max_lng). Near the poles the box
+               spans all longitudes; across the antimeridian min_lng > max_lng.
+    """
+    delta_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+
+    delta_lng = math.degrees(radius_m / (EARTH_RADIUS_M * math.cos(math.radians(lat))))
+    if delta_lng >= 180:
+        return min_lat, -180.0, max_lat, 180.0
+    min_lng = (lng - delta_lng + 180) % 360 - 180
+    max_lng = (lng + delta_lng + 180) % 360 - 180
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def in_bounding_box(points, box):
+    """Boolean mask of the (lat, lng) points inside a bounding_box()"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    min_lat, min_lng, max_lat, max_lng = box
+    lat_ok = (points[:, 0] >= min_lat) & (points[:, 0] <= max_lat)
+    if min_lng <= max_lng:
+        lng_ok = (points[:, 1] >= min_lng) & (points[:, 1] <= max_lng)
+    else:
+        lng_ok = (points[:, 1] >= min_lng) | (points[:, 1] <= max_lng)
+    return lat_ok & lng_ok
+
+
+def within_radius(lat, lng, points, radius_m):
+    """
+    Points within `radius_m` of the origin, nearest first
+
+    The cheap bounding-box test discards most points before Haversine runs.
+
+    Returns:
+        tuple: (indices into points, distances in meters)
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    candidates = np.flatnonzero(in_bounding_box(points, bounding_box(lat, lng, radius_m)))
+    distances = distances_from(lat, lng, points[candidates])
+    keep = distances <= radius_m
+    order = np.argsort(distances[keep], kind='stable')
+    return candidates[keep][order], distances[keep][order]
+
+# =====================================================
+# Geohash cells
+# =====================================================
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+# Approximate cell height in meters per geohash precision
+GEOHASH_CELL_HEIGHT_M = {1: 5000000, 2: 625000, 3: 156000, 4: 19500, 5: 4890, 6: 610, 7: 153, 8: 19}
+
+
+def geohash_encode(lat, lng, precision=7):
+    """Geohash string of a point"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # Bits alternate lng, lat, lng, ...
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_bounds(geohash):
+    """(min_lat, min_lng, max_lat, max_lng) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def geohash_decode(geohash):
+    """Center (lat, lng) of a geohash cell"""
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+def geohash_neighbors(geohash):
+    """The 8 cells surrounding a geohash cell (fewer at the poles)"""
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(geohash)
+    lat, lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+    height, width = max_lat - min_lat, max_lng - min_lng
+
+    neighbors = []
+    for d_lat in (-1, 0, 1):
+        for d_lng in (-1, 0, 1):
+            if d_lat == 0 and d_lng == 0:
+                continue
+            n_lat = lat + d_lat * height
+            if not -90 < n_lat < 90:
+                continue
+            n_lng = (lng + d_lng * width + 180) % 360 - 180
+            neighbors.append(geohash_encode(n_lat, n_lng, len(geohash)))
+    return neighbors
+
+
+def geohash_precision_for_radius(radius_m):
+    """Finest precision whose cells are at least `radius_m` tall"""
+    for precision in range(8, 0, -1):
+        if GEOHASH_CELL_HEIGHT_M[precision] >= radius_m:
+            return precision
+    return 1
+
+
+def geohash_cells_covering(lat, lng, radius_m, precision):
+    """
+    Geohash cells of the given precision that cover a circle
+
+    Cells are enumerated over the circle's bounding box, so the result may
+    include a few cells just outside the circle.
+    """
+    min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius_m)
+    cell_min_lat, cell_min_lng, cell_max_lat, cell_max_lng = geohash_bounds(geohash_encode(lat, lng, precision))
+    height, width = cell_max_lat - cell_min_lat, cell_max_lng - cell_min_lng
+    if max_lng < min_lng:
+        max_lng += 360  # Box crosses the antimeridian
+
+    cells = set()
+    cell_lat = min_lat
+    while cell_lat <= max_lat + height:
+        cell_lng = min_lng
+        while cell_lng <= max_lng + width:
+            cells.add(geohash_encode(
+                max(-89.999999, min(89.999999, cell_lat, max_lat)),
+                (min(cell_lng, max_lng) + 180) % 360 - 180,
+                precision
+            ))
+            cell_lng += width
+        cell_lat += height
+    return cells
@@ -0,0 +1,42 @@
+"""
+Perceptual image hashing (dHash) for duplicate photo detection
+Hashes are 64-bit, stored as 16-char hex strings; near duplicates differ
+in only a few bits even after re-compression or resizing
+"""
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+BAND_COUNT = 4  # 4 bands of 16 bits: any two hashes within 3 bits share a band
+
+
+def dhash(img):
+    """
+    Difference hash of a PIL image
+
+    The image is shrunk to 9x8 grayscale and each bit records whether a
+    pixel is brighter than its right neighbour.
+
+    Returns:
+        str: 16-char hex hash
+    """
+    gray = np.asarray(img.convert('L').resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    return '%016x' % int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hex hashes"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def hash_bands(image_hash):
+    """
+    Split a hash into indexed bands ('0:abcd', '1:ef01', ...)
+
+    Two hashes within BAND_COUNT - 1 bits of each other share at least one
+    band exactly, so an indexed $in on the bands finds all near-duplicate
+    candidates without scanning.
+    """
+    width = len(image_hash) // BAND_COUNT
+    return [f'{i}:{image_hash[i * width:(i + 1) * width]}' for i in range(BAND_COUNT)]
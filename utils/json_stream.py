@@ -0,0 +1,92 @@
+"""
+Incremental JSON parsing for streamed LLM output
+Emits each element of a JSON array of objects as soon as it is complete
+"""
+import json
+import re
+
+
+class IncrementalArrayParser:
+    """
+    Extracts the objects of one array (e.g. "days") from JSON text that
+    arrives in chunks
+
+    Usage:
+        parser = IncrementalArrayParser('days')
+        for chunk in stream:
+            for day in parser.feed(chunk):
+                ...
+        parser.text  # full text received so far
+    """
+
+    def __init__(self, key):
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self.text = ''
+        self._pos = 0
+        self._in_array = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start = None
+
+    def feed(self, chunk):
+        """
+        Add a chunk of text
+
+        Returns:
+            list: Objects of the array completed by this chunk
+        """
+        self.text += chunk
+        completed = []
+
+        if self._finished:
+            return completed
+
+        if not self._in_array:
+            match = self._key_pattern.search(self.text, max(0, self._pos - 32))
+            if not match:
+                self._pos = len(self.text)
+                return completed
+            self._in_array = True
+            self._pos = match.end()
+
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._obj_start = i
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    # Closing bracket of the array itself
+                    self._finished = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._obj_start is not None:
+                    try:
+                        completed.append(json.loads(text[self._obj_start:i + 1]))
+                    except ValueError as e:
+                        print(f"[WARN] Skipping unparseable array element: {e}")
+                    self._obj_start = None
+            i += 1
+
+        self._pos = i
+        return completed
+
+    @property
+    def finished(self):
+        """True once the closing bracket of the array has been seen"""
+        return self._finished
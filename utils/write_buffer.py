@@ -0,0 +1,143 @@
+"""
+Write-behind buffer for MongoDB inserts
+Queues documents in memory and flushes them in batches with insert_many
+"""
+import atexit
+import threading
+import time
+from collections import deque
+
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer:
+    """
+    Buffers documents for a collection and writes them in the background
+
+    A batch is flushed when `batch_size` documents are pending or when the
+    oldest pending document is `flush_interval` seconds old. At most
+    `max_pending` documents are held; beyond that the oldest are dropped so
+    memory stays bounded if MongoDB is unreachable. Documents a flush fails
+    to write go back to the front of the queue and are retried on the next
+    flush, up to `max_attempts` writes each. Every document given up on is
+    counted in `dropped`. Pending documents are flushed on interpreter
+    shutdown.
+    """
+
+    def __init__(self, collection, batch_size=50, flush_interval=2.0, max_pending=5000, max_attempts=3):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self._pending = deque(maxlen=max_pending)  # (document, failed attempts)
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._oldest_at = None
+        self._closed = False
+        self.dropped = 0
+
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, document):
+        """Queue a document for insertion (never blocks on MongoDB)"""
+        with self._condition:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append((document, 0))
+            if self._oldest_at is None:
+                # Wake the writer so it starts the flush_interval countdown
+                self._oldest_at = time.monotonic()
+                self._condition.notify()
+            elif len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self):
+        """
+        Write everything that is pending, in batches of `batch_size`
+
+        Stops at the first failed batch; its unwritten documents are
+        retried on the next flush.
+        """
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    if not self._pending:
+                        self._oldest_at = None
+                        return
+                    count = min(self.batch_size, len(self._pending))
+                    batch = [self._pending.popleft() for _ in range(count)]
+                    self._oldest_at = time.monotonic() if self._pending else None
+                failed = self._insert(batch)
+                if failed:
+                    self._requeue(failed)
+                    return
+
+    def _insert(self, batch):
+        """insert_many a batch; returns the (document, attempts) entries that weren't written"""
+        try:
+            self.collection.insert_many([document for document, _ in batch], ordered=False)
+            return []
+        except BulkWriteError as e:
+            # Documents already written by an earlier attempt come back as duplicates
+            failed_indexes = {
+                error['index'] for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY
+            }
+            if not failed_indexes and not e.details.get('writeConcernErrors'):
+                return []
+            print(f"[WARN] Write-behind flush to {self.collection.name} failed for "
+                  f"{len(failed_indexes) or len(batch)} document(s): {e}")
+            return [entry for index, entry in enumerate(batch) if index in failed_indexes] or batch
+        except Exception as e:
+            print(f"[WARN] Write-behind flush to {self.collection.name} failed: {e}")
+            return batch
+
+    def _requeue(self, failed):
+        """Put failed documents back at the front of the queue, dropping those out of attempts"""
+        retry = [(document, attempts + 1) for document, attempts in failed if attempts + 1 < self.max_attempts]
+        given_up = len(failed) - len(retry)
+        with self._condition:
+            for entry in reversed(retry):
+                if len(self._pending) == self._pending.maxlen:
+                    given_up += 1  # appendleft pushes the newest document out
+                self._pending.appendleft(entry)
+            self.dropped += given_up
+            # Retry after another flush_interval rather than immediately
+            self._oldest_at = time.monotonic() if self._pending else None
+        if given_up:
+            print(f"[WARN] Write-behind gave up on {given_up} document(s) for {self.collection.name}")
+
+    def stats(self):
+        """Pending and dropped document counts (for metrics endpoints)"""
+        with self._condition:
+            return {'pending': len(self._pending), 'dropped': self.dropped}
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._batch_due():
+                    self._condition.wait(timeout=self._wait_time())
+                if self._closed:
+                    return
+            self.flush()
+
+    def _batch_due(self):
+        if len(self._pending) >= self.batch_size:
+            return True
+        return self._oldest_at is not None and time.monotonic() - self._oldest_at >= self.flush_interval
+
+    def _wait_time(self):
+        if self._oldest_at is None:
+            return None
+        return max(0.0, self.flush_interval - (time.monotonic() - self._oldest_at))